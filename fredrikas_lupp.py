@@ -7,7 +7,6 @@ then calls different functions from lupp.scrape module.
 
 """
 
-from wikitools.wiki import Wiki
 from datetime import datetime
 import sys
 import os.path
@@ -15,7 +14,12 @@ import json
 import copy
 from pathlib import Path
 
-from lupp import scrape, html, plot, utils
+from lupp import scrape, html, plot, utils, bench, analysis, record, reports
+from lupp.snapshots import SnapshotStore
+from lupp.session import WikiSessions
+from lupp.journal import ScrapeJournal
+from lupp.cache import ResponseCache
+from lupp.replay import ResponseRecorder, ResponseReplayer, serve
 
 used_cache = {'cache': 'None', 'title': 'None'}
 cache_path = Path("json") / "used_cache.json"
@@ -23,12 +27,23 @@ if cache_path.exists():
     used_cache = json.load(open(cache_path))
     used_cache['cache'] = Path(used_cache['cache'])
 
-cnt_arg = len(sys.argv)
-
-max_depth = 10 if cnt_arg < 5 else sys.argv[4]
-languages = "sv|fi|en|de" if cnt_arg < 4 else sys.argv[3]
-top_category = used_cache['title'] if cnt_arg < 3 else sys.argv[2]
-cmd = "help" if cnt_arg < 2 else sys.argv[1]
+# options are given as '--name value' anywhere on the command line, the rest are positional arguments
+options = {}
+argv = []
+i_arg = 0
+while i_arg < len(sys.argv):
+    if sys.argv[i_arg].startswith('--') and i_arg + 1 < len(sys.argv):
+        options[sys.argv[i_arg][2:]] = sys.argv[i_arg + 1]
+        i_arg += 2
+        continue
+    argv.append(sys.argv[i_arg])
+    i_arg += 1
+cnt_arg = len(argv)
+
+max_depth = 10 if cnt_arg < 5 else argv[4]
+languages = "sv|fi|en|de" if cnt_arg < 4 else argv[3]
+top_category = used_cache['title'] if cnt_arg < 3 else argv[2]
+cmd = "help" if cnt_arg < 2 else argv[1]
 
 jsonfile = Path(used_cache['cache']) if cnt_arg < 3 else utils.find_path(top_category)
 errfile = jsonfile.with_name(f"err_{top_category}.json")
@@ -38,19 +53,61 @@ print(f"python fredrikas_lupp.py {cmd} {top_category} {languages} "
       f"{max_depth} # {start.strftime('%d.%m.%Y kl. %H:%M')}\n")
 
 # Wikimedia API fields
-scalars = ['pagelanguage', 'touched', 'length', 'anoncontributors']
+scalars = ['pagelanguage', 'touched', 'lastrevid', 'length', 'anoncontributors']
 has_title = ['redirects', 'linkshere', 'links', 'images', 'categories']
 other = ['contributors', 'langlinks', 'extlinks', 'revisions']
 tricky = ['pageviews']
 limits = ['rdlimit', 'lhlimit', 'pllimit', 'imlimit', 'cllimit', 'pclimit', 'lllimit', 'ellimit', 'pvlimit']
 max_limits = {l: 500 for l in limits}
 prop = "|".join(has_title + other + tricky + ['info'])
+# how sections and revisions are requested, see scrape._scrape_page_details
+modes = {kind: options.get(kind, values[0]) for kind, values in scrape.MODES.items()}
+for kind, values in scrape.MODES.items():
+    if modes[kind] not in values:
+        print(f"Okänt värde --{kind} {modes[kind]}, välj något av {'|'.join(values)}")
+        utils.exit_program(start)
 api_fields = {"scalars": scalars, "has_title": has_title, "other": other,
-              "tricky": tricky, "prop": prop, 'max_limits': max_limits}
+              "tricky": tricky, "prop": prop, 'max_limits': max_limits, 'modes': modes}
+# engine for scraping categories, 'threads' or 'async', and max requests at a time per wiki for 'async'
+engine = options.get('engine', 'threads')
+concurrency = int(options.get('concurrency', scrape.MAX_WORKERS))
+# number of processes rendering the reports at the same time, by default one per report up to the number of cores
+report_workers = int(options['report-workers']) if 'report-workers' in options else None
+# number of contributors listed by contributors and contributors_w, all by default
+contributors_top = int(options['top']) if 'top' in options else None
+# number of worker threads for 'threads'
+workers = int(options.get('workers', scrape.MAX_WORKERS))
+# requests per second per wiki to start with, adapted while scraping, 0 for no limit
+rate = float(options.get('rate', 50))
+journal = ScrapeJournal.for_category(top_category)
+if cmd == 'resume' and journal.exists():
+    # an interrupted scrape continues with the languages and max depth it was started with
+    journal_header = journal.header()
+    languages = journal_header['stats']['languages']
+    max_depth = journal_header['max_depth']
+# format of the more easily readable copies of the json files in pprint/, 'off' for none
+if options.get('pprint', 'off') not in utils.PPRINT_FORMATS:
+    print(f"Okänt format --pprint {options['pprint']}, välj något av {'|'.join(utils.PPRINT_FORMATS)}")
+    utils.exit_program(start)
+utils.pprint_format = options.get('pprint', 'off')
+# recorded responses are replayed with this latency (s) per request, and lists longer than page-size are continued
+replayer = None
+if 'replay' in options:
+    replayer = ResponseReplayer(options['replay'], latency=float(options.get('latency', 0)),
+                                page_size=int(options['page-size']) if 'page-size' in options else None)
 sites = {}
-if cmd in ['scrape', 'scrapeb']:
+if cmd in ['scrape', 'scrapeb', 'resume']:
     # only load sites if scraping, for painless use of other commands offline
-    sites = {l: Wiki(f"https://{l}.wikipedia.org/w/api.php") for l in languages.split('|')}
+    # responses are cached on disk, unless '--cache off' or recording or replaying responses
+    cache = None
+    if options.get('cache', 'on') != 'off' and 'record' not in options and replayer is None:
+        cache = ResponseCache(max_bytes=int(options.get('cache-size', 500)) * 2 ** 20)
+    # the limiter of every wiki lets at most pool_size requests be in flight, from all threads together
+    sites = WikiSessions(languages.split('|'), pool_size=concurrency if engine == 'async' else workers,
+                         rate=rate, cache=cache, transport=replayer,
+                         api_url=options.get('api-url', "https://{lang}.wikipedia.org/w/api.php"))
+    if 'record' in options:
+        sites.transport = ResponseRecorder(sites.send, options['record'])
 blacklist = ['olympiska', 'användare', 'mall:']
 
 d = {}  # this dict contains "everything"
@@ -58,8 +115,8 @@ e = {'timestamp': {}}  # this is for the error message and log time stamps
 
 html = html.HTML()
 
-if cmd == "scrape":
-    if top_category == 'help':
+if cmd in ["scrape", "resume"]:
+    if cmd == "scrape" and top_category == 'help':
         print('''
 Run new scrape for CATEGORY and save josn file with the data.
 
@@ -68,8 +125,7 @@ Usage: python3 fredrikas_lupp.py scrape CATEGORY [languages] [max depth]
 Example: python3 fredrikas_lupp.py scrape Nagu
 
 Specify CATEGORY to scrape data from via madiawiki api, and save data as json file
-in json/DATE/ directory. Also saves a more readable file of the data in pprint/DATE/
-and a html file of the analyzed data in html/DATE/.
+in json/DATE/ directory. Also saves a html file of the analyzed data in html/DATE/.
 
 Scrape can also be used to scrape a specified list of pages, by instead of giving a category name
 as CATEGORY, instead the name of a file can be supplied. The file needs to be a '.txt' file.
@@ -97,18 +153,110 @@ Max depth can be specified for how deep into subcategories the script will go.
 Default is 10. To specify max depth, language also has to be specified.
 
 Example: python3 fredrikas_lupp.py scrape Nagu 'sv|fi|en|de' 2
+
+How sections and edit history of the pages are requested can be chosen with options:
+  --sections parse        Request the section outline of every page (default)
+  --sections off          Skip sections
+  --revisions history     Request the edit history since 2017 of every page, one request per page (default)
+  --revisions batch       Request only the latest revision, for 50 pages per request. The number of
+                          edits of the pages is then not known, and is shown as '-' in the csv file
+  --revisions off         Skip revisions
+
+Example: python3 fredrikas_lupp.py scrape Nagu --revisions batch
+
+The scrape engine can be chosen with options:
+  --engine threads        Scrape in three phases with a pool of threads (default)
+  --engine async          Scrape as one asyncio pipeline, pages in other languages are scraped
+                          as soon as the pages linking to them are done
+  --concurrency N         Max number of requests at a time per wiki for the async engine (default 5)
+  --workers N             Number of worker threads, and max number of requests at a time per wiki,
+                          for the threads engine (default 5)
+  --rate N                Requests per second per wiki to start with (default 50, 0 for no limit).
+                          The rate and the number of requests at a time adapt to how fast the wiki
+                          answers, and back off when it asks to (maxlag, HTTP 429)
+
+Example: python3 fredrikas_lupp.py scrape Nagu --engine async --concurrency 8
+
+A category that has been scraped before can be scraped incrementally. Then only page info and
+pageviews are requested for all pages, and pages that have not been edited since the previous
+scrape are copied from its json file instead of being fetched again:
+  --incremental latest    Compare with the latest json file of CATEGORY
+  --incremental FILE      Compare with json file FILE
+
+Example: python3 fredrikas_lupp.py scrape Nagu --incremental latest
+
+API responses are cached in cache/responses.sqlite, so the same request is not sent again
+while the cached response is fresh (10 min for page info, 1 h for category members,
+up to a day for other requests):
+  --cache off             Do not use the cache
+  --cache-size N          Max size of the cache in MB (default 500)
+
+Every scrape is also saved as a snapshot in snapshots/snapshots.sqlite, which 'analyze' and
+'contributors --across' read:
+  --snapshots off         Do not save the snapshot
+
+A scrape can be recorded and replayed offline, eg. for benchmarking:
+  --record FILE           Save all API responses in FILE (.jsonl.gz)
+  --replay FILE           Answer all API requests from FILE instead of the wikis
+  --latency S             Delay every replayed response S seconds (default 0)
+  --page-size N           Replay lists longer than N in parts with continuations
+  --api-url URL           Send requests to URL instead, eg. 'http://localhost:8080/{lang}/w/api.php'
+                          for a server started with the replay_server command
+
+Example: python3 fredrikas_lupp.py scrape Nagu --record fixtures/Nagu.jsonl.gz
+         python3 fredrikas_lupp.py scrape Nagu --replay fixtures/Nagu.jsonl.gz --latency 0.05 --rate 0
+
+The 'lang_stats' of every page in the json file holds the keys of its language versions, whose
+stats are in their own pages. For tools that read the older format with copies of the stats:
+  --lang-stats copies     Save copies of the stats in 'lang_stats'
+
+The html and csv reports are rendered at the same time in a pool of processes after the scrape:
+  --report-workers N      Number of processes (default one per report, at most the number of cores,
+                          1 to render them one after the other)
+
+Pages are written to a journal in journal/ while scraping. If the scrape is interrupted,
+it can be continued with: python3 fredrikas_lupp.py resume CATEGORY
         ''')
         utils.exit_program(start)
-    success = scrape.scrape_launch(d, e, sites, api_fields, max_depth, blacklist, top_category, languages)
+    if cmd == "resume" and top_category == 'help':
+        print('''
+Continue a scrape of CATEGORY that was interrupted, from its journal in journal/CATEGORY.jsonl.
+
+Usage: python3 fredrikas_lupp.py resume CATEGORY
+
+Pages that are already in the journal are not fetched again. The languages and max depth
+the scrape was started with are used, other options are given as for scrape.
+        ''')
+        utils.exit_program(start)
+    previous = None
+    if 'incremental' in options:
+        # pages unchanged since the previous scrape are copied from its json file
+        previous_file = jsonfile if options['incremental'] == 'latest' else Path(options['incremental'])
+        if previous_file.exists():
+            print(f"Inkrementell skrapning, jämför med {previous_file}")
+            previous = record.load_json_file(previous_file, keys=('pages',))['pages']
+        else:
+            print(f"Filen {previous_file} saknas, skrapar alla sidor")
+    if cmd == "resume" and not journal.exists():
+        print(f"Ingen journal {journal.path} att fortsätta från, använd scrape {top_category}")
+        utils.exit_program(start)
+    success = scrape.scrape_launch(d, e, sites, api_fields, max_depth, blacklist, top_category, languages,
+                                   engine=engine, concurrency=concurrency, workers=workers,
+                                   journal=journal, resume=cmd == "resume", previous=previous)
     if not success:
+        journal.remove()
         utils.exit_program(start)
     file_date = d['stats']['scrape_start'][:10]
+    if options.get('lang-stats') == 'copies':
+        analysis.expand_lang_stats(d)
     utils.save_json_file(jsonfile, d, dir_date=file_date)
     utils.save_json_file(errfile, e, dir_date=file_date)
+    if options.get('snapshots', 'on') != 'off':
+        SnapshotStore().save(d, Path("json") / file_date / jsonfile.name)
+    # the scrape is saved, nothing left to resume
+    journal.remove()
     utils.save_used_cache(jsonfile)
-    scrape.save_as_html(d, e, api_fields, top_category)
-    scrape.save_as_html_lang(d, e, api_fields, top_category)
-    scrape.save_as_csv(d, e, api_fields, top_category)
+    reports.render(d, e, api_fields, top_category, ('html', 'html_lang', 'csv'), workers=report_workers)
 
     utils.exit_program(start)
 
@@ -117,16 +265,14 @@ if cmd == "scrapeb":
         print('''
 Same as scrape, but only scrapes secondary language. Only for development use.
         ''')
-    d = json.load(open(jsonfile))
-    scrape.scrapeb_launch(d, e, max_depth, sites, blacklist, api_fields)
+    d = record.load_json_file(jsonfile)
+    scrape.scrapeb_launch(d, e, max_depth, sites, blacklist, api_fields, workers=workers)
 
     file_date = d['stats']['scrape_start'][:10]
     utils.save_json_file(jsonfile, d, dir_date=file_date)
     utils.save_json_file(errfile, e, dir_date=file_date)
     utils.save_used_cache(jsonfile)
-    scrape.save_as_html(d, e, api_fields, top_category)
-    scrape.save_as_html_lang(d, e, api_fields, top_category)
-    scrape.save_as_csv(d, e, api_fields, top_category)
+    reports.render(d, e, api_fields, top_category, ('html', 'html_lang', 'csv'), workers=report_workers)
     utils.exit_program(start)
 
 if cmd == "scrape_list":
@@ -152,9 +298,7 @@ Beep Boop
     utils.save_json_file(jsonfile, tot, dir_date=file_date)
     utils.save_json_file(errfile, e, dir_date=file_date)
     utils.save_used_cache(jsonfile)
-    scrape.save_as_html(d, e, api_fields, top_category)
-    scrape.save_as_html_lang(d, e, api_fields, top_category)
-    scrape.save_as_csv(d, e, api_fields, top_category)
+    reports.render(d, e, api_fields, top_category, ('html', 'html_lang', 'csv'), workers=report_workers)
 
     utils.exit_program(start)
 
@@ -175,7 +319,7 @@ file in html/DATE/ direcotry and selects this categry as to be used for next com
     if not json_exists:
         print(f"Filen {jsonfile} saknas. Ett rent faktum. Tyrckfel?")
         utils.exit_program(start)
-    d = json.load(open(jsonfile))
+    d = record.load_json_file(jsonfile)
 
     utils.save_used_cache(jsonfile)
     scrape.save_as_html_graphic(d, e, api_fields, top_category)
@@ -203,7 +347,7 @@ file in html/DATE/ direcotry and selects this categry as to be used for next com
     if not json_exists:
         print(f"Filen {jsonfile} saknas. Ett rent faktum. Tyrckfel?")
         utils.exit_program(start)
-    d = json.load(open(jsonfile))
+    d = record.load_json_file(jsonfile)
 
     utils.save_used_cache(jsonfile)
     scrape.save_as_html(d, e, api_fields, top_category)
@@ -228,7 +372,7 @@ File is saved under wikitext/DATE/ directory.
     if not json_exists:
         print(f"Filen {jsonfile} saknas. Ett rent faktum. Tyrckfel?")
         utils.exit_program(start)
-    d = json.load(open(jsonfile))
+    d = record.load_json_file(jsonfile)
 
     scrape.save_as_wikitext(d, e, api_fields, top_category, page_type='top100')
     print("---------------")
@@ -248,15 +392,42 @@ Usage: python3 fredrikas_lupp.py page Nagu
     if not json_exists:
         print(f"Filen {used_cache['cache']} saknas. Ett rent faktum. Tyrckfel?")
         utils.exit_program(start)
-    d = json.load(open(used_cache['cache']))
-    page_name = f"{top_category} ({d['stats']['lang_1']})"
+    # only the stats and the page are read from the json file
+    stats = record.load_json_file(used_cache['cache'], keys=('stats',))['stats']
+    page_name = f"{top_category} ({stats['lang_1']})"
     print(f"\nInformation om sidan: {page_name}")
     try:
+        d = {'stats': stats, 'pages': {page_name: record.load_page(used_cache['cache'], page_name)}}
         print(scrape.wikitext_page(d, e, page_name, fmt='print'))
     except KeyError as ke:
         print(f"Hittade inte sidan {top_category}, använder du rätt cache - {used_cache['title']}?")
     utils.exit_program(start)
 
+if cmd == 'pprint':
+    if top_category == 'help':
+        print('''
+Save a more easily readable copy of the json file of CATEGORY in pprint/DATE/.
+
+Usage: python3 fredrikas_lupp.py pprint CATEGORY [--pprint pprint|json|jsonl]
+
+The format is chosen with --pprint:
+  --pprint pprint         The python dict, pretty printed (default)
+  --pprint json           Indented json
+  --pprint jsonl          Json lines, one line for every page
+
+The same option can be given to scrape, resume, use and visual to save the copy every time
+the json file is saved. Without it no copy is saved, as for large categories the copy takes
+longer to write than the json file.
+        ''')
+        utils.exit_program(start)
+    json_exists = os.path.isfile(jsonfile)
+    if not json_exists:
+        print(f"Filen {jsonfile} saknas. Ett rent faktum. Tyrckfel?")
+        utils.exit_program(start)
+    d = record.load_json_file(jsonfile)
+    utils.save_pprint_file(jsonfile.name, d, dir_date=jsonfile.parent.name, fmt=options.get('pprint', 'pprint'))
+    utils.exit_program(start)
+
 if cmd == 'analyze':
     if top_category == 'help':
         print('''
@@ -264,14 +435,89 @@ Visualize groth of CATEGORY based on existing json files. Produces pdf file with
 table showing the growth of a category over time. The file is saved in the analysis/ directory.
 Requires atleast two json files for CATEGORY to be albe to produce a graph.
 
+The stats are read from the snapshots in snapshots/snapshots.sqlite, json files of CATEGORY
+that are not there yet are added first.
+
 Usage: python3 fredrikas_lupp.py analyze CATEGORY
         ''')
         utils.exit_program(start)
     plot.save_plot(top_category, languages.split('|')[0])
     utils.exit_program(start)
 
+if cmd == "contributors" and ('across' in options or 'user' in options):
+    # answered from the contributor index in the snapshot store, without loading any json file
+    store = SnapshotStore()
+    updated = store.update_contributor_index()
+    if updated:
+        print(f"Uppdaterade bidragsgivarindexet för {updated} kategorier i {store.path}")
+    if 'user' in options:
+        user_edits = {}
+        for category, lang, edits in store.user_edits(options['user']):
+            user_edits.setdefault(category, {})[lang] = edits
+        if not user_edits:
+            print(f"Hittade inga bidrag av {options['user']} i {store.path}")
+        for category, edits in user_edits.items():
+            print(f"{category:<40} " + ", ".join(f"{lang} {n}" for lang, n in edits.items()))
+    else:
+        langs = languages.split('|')
+        categories = None if options['across'] == 'all' else options['across'].split('|')
+        print(f"{'Nr':>5} {'Wikipedian':<30}" + "".join(f"{lang:>8}" for lang in langs) +
+              f"{'Totalt':>8}{'Kategorier':>12}")
+        ranking = store.contributor_ranking(langs, categories, top=contributors_top)
+        for i, (user, *edits, total, n_categories) in enumerate(ranking, 1):
+            print(f"{i:>5} {user:<30}" + "".join(f"{n:>8}" for n in edits) + f"{total:>8}{n_categories:>12}")
+    store.close()
+    utils.exit_program(start)
+
+if cmd == 'replay_server':
+    if top_category == 'help':
+        print('''
+Serve API responses recorded with 'scrape CATEGORY --record FILE' as a local stand-in for api.php,
+on http://localhost:PORT/LANG/w/api.php, until stopped with Ctrl-C.
+
+Usage: python3 fredrikas_lupp.py replay_server --replay FILE [--port 8080] [--latency S] [--page-size N]
+
+Example: python3 fredrikas_lupp.py replay_server --replay fixtures/Nagu.jsonl.gz
+         python3 fredrikas_lupp.py scrape Nagu --api-url 'http://localhost:8080/{lang}/w/api.php'
+        ''')
+        utils.exit_program(start)
+    if replayer is None:
+        print("Ange inspelade svar med --replay FILE")
+        utils.exit_program(start)
+    serve(replayer, port=int(options.get('port', 8080)))
+    utils.exit_program(start)
+
+if cmd == 'bench':
+    if top_category == 'help':
+        print('''
+Benchmark the stages after scraping (analyse, json, html, csv, wikitext, contributors) on synthetic
+scrapes of the given sizes, with wall time, peak memory and allocations for every stage.
+Results are saved in bench/DATE/bench.json, and compared with an earlier results file with --compare.
+With --replay FILE --category CATEGORY the scrape of CATEGORY is also timed, from recorded responses.
+
+Usage: python3 fredrikas_lupp.py bench [SIZES] [--compare FILE] [--stages a|b] [--memory off]
+                                       [--replay FILE --category CATEGORY] [--latency S]
+
+Example: python3 fredrikas_lupp.py bench '1k|10k|100k'
+         python3 fredrikas_lupp.py bench 10k --stages 'analyse|html' --compare bench/2019-06-14/bench.json
+        ''')
+        utils.exit_program(start)
+    sizes = [bench.parse_size(s) for s in (argv[2] if cnt_arg > 2 else "1k|10k").split('|')]
+    extra_stages = {}
+    if 'replay' in options and 'category' in options:
+        extra_stages['scrape'] = bench.scrape_stage(options['replay'], options['category'], languages,
+                                                    latency=float(options.get('latency', 0)))
+    results = bench.run(sizes, api_fields, stages=options['stages'].split('|') if 'stages' in options else None,
+                        memory=options.get('memory', 'on') != 'off', extra_stages=extra_stages)
+    compare = json.load(open(options['compare'])) if 'compare' in options else None
+    regressions = bench.print_results(results, compare)
+    bench.save_results(results, "bench.json")
+    if regressions:
+        print(f"{len(regressions)} steg långsammare än i {options['compare']}")
+    utils.exit_program(start)
+
 try:
-    d = json.load(open(jsonfile))
+    d = record.load_json_file(jsonfile)
     title = d['stats']['category_title']
     lang = d['stats']['lang_1']
     print(f"Used cache: {title} ({lang})")
@@ -292,9 +538,23 @@ Creates a list of contributors ordered based on number of contributions. The htm
 is saved in html/DATE/.
 
 Usage: python3 fredrikas_lupp.py contributors CATEGORY
+
+Only the N contributors with most contributions are listed with:
+  --top N                 List only the top N contributors
+
+Example: python3 fredrikas_lupp.py contributors Nagu --top 500
+
+The contributors of all scraped categories are kept in an index in snapshots/snapshots.sqlite,
+updated when a scrape is saved. Rankings across categories are answered from it with:
+  --across all            Rank the contributors by their edits in all categories
+  --across 'Nagu|Pargas'  Rank the contributors by their edits in these categories
+  --user NAME             Show the edits of NAME in every category
+
+Example: python3 fredrikas_lupp.py contributors --across all --top 100
+         python3 fredrikas_lupp.py contributors --user Fredrika
         ''')
         utils.exit_program(start)
-    scrape.analyse_and_save_contributors(d, e, top_category)
+    scrape.analyse_and_save_contributors(d, e, top_category, top=contributors_top)
 
 elif cmd == "contributors_w":
     if top_category == 'help':
@@ -305,9 +565,11 @@ is saved in wikitext/DATE/.
 Works the same as the command contributors except the saved file is in wikitext markup and not html.
 
 Usage: python3 fredrikas_lupp.py contributors_w CATEGORY
+
+Only the N contributors with most contributions are listed with --top N.
         ''')
         utils.exit_program(start)
-    scrape.analyse_and_save_contributors(d, e, top_category, fmt="wikitext")
+    scrape.analyse_and_save_contributors(d, e, top_category, fmt="wikitext", top=contributors_top)
 
 elif cmd == "publish":
     if top_category == 'help':
@@ -319,12 +581,15 @@ Since editing a mediawiki requires signing in, credentials can either be provide
 enviroment variables WIKISITE, WIKIUSER, WIKIPASSWORD, or be inputted manually when running the script.
 
 Usage: python3 fredrikas_lupp.py publish CATEGORY
+
+The files to publish are rendered at the same time in a pool of processes, how many
+can be given with --report-workers N.
         ''')
         utils.exit_program(start)
     if int(max_depth) == 0:
-        scrape.publish(d, e, api_fields, top_category, subpages=False)
+        scrape.publish(d, e, api_fields, top_category, subpages=False, report_workers=report_workers)
     else:
-        scrape.publish(d, e, api_fields, top_category)
+        scrape.publish(d, e, api_fields, top_category, report_workers=report_workers)
 
 elif cmd == "list":
     if top_category == 'help':
@@ -365,6 +630,7 @@ Example: python3 fredrikas_lupp.py scrape Nagu
 
 Commands:
   scrape CATEGORY         Run new scrape for CATEGORY and save josn file with the data
+  resume CATEGORY         Continue an interrupted scrape of CATEGORY from its journal
 
   If CATEGORY contains '.txt' ending, instead of using a category, a list of pages will be used.
   THe list needs to be supplied as a text file named 'CATEGORY.txt'.
@@ -377,7 +643,11 @@ Commands:
   list                    Show list of existing josn files
   split CATEGORY          Use exisitng josn file and split main cateogry into all its subcategories
   page CATEGORY           Show stats for a single page. Category first has to be choosen with 'use CATEGORY'
+  pprint CATEGORY         Save a more easily readable copy of the json file of CATEGORY in pprint/
   analyze CATEGORY        Visualize growth of CATEGORY based on existing josn files. Requires at least 2 files.
+  replay_server           Serve API responses recorded with 'scrape CATEGORY --record FILE' on localhost,
+                          given with --replay FILE
+  bench [SIZES]           Time analysis and reports on synthetic scrapes of SIZES pages, e.g. '1k|10k'
 
 For more information about specific commands use: python3 frderikas_lupp.py command help
 
@@ -1,2 +1,2 @@
 
-__all__ = ["fmt", "html", "scrape", "plot", "wikitext", "utils"]
+__all__ = ["fmt", "html", "scrape", "plot", "wikitext", "utils", "session", "scrape_async", "store", "ratelimit", "journal", "cache", "replay", "bench", "analysis", "record", "pageindex", "jsonstream", "snapshots", "reports"]
@@ -0,0 +1,273 @@
+"""
+Analysis of the scraped pages, done once per dataset and shared by all reports
+
+The 'stats' and 'lang_stats' dicts of every page and the pageview interval in d['stats'] are computed by
+analyse(..). 'lang_stats' only holds the keys of the language versions of the page, {lang: page key}, and their stats
+are looked up in the pages with LangStats when a report needs them, instead of being copied into every page. The
+html, csv and wikitext reports all need them, so analyse(..) remembers the dataset it analysed last and does nothing
+when called again for the same pages, until the pages change or invalidate(..) is called.
+"""
+
+import copy
+import threading
+from array import array
+from collections.abc import Mapping
+from operator import attrgetter, itemgetter
+
+from lupp.pageindex import page_index
+from lupp.record import PageRecord
+from lupp.utils import days_between
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# weights of the stats of a page in its quality
+QUALITY_WEIGHTS = {'categories_cnt': 3, 'images_cnt': 4, 'langlinks_cnt': 4, 'links_cnt': 1, 'linkshere_cnt': 1,
+                   'extlinks_cnt': 2, 'redirects_cnt': 3, 'contributors_tot': 1}
+# value in a StatsTable column for a page without the stat
+MISSING = -1
+
+_lock = threading.Lock()
+_latest = None
+
+
+class StatsTable:
+    """Integer stats of all pages in columns, an array per stat with one row per page
+
+    Row i of every column is the page with key keys[i], a page that does not have the stat has MISSING there.
+    Sums over columns are computed with numpy when it is installed.
+    """
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+        self.columns = {}
+
+    def add(self, name, values):
+        self.columns[name] = array('q', values)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def get(self, key, name, default=None):
+        """Return stat name of page key, default if the page does not have it"""
+        value = self.columns[name][self.rows[key]]
+        return default if value == MISSING else value
+
+    def weighted_sum(self, weights):
+        """Return column with sum of weight * stat for every page, MISSING for pages without any of the stats"""
+        if numpy is not None:
+            columns = [numpy.frombuffer(self.columns[name], dtype=numpy.int64) for name in weights]
+            total = numpy.zeros(len(self.keys), dtype=numpy.int64)
+            missing = numpy.zeros(len(self.keys), dtype=bool)
+            for weight, column in zip(weights.values(), columns):
+                total += weight * column
+                missing |= column == MISSING
+            total[missing] = MISSING
+            return array('q', total.tobytes())
+        return array('q', (MISSING if MISSING in row else sum(w * v for w, v in zip(weights.values(), row))
+                           for row in zip(*(self.columns[name] for name in weights))))
+
+
+class Analysis:
+    """Result of analysing the pages of d with api_fields
+
+    The stats are written into the pages of d, as the reports and the json files expect them there. The analysis
+    is valid as long as d holds the same pages dict with the same number of pages, and no scrape has been started
+    on d since. If the pages were missing data, the KeyError is kept in error and raised again for every report.
+    table is the StatsTable of the pages, with the stats as integers.
+    """
+    def __init__(self, d, api_fields):
+        self.d = d
+        self.pages = d['pages']
+        self.n_pages = len(d['pages'])
+        self.api_fields = api_fields
+        self.table = None
+        self.error = None
+
+    def valid_for(self, d, api_fields):
+        return (self.d is d and d.get('pages') is self.pages and len(self.pages) == self.n_pages
+                and self.api_fields == api_fields)
+
+    def run(self, e):
+        try:
+            self.table = analyse_pagestats(self.d, e, self.api_fields)
+            analyse_time_interval(self.d, e)
+            analyse_langstats(self.d, e)
+        except KeyError as ke:
+            self.error = ke
+
+
+class LangStats(Mapping):
+    """Read-only {lang: stats} of the language versions of a page, from the page keys in its 'lang_stats'
+
+    Json files saved before 'lang_stats' held page keys have copies of the stats there, those are returned as they
+    are. A language version that is not in d['pages'] is left out.
+    """
+    def __init__(self, d, page):
+        self.pages = d['pages']
+        self.refs = page.get('lang_stats', {})
+
+    def __getitem__(self, lang):
+        ref = self.refs[lang]
+        if isinstance(ref, dict):
+            return ref
+        return self.pages[ref]['stats']
+
+    def __iter__(self):
+        return (lang for lang in self.refs if lang in self)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, lang):
+        ref = self.refs.get(lang)
+        return isinstance(ref, dict) or ref in self.pages
+
+
+def expand_lang_stats(d):
+    """Replace the page keys in 'lang_stats' of all pages with copies of the stats, as in older json files"""
+    for page in d['pages'].values():
+        if 'lang_stats' in page:
+            page['lang_stats'] = {lang: copy.deepcopy(stats) for lang, stats in LangStats(d, page).items()}
+
+
+def analyse(d, e, api_fields, force=False):
+    """Analyse the pages of d, unless they have already been analysed, and return the Analysis
+
+    Raises KeyError if the pages are missing data, like analyse_pagestats(..) would.
+    """
+    global _latest
+    with _lock:
+        if force or _latest is None or not _latest.valid_for(d, api_fields):
+            _latest = Analysis(d, api_fields)
+            _latest.run(e)
+        result = _latest
+    if result.error is not None:
+        raise result.error
+    return result
+
+
+def invalidate(d):
+    """Forget the analysis of d, when its pages are about to change"""
+    global _latest
+    with _lock:
+        if _latest is not None and _latest.d is d:
+            _latest = None
+
+
+def analyse_pagestats(d, e, api_fields):
+    """Analyze data scraped and create 'stats' dict for each page.
+
+    Analyze data scraped and create 'stats' dict for each page. The stat dict contains:
+     'stats': {'categories_cnt': 3,
+          'contributors_cnt': 7,
+          'contributors_tot': 7,
+          'extlinks_cnt': 5,
+          'images_cnt': 4,
+          'langlinks_cnt': 1,
+          'len_sv': 4444,
+          'links_cnt': 36,
+          'linkshere_cnt': 2,
+          'pageviews_sv': 1,
+          'pageviews_tot': 1,
+          'quality': 84,
+          'redirects_cnt': 0,
+          'revisions_cnt': 3,
+          'total_langs': 1},
+
+    Quality is a value calculated based on different aspects of the page, for example length, image count,
+    number of different language links, external links etc. The rest of the stats are directly taken from the
+    scraped data.
+
+    The numbers are counted in a StatsTable, which is returned, and the quality of all pages is computed from its
+    columns at once. Json files saved before the table have the numbers as strings, so readers of them use int(..).
+
+    'lang_stats' of a sv or fi page gets its own key for its language, e.g. {'sv': 'Nagu (sv)'}, and
+    analyse_langstats(..) adds the keys of the other language versions. Use LangStats to read their stats.
+
+    """
+    pages = d['pages']
+    fields = api_fields["has_title"] + api_fields["other"]
+    # PageRecords have the fields as attributes, which are faster to get than items
+    get_fields = attrgetter(*fields) if isinstance(next(iter(pages.values()), None), PageRecord) else \
+        itemgetter(*fields)
+
+    def counts(page):
+        try:
+            lengths = tuple(map(len, get_fields(page)))
+        except (KeyError, AttributeError):
+            lengths = tuple(len(page[fld]) if fld in page else MISSING for fld in fields)
+        # pageviews of a day are None when there is no data for it
+        pageviews = sum(filter(None, page['pageviews'].values())) if 'pageviews' in page else 0
+        return (int(page.get('anoncontributors', 0)) + len(page['contributors']),) + lengths + (pageviews,)
+
+    # count all pages first, one row each, then fill the table a column at a time
+    names = ['contributors_tot'] + [fld + "_cnt" for fld in fields] + ['pageviews_tot']
+    table = StatsTable(pages)
+    columns = list(zip(*map(counts, pages.values()))) or [()] * len(names)
+    for name, column in zip(names, columns):
+        table.add(name, column)
+    table.columns['quality'] = table.weighted_sum(QUALITY_WEIGHTS)
+
+    names.insert(-1, 'quality')
+    index = page_index(d)
+    has_missing = any(MISSING in table[name] for name in names)
+    rows = zip(pages.items(), zip(*(table[name] for name in names)))
+    for (p, page), values in rows:
+        if has_missing:
+            stats = {name: value for name, value in zip(names, values) if value != MISSING}
+        else:
+            stats = dict(zip(names, values))
+        page['stats'] = stats
+        lang = index.lang(p)
+        if lang == 'sv':
+            stats['pageviews_sv'] = stats['pageviews_tot']
+            stats['len_sv'] = page['length']
+            page['lang_stats'] = {'sv': p}
+        elif lang == 'fi':
+            stats['pageviews_fi'] = stats['pageviews_tot']
+            stats['len_fi'] = page['length']
+            page['lang_stats'] = {'fi': p}
+        else:
+            page['lang_stats'] = {}
+        if has_missing and 'quality' not in stats:
+            # the page is missing a field that the quality is counted from
+            raise KeyError(next(name for name in QUALITY_WEIGHTS if name not in stats))
+    return table
+
+
+def analyse_langstats(d, e):
+    """"Analyze language data for all pages.
+
+    Analyze language data for all pages. Links stats from pages in other languages together
+     with same page in main language."""
+    languages = set(d['stats']['languages'].split("|"))
+    pages = d['pages']
+    index = page_index(d)
+    for p, page in pages.items():
+        stats = page['stats']
+        stats['total_langs'] = len(page['langlinks'])
+        for l, p_in_lang in index.versions(p).items():
+            if l in languages:
+                page_in_lang = pages[p_in_lang]
+                stats["pageviews_" + l] = page_in_lang['stats']['pageviews_tot']
+                stats["len_" + l] = page_in_lang.get('length', -1)
+                page["lang_stats"][l] = p_in_lang
+
+
+def analyse_time_interval(d, e):
+    """Add information about pageview data to main 'stats' dict.
+
+    Analyze pageview data and add start date, end date, and duration in days to main 'stats' part of dict."""
+    first = "2099-12-13"
+    last = "1899-01-01"
+    # nearly all pages have pageviews for the same dates, so only look at every different set of dates once
+    date_sets = {tuple(page['pageviews']) for page in d['pages'].values() if page.get('pageviews')}
+    for dates in date_sets:
+        first = min(first, min(dates))
+        last = max(last, max(dates))
+    d['stats']['date_from'] = first
+    d['stats']['date_to'] = last
+    d['stats']['pv_days'] = days_between(first, last) + 1
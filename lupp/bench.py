@@ -0,0 +1,235 @@
+"""
+Benchmarks for the scrape -> analyse -> render pipeline
+
+Generates a synthetic scrape in the same shape as the 'global' dict d (see the top of lupp.scrape), then runs every
+stage after the scrape on it: analysis, json file, html, csv and wikitext reports and contributors.
+Each stage is timed on its own, and run once more under tracemalloc for peak memory and the memory blocks it leaves
+allocated. The results can be saved as json and compared with an earlier run, so slower stages are seen before the
+weekly scrapes.
+"""
+
+import contextlib
+import gc
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+
+from lupp import analysis, record, scrape, utils
+from lupp.replay import ResponseReplayer
+from lupp.session import WikiSessions
+
+LANG_SHARE = {'sv': 0.9, 'fi': 0.8, 'en': 0.6, 'de': 0.4}
+PAGES_PER_CATEGORY = 100
+PV_DAYS = 60
+# a stage this much slower than in the compared run is reported as a regression
+REGRESSION_LIMIT = 1.2
+
+
+def parse_size(size):
+    """Return number of pages for '1000', '10k' or '1M'"""
+    size = size.strip().lower()
+    factor = {'k': 1000, 'm': 1000000}.get(size[-1:], 1)
+    return int(float(size.rstrip('km')) * factor)
+
+
+def synthetic_data(n_pages, languages="sv|fi|en|de", seed=0):
+    """Return dict d for a synthetic scrape with about n_pages pages in a tree of categories
+
+    Every article exists in each language with the probability in LANG_SHARE, and has language links to its other
+    language versions. Categories in the primary language hold PAGES_PER_CATEGORY articles each, like a scrape of
+    a category tree where the walk and the language links have been followed.
+    """
+    rnd = random.Random(seed)
+    langs = languages.split('|')
+    lang_1, lang_2 = langs[:2]
+    users = [f"User{i}" for i in range(max(50, n_pages // 20))]
+    link_pool = [f"Link {i}" for i in range(max(100, n_pages // 5))]
+    start = date(2019, 4, 14)
+    days = [str(start + timedelta(days=i)) for i in range(PV_DAYS)]
+    share = sum(LANG_SHARE.get(l, 0.3) for l in langs)
+    n_articles = max(1, int(n_pages / share))
+
+    d = {'stats': {}, 'blacklist': {}, 'categories': {}, 'pages': {}}
+    d['stats'] = {'category_title': 'Bench', 'languages': languages, 'lang_1': lang_1, 'lang_2': lang_2,
+                  'categories_cnt': 0, 'pages_cnt': 0, 'scrape_start': '2019-06-14 12:56:56',
+                  'scraped': '2019-06-14 12:57:20', 'response_time_s': '0'}
+
+    def new_page(title, lang, is_category=False):
+        n_links = rnd.randint(5, 50)
+        return {'title': title, 'is_category': is_category, 'pagelanguage': lang,
+                'touched': '2019-06-01 10:00:00', 'lastrevid': str(rnd.randint(1, 10 ** 8)),
+                'length': str(rnd.randint(100, 60000)), 'anoncontributors': str(rnd.randint(0, 5)),
+                'pageviews': {day: (rnd.randint(0, 300) if rnd.random() > 0.02 else None) for day in days},
+                'contributors': rnd.sample(users, rnd.randint(1, min(30, len(users)))),
+                'redirects': [f"{title} {i}" for i in range(rnd.randint(0, 3))],
+                'linkshere': rnd.sample(link_pool, rnd.randint(0, 20)),
+                'links': rnd.sample(link_pool, min(n_links, len(link_pool))),
+                'images': [f"Fil:{title} {i}.jpg" for i in range(rnd.randint(0, 5))],
+                'categories': [f"Kategori:{title[:3]}"],
+                'extlinks': [f"https://example.org/{i}" for i in range(rnd.randint(0, 10))],
+                'langlinks': [],
+                'revisions': [{'user': rnd.choice(users), 'timestamp': '2019-05-01T10:00:00Z', 'comment': ''}
+                              for _ in range(rnd.randint(0, 10))],
+                'sections': [f"Rubrik {i}" for i in range(rnd.randint(0, 8))]}
+
+    n_categories = max(1, n_articles // PAGES_PER_CATEGORY)
+    for i_cat in range(n_categories):
+        cat_title = f"Kategori:Bench {i_cat}"
+        key = f"{cat_title} ({lang_1})"
+        d['stats']['categories_cnt'] += 1
+        d['categories'][key] = {f'title_{lang_1}': cat_title,
+                                'pages': {key: {f'title_{lang_1}': cat_title}},
+                                'order': d['stats']['categories_cnt']}
+        d['pages'][key] = new_page(cat_title, lang_1, is_category=True)
+
+    for i in range(n_articles):
+        versions = {l: f"Artikel {i} {l}" for l in langs if rnd.random() < LANG_SHARE.get(l, 0.3)}
+        if not versions:
+            continue
+        cat_key = f"Kategori:Bench {i % n_categories} ({lang_1})"
+        for lang, title in versions.items():
+            page = new_page(title, lang)
+            page['langlinks'] = [{l: t} for l, t in versions.items() if l != lang]
+            d['pages'][f"{title} ({lang})"] = page
+        # pages missing from primary language are listed from the category in secondary language
+        list_lang = lang_1 if lang_1 in versions else lang_2 if lang_2 in versions else None
+        if list_lang is not None:
+            key = f"{versions[list_lang]} ({list_lang})"
+            d['categories'][cat_key]['pages'][key] = {f'title_{list_lang}': versions[list_lang]}
+    d['stats']['pages_cnt'] = len(d['pages'])
+    # as loaded from a json file
+    d['pages'] = record.from_json(d['pages'])
+    return d
+
+
+def _analyse(d, e, api_fields):
+    analysis.analyse(d, e, api_fields, force=True)
+
+
+# stage name -> function(d, e, api_fields) run on the analysed data
+STAGES = {
+    'analyse': _analyse,
+    'save_json': lambda d, e, api_fields: utils.save_json_file(Path("Bench.json"), d),
+    'html': lambda d, e, api_fields: scrape.save_as_html(d, e, api_fields, "Bench"),
+    'html_lang': lambda d, e, api_fields: scrape.save_as_html_lang(d, e, api_fields, "Bench"),
+    'html_graphic': lambda d, e, api_fields: scrape.save_as_html_graphic(d, e, api_fields, "Bench"),
+    'csv': lambda d, e, api_fields: scrape.save_as_csv(d, e, api_fields, "Bench"),
+    # fixed language names, so the stage renders only and does not ask the wiki for them
+    'wikitext': lambda d, e, api_fields: scrape.save_as_wikitext(d, e, api_fields, "Bench",
+                                                                 lang_names=scrape.LANG_NAMES),
+    'contributors': lambda d, e, api_fields: scrape.analyse_and_save_contributors(d, e, "Bench"),
+}
+
+
+def _run_stage(func, d, e, api_fields, memory=True):
+    """Run func once for wall time and, if memory, once more under tracemalloc, return dict with the results
+
+    'peak_mb' is the highest memory use during the stage, 'allocations' the number of blocks still allocated by it
+    when it returns, e.g. results kept in d or caches.
+    """
+    result = {}
+    gc.collect()
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        func(d, e, api_fields)
+        result['wall_s'] = round(time.perf_counter() - t0, 4)
+        if memory:
+            gc.collect()
+            tracemalloc.start()
+            func(d, e, api_fields)
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            result['peak_mb'] = round(peak / 2 ** 20, 2)
+            result['allocations'] = sum(stat.count for stat in snapshot.statistics('filename'))
+    return result
+
+
+def scrape_stage(replay, category, languages, latency=0.0):
+    """Return stage function that scrapes category from the responses recorded in replay, without network
+
+    A new d is scraped on every call, the d given to the stage function is not used.
+    """
+    replayer = ResponseReplayer(replay, latency=latency)
+
+    def stage(d, e, api_fields):
+        sites = WikiSessions(languages.split('|'), rate=0, transport=replayer, cache=None)
+        if not scrape.scrape_launch({}, {'timestamp': {}}, sites, api_fields, 10, [], category, languages):
+            raise RuntimeError(f"scrape of {category} failed, {replayer.stats['missing']} responses missing")
+    return stage
+
+
+def run(sizes, api_fields, stages=None, memory=True, seed=0, extra_stages=None):
+    """Run benchmark stages for synthetic data of each size, return {size: {stage: results}}
+
+    The reports are written in a temporary directory, which is removed afterwards. extra_stages is a dict of
+    more stage functions, like the one from scrape_stage(..), run once before the sizes under the size 0.
+    """
+    stages = stages or list(STAGES)
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            for stage, func in (extra_stages or {}).items():
+                try:
+                    results.setdefault(0, {})[stage] = _run_stage(func, {}, {}, api_fields, memory=memory)
+                except Exception as ex:
+                    results[0][stage] = {'error': repr(ex)}
+            for size in sizes:
+                t0 = time.perf_counter()
+                d = synthetic_data(size, seed=seed)
+                e = {'timestamp': {}}
+                results[size] = {'generate': {'wall_s': round(time.perf_counter() - t0, 4),
+                                              'pages': len(d['pages'])}}
+                # renderers expect analysed data, as after scrape_launch(..)
+                if 'analyse' not in stages:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        _analyse(d, e, api_fields)
+                for stage in stages:
+                    try:
+                        results[size][stage] = _run_stage(STAGES[stage], d, e, api_fields, memory=memory)
+                    except Exception as ex:
+                        results[size][stage] = {'error': repr(ex)}
+                del d
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def print_results(results, compare=None):
+    """Print table of results, with change in % against the results in compare if given"""
+    print(f"{'sidor':>8} {'steg':<14} {'tid s':>9} {'topp MB':>9} {'allokeringar':>13}  jämfört")
+    regressions = []
+    for size, stages in results.items():
+        for stage, r in stages.items():
+            if 'error' in r:
+                print(f"{size:>8} {stage:<14} fel: {r['error']}")
+                continue
+            change = ""
+            old = (compare or {}).get(str(size), {}).get(stage, {})
+            if old.get('wall_s'):
+                ratio = r['wall_s'] / old['wall_s']
+                change = f"{100 * (ratio - 1):+.0f} %"
+                if ratio > REGRESSION_LIMIT and r['wall_s'] > 0.1:
+                    change += " LÅNGSAMMARE"
+                    regressions.append((size, stage))
+            print(f"{size:>8} {stage:<14} {r['wall_s']:>9.3f} {r.get('peak_mb', ''):>9} "
+                  f"{r.get('allocations', ''):>13}  {change}")
+    return regressions
+
+
+def save_results(results, filename):
+    """Save results as json in bench/DATE/filename"""
+    path = Path("bench") / str(date.today())
+    utils.make_dir(path)
+    path = path / filename
+    json.dump({str(size): stages for size, stages in results.items()}, open(path, 'w'), indent=1)
+    print(f"Skrev {path}")
+    return path
@@ -0,0 +1,138 @@
+"""
+On-disk cache for the MediaWiki API responses of the lupp.scrape module
+
+Responses are stored in an sqlite file, keyed on the language and the normalised request parameters, so running
+scrape after scrapeb, or again after a failed scrape, does not send the same requests again. Every endpoint has its
+own time to live, and when the cache grows over its max size the least recently used responses are removed.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from lupp import utils
+
+# seconds a response is used, looked up with the most specific endpoint name first, see ResponseCache.endpoint(..)
+DEFAULT_TTLS = {
+    'query:categorymembers': 3600,
+    'query:info|pageviews': 600,
+    'query:revisions': 6 * 3600,
+    'parse': 24 * 3600,
+    'query': 12 * 3600,
+    '*': 12 * 3600,
+}
+# parameters that do not change the response
+IGNORED_PARAMS = ('format', 'maxlag', 'formatversion', 'utf8')
+
+
+class ResponseCache:
+    """Response cache in an sqlite file, with a time to live per endpoint and LRU eviction by total size
+
+    WikiSessions uses any object with get(lang, params) and put(lang, params, result) as cache, this one keeps the
+    responses on disk between runs.
+    """
+    def __init__(self, path=Path("cache") / "responses.sqlite", max_bytes=500 * 2 ** 20, ttls=None):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0}
+        utils.make_dir(self.path.parent)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, endpoint TEXT, "
+                         "created REAL, accessed REAL, size INTEGER, body TEXT)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._db.commit()
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        utils.exit_reports.append(self.print_stats)
+
+    @staticmethod
+    def endpoint(params):
+        """Return name of the endpoint of a request, eg. 'query:categorymembers' or 'parse'"""
+        action = params.get('action', 'query')
+        if action != 'query':
+            return action
+        what = params.get('list') or params.get('meta') or params.get('prop', '')
+        return f"{action}:{what}"
+
+    @staticmethod
+    def key(lang, params):
+        """Return cache key for params, the same for params in any order and '|' separated values in any order"""
+        normalised = sorted((name, '|'.join(sorted(str(value).split('|'))))
+                            for name, value in params.items() if name not in IGNORED_PARAMS)
+        return hashlib.sha1(json.dumps([lang, normalised]).encode('utf-8')).hexdigest()
+
+    def ttl(self, endpoint):
+        for name in (endpoint, endpoint.split(':')[0], '*'):
+            if name in self.ttls:
+                return self.ttls[name]
+
+    def get(self, lang, params):
+        """Return cached response for the request, None if it is not cached or too old"""
+        key = self.key(lang, params)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT endpoint, created, size, body FROM responses WHERE key = ?",
+                                   (key,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            endpoint, created, size, body = row
+            if now - created > self.ttl(endpoint):
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                self._size -= size
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.stats['hits'] += 1
+        return json.loads(body)
+
+    def put(self, lang, params, result):
+        """Store response for the request, then remove least recently used responses while over max size"""
+        key = self.key(lang, params)
+        body = json.dumps(result)
+        now = time.time()
+        with self._lock:
+            old = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                self._size -= old[0]
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, self.endpoint(params), now, now, len(body), body))
+            self._size += len(body)
+            if self._size > self.max_bytes:
+                self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        # remove down to 90 % of max size, so not every put over the limit has to evict
+        target = self.max_bytes * 0.9
+        rows = self._db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall()
+        for key, size in rows:
+            if self._size <= target:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._size -= size
+            self.stats['evicted'] += 1
+
+    def clear(self):
+        """Remove all cached responses"""
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self._size = 0
+
+    def print_stats(self):
+        """Print hits and misses of this run and the size of the cache"""
+        with self._lock:
+            self._db.commit()
+        requests = self.stats['hits'] + self.stats['misses']
+        if not requests:
+            return
+        print(f"Cache: {self.stats['hits']} träffar, {self.stats['misses']} missar "
+              f"({100 * self.stats['hits'] // requests} % träffar), {self.stats['expired']} för gamla, "
+              f"{self.stats['evicted']} borttagna, {self._size / 2 ** 20:.1f} MB i {self.path}")
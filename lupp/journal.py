@@ -0,0 +1,96 @@
+"""
+Checkpoint journal for resuming an interrupted scrape
+
+While scraping, every batch of pages that is done is appended as one json line to journal/CATEGORY.jsonl. If the
+program crashes or is stopped, the 'resume' command reads the journal back and scrapes the category again, but only
+fetches the pages that are not in the journal yet. The journal is removed when the json file of the scrape is saved.
+"""
+
+import json
+import threading
+from pathlib import Path
+
+from lupp.record import json_default
+from lupp.utils import make_dir
+
+
+class ScrapeJournal:
+    """Append-only journal of finished pages, one json record per line
+
+    The first record holds d['stats'] and the max depth the scrape was started with, the following records
+    hold the page records of one finished batch each. Every record is flushed when written, so at most the
+    batches that were in flight are lost in a crash."""
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._file = None
+
+    @classmethod
+    def for_category(cls, category_title):
+        """Return journal for scrape of category_title"""
+        return cls(Path("journal") / f"{category_title.replace(' ', '_')}.jsonl")
+
+    def exists(self):
+        return self.path.exists()
+
+    def start(self, stats, max_depth):
+        """Start new journal for a scrape, replacing any old journal for the same category"""
+        make_dir(self.path.parent)
+        with self._lock:
+            self._file = open(self.path, 'w', encoding='utf-8')
+        self._write({'type': 'start', 'stats': stats, 'max_depth': max_depth})
+
+    def reopen(self):
+        """Continue appending to the existing journal, after cutting off a last line left unfinished by a crash"""
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            f.truncate(data.rfind(b"\n") + 1)
+        with self._lock:
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def add_pages(self, pages):
+        """Append dict of finished page records"""
+        if pages:
+            self._write({'type': 'pages', 'pages': pages})
+
+    def _write(self, record):
+        line = json.dumps(record, default=json_default)
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def header(self):
+        """Return the start record with stats and max_depth of the journaled scrape"""
+        with open(self.path, encoding='utf-8') as f:
+            return json.loads(f.readline())
+
+    def load(self):
+        """Read the journal, return (start record, dict with all finished pages)
+
+        A line that was cut off in a crash is skipped."""
+        header, pages = {}, {}
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record['type'] == 'start':
+                    header = record
+                elif record['type'] == 'pages':
+                    pages.update(record['pages'])
+        return header, pages
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def remove(self):
+        """Close and delete the journal, when the scrape has been saved"""
+        self.close()
+        if self.path.exists():
+            self.path.unlink()
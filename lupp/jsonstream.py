@@ -0,0 +1,286 @@
+"""
+Streaming json writer and reader for the json files of a scrape
+
+The json file of a large category is hundreds of MB, nearly all of it in 'pages'. JsonWriter writes the pages an
+item at a time, as they are produced, and the reader decodes the file a value at a time from a buffer, so the pages
+can be iterated, or a single page found, without first decoding the whole file into one dict. The files are the
+same as those written by json.dump(..).
+
+While writing, the byte offsets of every top level value and every page are noted, and saved in a sidecar index
+file next to the json file. load_indexed(..) looks a page up in the index and decodes only its bytes from the
+memory mapped json file.
+"""
+
+import json
+import mmap
+import os
+from pathlib import Path
+
+# top level keys of a scrape whose dicts are written and read an item at a time
+STREAM_KEYS = ('categories', 'pages')
+# the sidecar index of json/DATE/Nagu.json is json/DATE/Nagu.json.idx
+INDEX_SUFFIX = '.idx'
+INDEX_HEADER = 'lupp-json-index 1'
+CHUNK = 1 << 20
+_WHITESPACE = ' \t\n\r'
+
+
+class JsonWriter:
+    """Write a json object to a text file a value at a time
+
+    The json is ascii, so characters and bytes are the same.
+    :ivar chars: number of characters written so far
+    :ivar offsets: [(section, key, start, end)] of every top level value, section 'top', and of the items written
+        with write_items(..), section the key of their dict
+    """
+    def __init__(self, f, default=None):
+        self.f = f
+        self.encode = json.JSONEncoder(default=default).encode
+        self.chars = 0
+        self.first = True
+        self.offsets = []
+
+    def _write(self, text):
+        self.f.write(text)
+        self.chars += len(text)
+
+    def _key(self, key):
+        self._write(("{" if self.first else ", ") + self.encode(key) + ": ")
+        self.first = False
+
+    def write(self, key, value):
+        """Write key with value"""
+        self._key(key)
+        start = self.chars
+        self._write(self.encode(value))
+        self.offsets.append(('top', key, start, self.chars))
+
+    def write_items(self, key, items):
+        """Write key with a json object of (key, value) pairs from items, eg. a generator of pages"""
+        self._key(key)
+        start = self.chars
+        separator = "{"
+        for item_key, value in items:
+            self._write(separator + self.encode(item_key) + ": ")
+            item_start = self.chars
+            self._write(self.encode(value))
+            self.offsets.append((key, item_key, item_start, self.chars))
+            separator = ", "
+        self._write("}" if separator == ", " else "{}")
+        self.offsets.append(('top', key, start, self.chars))
+
+    def close(self):
+        """End the object"""
+        self._write("{}" if self.first else "}")
+
+
+def dump(d, f, default=None):
+    """Write dict d to text file f like json.dump(..), with the dicts in STREAM_KEYS written an item at a time
+
+    Returns the JsonWriter, with the number of characters written and the offsets of the values.
+    """
+    writer = JsonWriter(f, default=default)
+    for key, value in d.items():
+        if key in STREAM_KEYS and isinstance(value, dict):
+            writer.write_items(key, value.items())
+        else:
+            writer.write(key, value)
+    writer.close()
+    return writer
+
+
+def index_path(json_file):
+    return Path(str(json_file) + INDEX_SUFFIX)
+
+
+def _file_id(json_file):
+    stat = os.stat(json_file)
+    return f"{stat.st_size} {stat.st_mtime_ns}"
+
+
+def write_index(json_file, offsets):
+    """Save sidecar index of the offsets of a JsonWriter for json file, after the json file has been written
+
+    A line per value, 'section<TAB>key as json<TAB>start<TAB>end', after a header with the size and modification
+    time of the json file, so an index of an older version of the file is not used.
+    """
+    with open(index_path(json_file), 'w', encoding='utf-8') as f:
+        f.write(f"{INDEX_HEADER} {_file_id(json_file)}\n")
+        f.writelines(f"{section}\t{json.dumps(key)}\t{start}\t{end}\n" for section, key, start, end in offsets)
+
+
+def load_indexed(json_file, section, key):
+    """Return value of key in section, eg. ('pages', 'Nagu (sv)') or ('top', 'stats'), using the sidecar index
+
+    Only the line of the key is searched for in the index, and only the bytes of the value are decoded from the
+    memory mapped json file. Returns None if there is no index or it is out of date, raises KeyError if the index
+    does not have key.
+    """
+    try:
+        with open(index_path(json_file), 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as index:
+            header_end = index.find(b"\n")
+            if index[:header_end].decode() != f"{INDEX_HEADER} {_file_id(json_file)}":
+                return None
+            needle = f"\n{section}\t{json.dumps(key)}\t".encode()
+            found = index.find(needle, header_end)
+            if found < 0:
+                raise KeyError(key)
+            line_end = index.find(b"\n", found + len(needle))
+            start, end = map(int, index[found + len(needle):line_end].split(b"\t"))
+    except (OSError, ValueError):
+        # no index, or an empty one that cannot be mapped
+        return None
+    with open(json_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return json.loads(data[start:end])
+
+
+def dump_lines(d, f, default=None):
+    """Write dict d to text file f as json lines, {key: value} on a line of its own
+
+    The items of the dicts in STREAM_KEYS are each written on a line of their own as {key: {item_key: value}}.
+    Non-ascii characters are written as they are, to be easy to read.
+    """
+    encode = json.JSONEncoder(ensure_ascii=False, default=default).encode
+    for key, value in d.items():
+        if key in STREAM_KEYS and isinstance(value, dict):
+            for item_key, item in value.items():
+                f.write(encode({key: {item_key: item}}) + "\n")
+        else:
+            f.write(encode({key: value}) + "\n")
+
+
+class JsonReader:
+    """Decode a json object from a text file a value at a time"""
+    def __init__(self, f):
+        self.f = f
+        self.decode = json.JSONDecoder().raw_decode
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size=CHUNK):
+        """Read more of the file into the buffer, return False at end of file"""
+        if self.eof:
+            return False
+        chunk = self.f.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _next_char(self):
+        """Skip whitespace and return the next character, '' at end of file"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, chars):
+        char = self._next_char()
+        if not char or char not in chars:
+            raise json.JSONDecodeError(f"Expecting one of {chars!r}", self.buf, self.pos)
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next value"""
+        self._next_char()
+        while True:
+            try:
+                value, end = self.decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # the value continues after the buffer, read at least as much again
+                if self._fill(max(CHUNK, len(self.buf))):
+                    continue
+                raise
+            if end == len(self.buf) and self._fill():
+                # a number may continue after the buffer
+                continue
+            self.pos = end
+            return value
+
+    def items(self):
+        """Yield (key, value) of the next object, a value at a time"""
+        self._expect('{')
+        if self._next_char() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self._expect(':')
+            yield key, self.value()
+            if self._expect(',}') == '}':
+                return
+
+    def skip(self):
+        """Skip the next value"""
+        if self._next_char() == '{':
+            for _ in self.items():
+                pass
+        else:
+            self.value()
+
+
+def iter_top(f):
+    """Yield (key, reader) for the top level keys of the json object in f, the value is read from the reader"""
+    reader = JsonReader(f)
+    reader._expect('{')
+    if reader._next_char() == '}':
+        return
+    while True:
+        key = reader.value()
+        reader._expect(':')
+        yield key, reader
+        if reader._expect(',}') == '}':
+            return
+
+
+def load(json_file, keys=None, item_hook=None):
+    """Load json file into a dict, decoding the dicts in STREAM_KEYS an item at a time
+
+    :param keys: load only these top level keys, and stop reading when they are loaded
+    :param item_hook: called as item_hook(key, item_key, value) for every item of the dicts in STREAM_KEYS, returns
+        the value to keep
+    """
+    d = {}
+    with open(json_file, encoding='utf-8') as f:
+        for key, reader in iter_top(f):
+            if keys is not None and key not in keys:
+                reader.skip()
+                continue
+            if key in STREAM_KEYS and reader._next_char() == '{':
+                if item_hook is None:
+                    d[key] = dict(reader.items())
+                else:
+                    d[key] = {item_key: item_hook(key, item_key, value) for item_key, value in reader.items()}
+            else:
+                d[key] = reader.value()
+            if keys is not None and all(k in d for k in keys):
+                break
+    return d
+
+
+def iter_pages(json_file):
+    """Yield (key, page dict) of the pages in json file, without loading the whole file"""
+    with open(json_file, encoding='utf-8') as f:
+        for key, reader in iter_top(f):
+            if key == 'pages':
+                yield from reader.items()
+                return
+            reader.skip()
+
+
+def load_page(json_file, page_key):
+    """Return page dict of page_key in json file, reading only until it is found
+
+    Raises KeyError if the page is not in the file.
+    """
+    for key, page in iter_pages(json_file):
+        if key == page_key:
+            return page
+    raise KeyError(page_key)
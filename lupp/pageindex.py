@@ -0,0 +1,135 @@
+"""
+Index of the pages in d['pages'] by title and language
+
+The keys of d['pages'] are "Title (lang)". Instead of taking the language back out of a key with string tricks in
+every report, page_index(d) splits every key once and keeps indexes by (title, lang), by language and by category.
+It also holds the graph of language links between the pages, so finding e.g. all sv pages or the fi version of a sv
+page is a dict lookup. The index is kept until the pages of d change, like the analysis in lupp.analysis.
+"""
+
+import threading
+
+_lock = threading.Lock()
+_latest = None
+
+
+def split_key(key):
+    """Return (title, lang) of a page key "Title (lang)", the title may itself contain parentheses"""
+    title, _, lang = key.rpartition(" (")
+    return title, lang[:-1]
+
+
+def page_key(title, lang):
+    """Return page key for title in lang"""
+    return f"{title} ({lang})"
+
+
+def normalise_langlinks(langlinks):
+    """Return {lang: title} of the 'langlinks' of a page, a list of {lang: title}
+
+    For a language linked more than once the last link counts. Links to nb and nn are kept as links to no, as the
+    scrape does, nn before nb, unless the page already links to no.
+    """
+    links = {}
+    for link in langlinks:
+        links.update(link)
+    for norwegian in ('nn', 'nb'):
+        if norwegian in links:
+            links.setdefault('no', links.pop(norwegian))
+    return links
+
+
+class PageIndex:
+    """Indexes of the pages and categories of d
+
+    :ivar keys: {page key: (title, lang)}
+    :ivar by_title: {(title, lang): page key}
+    :ivar by_lang: {lang: [page keys]}, in the order of d['pages']
+    :ivar links: {page key: {lang: title}} of the language links of the pages, see normalise_langlinks(..)
+    :ivar graph: {page key: {lang: page key}} of the language versions of the pages that are in d['pages']
+    """
+    def __init__(self, d):
+        self.d = d
+        self.pages = d['pages']
+        self.n_pages = len(d['pages'])
+        self.keys = {key: split_key(key) for key in self.pages}
+        self.by_title = {title_lang: key for key, title_lang in self.keys.items()}
+        self.by_lang = {}
+        for key, (_, lang) in self.keys.items():
+            self.by_lang.setdefault(lang, []).append(key)
+        # pages without language links are left out of links and graph
+        self.links = {}
+        self.graph = {}
+        by_title = self.by_title
+        for key, page in self.pages.items():
+            langlinks = page.get('langlinks')
+            if not langlinks:
+                continue
+            links = self.links[key] = normalise_langlinks(langlinks)
+            versions = {}
+            for lang, title in links.items():
+                # a link to a section of a page, 'Title#Section', is a link to the page
+                other = by_title.get((title.partition('#')[0], lang))
+                if other is not None:
+                    versions[lang] = other
+            if versions:
+                self.graph[key] = versions
+
+    def valid_for(self, d):
+        return self.d is d and d.get('pages') is self.pages and len(self.pages) == self.n_pages
+
+    def lang(self, key):
+        """Return language of page key"""
+        title_lang = self.keys.get(key)
+        return title_lang[1] if title_lang is not None else split_key(key)[1]
+
+    def title(self, key):
+        """Return title of page key, without the language"""
+        title_lang = self.keys.get(key)
+        return title_lang[0] if title_lang is not None else split_key(key)[0]
+
+    def key(self, title, lang):
+        """Return key of the page with title in lang, None if it is not in d['pages']"""
+        return self.by_title.get((title, lang))
+
+    def pages_in(self, lang):
+        """Return keys of all pages in lang"""
+        return self.by_lang.get(lang, [])
+
+    def langlinks(self, key):
+        """Return {lang: title} of the language links of page key"""
+        return self.links.get(key, {})
+
+    def versions(self, key):
+        """Return {lang: page key} of the language versions of page key that are in d['pages']"""
+        return self.graph.get(key, {})
+
+    def version(self, key, lang):
+        """Return key of the version of page key in lang, None if there is none in d['pages']"""
+        return self.graph.get(key, {}).get(lang)
+
+    def category_pages(self, category):
+        """Return keys of the pages listed in category that are in d['pages']"""
+        return [key for key in self.d['categories'][category]['pages'] if key in self.pages]
+
+    def subcategories(self, category):
+        """Return keys of the categories listed in category, without category itself"""
+        return [key for key in self.category_pages(category)
+                if key != category and self.pages[key].get('is_category')]
+
+
+def page_index(d):
+    """Return PageIndex of d, the same one until the pages of d change"""
+    global _latest
+    with _lock:
+        if _latest is None or not _latest.valid_for(d):
+            _latest = PageIndex(d)
+        return _latest
+
+
+def invalidate(d):
+    """Forget the index of d, when its pages are about to change"""
+    global _latest
+    with _lock:
+        if _latest is not None and _latest.d is d:
+            _latest = None
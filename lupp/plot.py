@@ -1,63 +1,40 @@
 """
-Analyzes and plots graph of views, quality and length based on saved json-dumps
+Analyzes and plots graph of views, quality and length based on the snapshots of saved scrapes
 """
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from matplotlib.table import table, Table
 from matplotlib.axes import Axes
 
-import json
 import sys
 import os
-from pathlib import Path
 from datetime import datetime
 from typing import Tuple, List, Union
 
+from lupp.snapshots import SnapshotStore
+
 
 def load_data(lang, cat: str) -> List:
-    """Load all json files for the selected category and return list of all the data"""
-    data_path = Path('./json')
-    data_paths = list(data_path.glob(f"*/{cat.replace(' ','_')}.json"))
-    data_paths.sort()
-    print(f"Analyserar kategori {cat} för språket ({lang}), hittade filerna:")
-    [print(str(p)) for p in data_paths]
-    # data_dicts = []
-    try:
-        data_dicts = [json.load(open(str(p))) for p in data_paths]
-    except FileNotFoundError as fe:
-        print("Hittade inte filen" + str(fe.args))
-        sys.exit()
-    return data_dicts
-
-
-def analyze_data(d_dict: List, label: str, lang: str) -> List:
-    """Extract all data of 'label' from data and return list of values and change"""
-    stat_list = []
-    for d in d_dict:
-        if label == 'dates':
-            stat_list.append(datetime.strptime(d['stats']['scraped'][:10], "%Y-%m-%d"))
-        elif label == 'pages':
-            stat_list.append(len([p for p in d['pages'] if f"({lang})" in p]))
-        buff = []
-        for page in d['pages']:
-            if f"({lang})" not in page:
-                continue
-            dict_key = ''
-            if label == 'pages' or label == 'dates':
-                break
-            elif label == 'length':
-                dict_key = f"len_{lang}"
-            elif label == 'quality':
-                dict_key = f"quality"
-            elif label == 'views':
-                dict_key = f"pageviews_{lang}"
-            buff.append(int(d['pages'][page]['stats'][dict_key]))
-        if buff:
-            stat_list.append(sum(buff))
+    """Return the sums of the pages in lang in all snapshots of the category, from the snapshot store
+
+    Json files of the category that are not in the store yet are added to it first.
+    """
+    store = SnapshotStore()
+    store.import_json_files(cat)
+    rows = store.trend(cat, lang)
+    store.close()
+    print(f"Analyserar kategori {cat} för språket ({lang}), hittade {len(rows)} skrapningar i {store.path}")
+    return rows
+
+
+def analyze_data(rows: List, label: str, lang: str) -> List:
+    """Extract all data of 'label' from the rows of load_data(..) and return list of values and change"""
     if label == 'dates':
-        return stat_list
+        return [datetime.strptime(row[0][:10], "%Y-%m-%d") for row in rows]
+    column = {'pages': 1, 'length': 2, 'quality': 3, 'views': 4}[label]
+    stat_list = [row[column] or 0 for row in rows]
     change = stat_list[-1] - stat_list[0]
-    avg = stat_list[-1] // len([p for p in d_dict[-1]['pages'] if f"({lang})" in p])
+    avg = stat_list[-1] // rows[-1][1]
     change_p = change / stat_list[0] * 100
     change = f"+{change:,}".replace(',', ' ') if change > 0 else str(change)
     return stat_list + [change, f"{change_p:1.0f}%", f"{avg:,}".replace(',', ' ')]
@@ -184,8 +161,8 @@ def save_plot(cat, lang):
     if len(data) < 2:
         print("Kan inte producera analys av endast en fil, avbryter")
         return
-    start_date = data[0]['stats']['scraped'][:10]
-    stop_date = data[-1]['stats']['scraped'][:10]
+    start_date = data[0][0][:10]
+    stop_date = data[-1][0][:10]
     views = analyze_data(data, 'views', lang)
     quality = analyze_data(data, 'quality', lang)
     length = analyze_data(data, 'length', lang)
@@ -0,0 +1,149 @@
+"""
+Adaptive rate limiting for the MediaWiki API requests of the lupp.scrape module
+
+Every request to a wiki host first takes a token from a token bucket, which caps the requests per second, and a
+slot among the requests in flight, which caps the concurrency. Both limits adapt with AIMD: they grow a little
+after every fast successful request and are halved when the host gets slow or asks us to back off (maxlag,
+HTTP 429, Retry-After), so the scraper runs as fast as the host tolerates.
+"""
+
+import random
+import re
+import threading
+import time
+
+# API error codes and HTTP statuses meaning the host wants fewer requests
+THROTTLE_CODES = ('maxlag', 'ratelimited')
+THROTTLE_STATUSES = (429, 503)
+
+
+class HostLimiter:
+    """Token bucket and AIMD concurrency limit for one wiki host
+
+    :param rate: requests per second to start with, 0 for no token bucket
+    :param limit: requests in flight to start with
+    :param max_limit: max requests in flight, normally the size of the connection pool
+    :param latency_target: a request slower than this (s) counts as the host being overloaded
+    """
+    def __init__(self, rate=50.0, limit=5, max_limit=20, min_rate=0.5, max_rate=200.0, latency_target=3.0):
+        self.rate = float(rate)
+        self.min_rate = min(min_rate, self.rate) if self.rate else 0.0
+        self.max_rate = max(max_rate, self.rate)
+        self.limit = float(max(1, min(limit, max_limit)))
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.stats = {'requests': 0, 'throttled': 0, 'slow': 0, 'retries': 0, 'failed': 0}
+        self._cond = threading.Condition()
+        self._tokens = self.limit
+        self._updated = time.monotonic()
+        self._inflight = 0
+        self._paused_until = 0.0
+        self._last_decrease = float('-inf')
+
+    def _refill(self, now):
+        burst = max(1.0, self.limit)
+        self._tokens = min(burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Block until a token and a free slot are available, then take them"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if wait <= 0 and self._inflight < int(self.limit):
+                    if not self.rate:
+                        break
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        break
+                    wait = (1 - self._tokens) / self.rate
+                self._cond.wait(wait if wait > 0 else None)
+            self._inflight += 1
+            self.stats['requests'] += 1
+
+    def release(self, latency=None, throttled=False, retry_after=None):
+        """Give back the slot taken by acquire(..) and adapt the limits to how the request went
+
+        :param latency: response time in s of a successful request, None if the request failed
+        :param throttled: the host asked us to back off
+        :param retry_after: seconds the host asked us to wait
+        """
+        with self._cond:
+            self._inflight -= 1
+            if throttled:
+                self._throttle(retry_after)
+            elif latency is not None and latency > self.latency_target:
+                self.stats['slow'] += 1
+                self._decrease(rate=False)
+            elif latency is not None:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                if self.rate:
+                    self.rate = min(self.max_rate, self.rate + 1 / self.limit)
+            self._cond.notify_all()
+
+    def throttle(self, retry_after=None):
+        """Back off, outside of an acquire(..)/release(..) pair, e.g. from a response hook"""
+        with self._cond:
+            self._throttle(retry_after)
+            self._cond.notify_all()
+
+    def _throttle(self, retry_after):
+        self.stats['throttled'] += 1
+        if retry_after:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        self._decrease()
+
+    def _decrease(self, rate=True):
+        # requests in flight when the host got overloaded report it together, only halve once for them
+        now = time.monotonic()
+        if now - self._last_decrease < self.latency_target:
+            return
+        self._last_decrease = now
+        self.limit = max(1.0, self.limit / 2)
+        if rate and self.rate:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def backoff(self, attempt, retry_after=None):
+        """Seconds to wait before retry number attempt (0..) of a failed request"""
+        if retry_after:
+            return retry_after
+        return min(60, 2 ** attempt) * (0.5 + random.random() / 2)
+
+    def status(self):
+        """Return dict with current limits and counters"""
+        with self._cond:
+            return {'limit': int(self.limit), 'rate': round(self.rate, 1), **self.stats}
+
+
+def parse_retry_after(value):
+    """Return seconds from a Retry-After header or maxlag error info, None if there is no number in it"""
+    if value is None:
+        return None
+    # maxlag info looks like "Waiting for 10.64.16.8: 3 seconds lagged"
+    match = re.search(r"(\d+(?:\.\d+)?) seconds", str(value)) or re.search(r"(\d+(?:\.\d+)?)", str(value))
+    return float(match.group(1)) if match else None
+
+
+def classify_error(exc):
+    """Return (retry, throttled, retry_after) for an exception raised by a request
+
+    APIError with a throttle code and HTTP 429/503 mean the host wants us to back off. Connection errors,
+    timeouts and other HTTP 5xx errors are retried without backing off. Everything else is not retried.
+    """
+    args = getattr(exc, 'args', ())
+    if args and args[0] in THROTTLE_CODES:
+        info = args[1] if len(args) > 1 else None
+        return True, True, parse_retry_after(info)
+    response = getattr(exc, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status is not None:
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if status in THROTTLE_STATUSES:
+            return True, True, retry_after
+        return status >= 500, False, retry_after
+    if isinstance(exc, (ConnectionError, TimeoutError)) or type(exc).__name__ in ('ConnectionError', 'Timeout',
+                                                                                  'ReadTimeout', 'ConnectTimeout'):
+        return True, False, None
+    return False, False, None
@@ -0,0 +1,150 @@
+"""
+Compact records for the pages in d['pages']
+
+A scrape of a large category holds hundreds of thousands of pages, with lists of link, image and category titles
+that are mostly the same strings on many pages. A PageRecord keeps the fields of a page in slots instead of a dict,
+and interns the titles in its lists and the dates of its pageviews, so every distinct string is stored once.
+A PageRecord works like the dict it replaces, page['links'], page.get('stats'), 'pageviews' in page, and is
+converted to and from the json layout with to_dict() and PageRecord.from_dict(..).
+"""
+
+from collections.abc import MutableMapping
+from sys import intern
+
+from lupp import jsonstream
+
+# fields of a page in the order they are added by a scrape, which is also the order in the json files
+FIELDS = ('title', 'is_category', 'redirects', 'linkshere', 'links', 'images', 'categories', 'contributors',
+          'langlinks', 'extlinks', 'revisions', 'pagelanguage', 'touched', 'lastrevid', 'length', 'anoncontributors',
+          'pageviews', 'sections', 'stats', 'lang_stats')
+# list fields with titles or user names that repeat between pages
+TITLE_FIELDS = frozenset(('redirects', 'linkshere', 'links', 'images', 'categories', 'contributors'))
+_FIELD_SET = frozenset(FIELDS)
+
+
+def _interned(values):
+    return [intern(value) if type(value) is str else value for value in values]
+
+
+class PageRecord(MutableMapping):
+    """Page record with the fields in slots, used as a dict
+
+    Fields that are not in FIELDS are kept in a dict of their own. Lists of titles and the dates of pageviews are
+    interned when they are set, values appended to the lists later should be interned by the caller.
+    """
+    __slots__ = FIELDS + ('_extra',)
+
+    def __init__(self, title=None, is_category=False, **fields):
+        self._extra = None
+        if title is not None:
+            self.title = title
+            self.is_category = is_category
+        for key, value in fields.items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, data):
+        """Return record with the fields of page dict data"""
+        record = cls()
+        for key, value in data.items():
+            record[key] = value
+        return record
+
+    def to_dict(self):
+        """Return the fields as a dict, in the layout of the json files"""
+        return {key: self[key] for key in self}
+
+    def __getitem__(self, key):
+        if key in _FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key in _FIELD_SET:
+            if key in TITLE_FIELDS and value:
+                value = _interned(value)
+            elif key == 'pageviews' and isinstance(value, dict):
+                value = {intern(date): views for date, views in value.items()}
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _FIELD_SET:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+
+    def __contains__(self, key):
+        if key in _FIELD_SET:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def get(self, key, default=None):
+        if key in _FIELD_SET:
+            return getattr(self, key, default)
+        return default if self._extra is None else self._extra.get(key, default)
+
+    def __iter__(self):
+        for key in FIELDS:
+            if hasattr(self, key):
+                yield key
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def copy(self):
+        return PageRecord.from_dict(self)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+def from_json(pages):
+    """Return dict of PageRecords for dict of page dicts, as in d['pages'] of a json file"""
+    return {key: PageRecord.from_dict(page) for key, page in pages.items()}
+
+
+def json_default(obj):
+    """Return json serializable form of a PageRecord, for json.dump(.., default=json_default)"""
+    if isinstance(obj, PageRecord):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _page_hook(key, page_key, value):
+    return PageRecord.from_dict(value) if key == 'pages' else value
+
+
+def load_json_file(json_file, keys=None):
+    """Load json file of a scrape with its pages as PageRecords
+
+    The pages are read and converted one at a time. If keys are given, only those top level keys are loaded, eg.
+    ('stats',) does not read the pages at all.
+    """
+    return jsonstream.load(json_file, keys=keys, item_hook=_page_hook)
+
+
+def load_page(json_file, page_key):
+    """Return PageRecord of page_key in json file, without loading the other pages. Raises KeyError if not found.
+
+    The page is looked up in the sidecar index of the json file, or searched for if there is no index.
+    """
+    page = jsonstream.load_indexed(json_file, 'pages', page_key)
+    if page is None:
+        page = jsonstream.load_page(json_file, page_key)
+    return PageRecord.from_dict(page)
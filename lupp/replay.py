@@ -0,0 +1,170 @@
+"""
+Record and replay of MediaWiki API responses, to run a scrape offline
+
+A scrape run with a ResponseRecorder saves every API response in a fixture archive, a gzipped json lines file.
+A ResponseReplayer serves the responses from the archive instead of the live wikis, with a configurable latency and
+page size for continuations, so scrape_launch(..) can be benchmarked and compared between versions of the code
+without network. serve(..) runs the same replay as a local stand-in for api.php, to also run the HTTP stack of
+wikitools and requests.
+"""
+
+import gzip
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlparse
+
+from wikitools import exceptions
+
+from lupp import utils
+from lupp.cache import ResponseCache
+
+SITEINFO_PARAMS = {'action': 'query', 'meta': 'siteinfo', 'siprop': 'general|namespaces|namespacealiases'}
+
+
+class ResponseRecorder:
+    """Transport for WikiSessions that sends requests with send(lang, params) and saves the responses in an archive"""
+    def __init__(self, send, path):
+        self.send = send
+        self.path = Path(path)
+        utils.make_dir(self.path.parent)
+        self._file = gzip.open(self.path, 'wt', encoding='utf-8')
+        self._lock = threading.Lock()
+        self._langs = set()
+        self.recorded = 0
+        utils.exit_reports.append(self.close)
+
+    def __call__(self, lang, params):
+        with self._lock:
+            new_lang = lang not in self._langs
+            self._langs.add(lang)
+        if new_lang:
+            # replay server needs the siteinfo that wikitools asks for when connecting
+            self._write({'lang': lang, 'siteinfo': self.send(lang, SITEINFO_PARAMS)})
+        result = self.send(lang, params)
+        self._write({'lang': lang, 'params': params, 'response': result})
+        return result
+
+    def _write(self, record):
+        line = json.dumps(record)
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line + "\n")
+            self.recorded += 1
+
+    def close(self):
+        """Close the archive and print how many responses were recorded"""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.close()
+            self._file = None
+        print(f"Spelade in {self.recorded} svar i {self.path}")
+
+
+class ResponseReplayer:
+    """Transport for WikiSessions that serves responses from an archive saved by ResponseRecorder
+
+    :param latency: seconds every response is delayed, plus up to :param jitter seconds that are the same for the
+                    same request in every run
+    :param page_size: if set, lists in responses longer than this are served in pages with continuations, to
+                      replay a wiki with lower limits than the recorded one
+    """
+    def __init__(self, path, latency=0.0, jitter=0.0, page_size=None):
+        self.path = Path(path)
+        self.latency = latency
+        self.jitter = jitter
+        self.page_size = page_size
+        self.responses = {}
+        self.siteinfo = {}
+        self.stats = {'served': 0, 'missing': 0}
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if 'siteinfo' in record:
+                    self.siteinfo[record['lang']] = record['siteinfo']
+                else:
+                    self.responses[ResponseCache.key(record['lang'], record['params'])] = record['response']
+
+    def __call__(self, lang, params):
+        params = dict(params)
+        offset = 0
+        if 'replaycontinue' in params:
+            # page of a response split by _page(..), served from the whole response of the first request
+            offset = int(params.pop('replaycontinue'))
+            params['continue'] = ''
+        if params.get('meta') == 'siteinfo' and lang in self.siteinfo:
+            return self.siteinfo[lang]
+        key = ResponseCache.key(lang, params)
+        if key not in self.responses:
+            self.stats['missing'] += 1
+            raise exceptions.APIError('replaymissing', f"Inget inspelat svar för {lang} {params}")
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self.jitter * (zlib.crc32(key.encode()) % 1000) / 1000)
+        self.stats['served'] += 1
+        response = self.responses[key]
+        if self.page_size and 'continue' not in response:
+            response = self._page(response, offset)
+        return response
+
+    def _page(self, response, offset):
+        """Return the part of response from offset, with a continuation if lists in it go on after the page"""
+        query = response.get('query')
+        if not isinstance(query, dict):
+            return response
+        end = offset + self.page_size
+        paged = dict(query)
+        more = False
+        for name, value in query.items():
+            if isinstance(value, list):
+                paged[name] = value[offset:end]
+                more = more or len(value) > end
+        response = dict(response, query=paged)
+        if more:
+            response['continue'] = {'replaycontinue': str(end), 'continue': '-||'}
+        return response
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    """Answers api.php requests for /LANG/w/api.php from the replayer of the server"""
+    def do_GET(self):
+        self._answer(urlparse(self.path).query)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self._answer(self.rfile.read(length).decode('utf-8'))
+
+    def _answer(self, query):
+        lang = urlparse(self.path).path.strip('/').split('/')[0]
+        params = dict(parse_qsl(query, keep_blank_values=True))
+        try:
+            body = self.server.replayer(lang, params)
+        except exceptions.APIError as we:
+            body = {'error': {'code': we.args[0], 'info': we.args[1]}}
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(replayer, port=8080):
+    """Serve the responses of replayer as http://localhost:PORT/LANG/w/api.php until interrupted"""
+    server = ThreadingHTTPServer(('localhost', port), _ReplayHandler)
+    server.replayer = replayer
+    print(f"Svarar med {len(replayer.responses)} inspelade svar på http://localhost:{port}/LANG/w/api.php")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    print(f"{replayer.stats['served']} svar skickade, {replayer.stats['missing']} saknades")
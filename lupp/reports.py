@@ -0,0 +1,82 @@
+"""
+Rendering of several reports of a scrape at the same time, in a pool of processes
+
+The reports only read the pages and their analysis, but each of them is pure Python and renders on one core. After
+the data is analysed once, render(..) forks a pool of worker processes that inherit d and the analysis, copy on
+write, so nothing is pickled or analysed again, and every worker renders one report at a time to its own file.
+Where processes cannot be forked, or with one worker, the reports are rendered one after the other in this process.
+"""
+
+import gc
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from lupp import analysis, scrape
+
+# report name -> function(d, e, api_fields, category) that renders it
+REPORTS = {
+    'html': lambda d, e, api_fields, category: scrape.save_as_html(d, e, api_fields, category),
+    'html_lang': lambda d, e, api_fields, category: scrape.save_as_html_lang(d, e, api_fields, category),
+    'html_graphic': lambda d, e, api_fields, category: scrape.save_as_html_graphic(d, e, api_fields, category),
+    'csv': lambda d, e, api_fields, category: scrape.save_as_csv(d, e, api_fields, category),
+    'wikitext': lambda d, e, api_fields, category: scrape.save_as_wikitext(d, e, api_fields, category),
+    'wikitext_top100': lambda d, e, api_fields, category:
+        scrape.save_as_wikitext(d, e, api_fields, category, page_type='top100'),
+    'contributors': lambda d, e, api_fields, category: scrape.analyse_and_save_contributors(d, e, category),
+    'contributors_wikitext': lambda d, e, api_fields, category:
+        scrape.analyse_and_save_contributors(d, e, category, fmt='wikitext'),
+}
+
+# the data of render(..), inherited by the forked workers
+_job = None
+
+
+def _render_one(name):
+    """Render report name in a worker and return the errors it added to e"""
+    d, e, api_fields, category = _job
+    before = dict(e)
+    REPORTS[name](d, e, api_fields, category)
+    return {key: value for key, value in e.items() if key not in before or before[key] is not value}
+
+
+def can_fork():
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def render(d, e, api_fields, category, names, workers=None):
+    """Render the reports in names for d, at the same time in up to workers processes
+
+    The pages are analysed first, in this process. Errors the reports add to e are copied back to e, but other
+    changes the reports make to d are not, e.g. the 'order' of the pages in d['categories'], so if d is saved after
+    the reports use workers=1.
+    :param workers: number of processes, by default one per report but at most the number of cores
+    """
+    global _job
+    unknown = [name for name in names if name not in REPORTS]
+    if unknown:
+        raise ValueError(f"Unknown reports {unknown}, the reports are {list(REPORTS)}")
+    if workers is None:
+        workers = min(len(names), os.cpu_count() or 1)
+    try:
+        analysis.analyse(d, e, api_fields)
+    except KeyError:
+        # every report notes the error in e itself
+        pass
+    if workers <= 1 or len(names) <= 1 or not can_fork():
+        for name in names:
+            REPORTS[name](d, e, api_fields, category)
+        return
+    print(f"Skapar {len(names)} rapporter i {workers} processer")
+    _job = (d, e, api_fields, category)
+    # the garbage collector of the workers leaves the objects frozen before the fork alone, instead of writing to
+    # every page and so copying it into every worker
+    gc.freeze()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as executor:
+            futures = [executor.submit(_render_one, name) for name in names]
+            for future in futures:
+                e.update(future.result())
+    finally:
+        gc.unfreeze()
+        _job = None
@@ -70,38 +70,65 @@ Also contains some utility functions for dealing with publishing the result of a
 
 import codecs
 import csv
+import heapq
 import os
 import sys
 import concurrent.futures
-import copy
+from collections import Counter
+from sys import intern
 from datetime import datetime
 from pathlib import Path
 
 from wikitools import exceptions, wiki, api, page
 
+from lupp.store import PageStore
+from lupp.record import PageRecord, from_json
+from lupp.pageindex import page_index, page_key
+from lupp.analysis import analyse, LangStats, analyse_pagestats, analyse_langstats, analyse_time_interval
 from lupp.html import HTML, tr, th, thl, tdr, td, red, bold, italic
 from lupp.html import graph, graph_bar, action_box
-from lupp.utils import now_ymd_hms, days_between, loading_bar, save_utf_file, save_json_file, get_utf_file
-from lupp.wikitext import table_start, align, cell, rowspan, colspan, w_red, w_bold, w_italic
-from functools import cmp_to_key
-
-
-def scrape_launch(d, e, sites, api_fields, max_depth, blacklist, category_title, languages="sv|fi|en|de"):
+from lupp.utils import now_ymd_hms, loading_bar, save_json_file, get_utf_file, CountingFile
+from lupp.wikitext import table_start, table_end, align, cell, rowspan, colspan, w_red, w_bold, w_italic
+
+# Default number of worker threads running _scrape_pages(..) calls
+MAX_WORKERS = 5
+# Number of threads each _scrape_pages(..) call uses for per page requests (sections and revision history)
+DETAIL_WORKERS = 4
+# Number of pages on the top list of save_as_wikitext(.., page_type='top100')
+TOP_N = 100
+# Modes of api_fields['modes'], the first one is the default, see _scrape_page_details(..)
+MODES = {'sections': ('parse', 'off'), 'revisions': ('history', 'batch', 'off')}
+
+
+def scrape_launch(d, e, sites, api_fields, max_depth, blacklist, category_title, languages="sv|fi|en|de",
+                  engine='threads', concurrency=MAX_WORKERS, workers=MAX_WORKERS, journal=None, resume=False,
+                  previous=None):
     """Setup basic data in d and start scraping category from category_title.
 
     Setup basic data in d and call _scrape_category(..) or _scrape_atricle_list(..) to start retrieving data.
     _scrape_pages(..) calls will be run 'concurrently' in own threads to optimize for network latency of the requests.
+    With engine='async' categories are instead scraped by the asyncio pipeline in lupp.scrape_async.
+    While scraping, d is only changed through a thread safe PageStore.
+    Finished pages are written to journal, if given, and with resume=True the pages already in the journal are
+    loaded and not fetched again.
 
     Lastly data from d will be analyzed with additional data also saved in d.
 
     :param d: 'global' dict containing stats and all data about current scrape
     :param e: 'global' dict containing error data and logging info
-    :param sites: dict with wikitools Wiki objects that the scrape retrieves data from
+    :param sites: WikiSessions registry with the shared wikitools Wiki objects that the scrape retrieves data from
     :param api_fields: dict with all parameters for use with API requests
     :param max_depth: How deep the scrape will go into subcategories
     :param blacklist: list of titles of pages that will be skipped, for example User or Discussion pages
     :param category_title: Title for main category to be scraped
     :param languages: '|' separated list of languages to be considered
+    :param engine: 'threads' for three ThreadPoolExecutor phases, 'async' for the asyncio pipeline
+    :param concurrency: max number of requests at the same time per wiki with the async engine
+    :param workers: number of worker threads with the threads engine
+    :param journal: ScrapeJournal to write finished pages to, None for no journal
+    :param resume: continue the scrape in journal instead of starting a new one
+    :param previous: d['pages'] of a previous scrape for an incremental scrape, pages unchanged since then are
+                     copied from it instead of being fetched again
     :return: boolean idicating if an error occured or if the scrape completed successfully
     """
     # Scrape = read Wikipedia data from web, store in overall dict d, then save it for later analysis
@@ -119,49 +146,62 @@ def scrape_launch(d, e, sites, api_fields, max_depth, blacklist, category_title,
     d['stats']['categories_cnt'] = 0
     d['stats']['pages_cnt'] = 0
     d['stats']['scrape_start'] = now_ymd_hms()
+    revisions_mode = api_fields.get('modes', {}).get('revisions', 'history')
+    if revisions_mode != 'history':
+        # 'revisions' holds at most the latest revision of every page, so 'revisions_cnt' is not the edit count
+        d['stats']['revisions_mode'] = revisions_mode
+    if journal is not None and resume:
+        header, pages = journal.load()
+        d['pages'] = from_json(pages)
+        d['stats']['scrape_start'] = header['stats']['scrape_start']
+        d['stats']['pages_cnt'] = len(d['pages'])
+        journal.reopen()
+        print(f"Fortsätter skrapningen från {d['stats']['scrape_start']}, {len(d['pages'])} sidor finns redan")
+    elif journal is not None:
+        journal.start(d['stats'], max_depth)
+    if previous is not None:
+        d['stats']['pages_reused'] = 0
+    store = PageStore(d, journal=journal, previous=previous)
 
     start = datetime.now()
 
     is_article_list = ".txt" in category_title
 
     if is_article_list:
-        _scrape_article_list(d, e, sites, api_fields, category_title)
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as tpe:
-            _scrape_lang(d, e, api_fields, "*", "en", tpe=tpe)
+        _scrape_article_list(store, e, sites, api_fields, category_title)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as tpe:
+            _scrape_lang(store, e, sites, api_fields, "*", "en", tpe=tpe)
     else:
         # Loading bar while scraping pages
         loading = concurrent.futures.ThreadPoolExecutor(max_workers=1)
         loading_status = {'status': True}
-        loading.submit(loading_bar, loading_status, d)
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as tpe:
-            try:
-                _scrape_category(d, e, max_depth, sites, blacklist,
-                                 api_fields, category_title, lang, tpe=tpe)
-            except exceptions.APIError as we:
-                e['error_scrape_category wiki'] = {'info': we.args, }
-                print(f"wikitools API-fel {we.args}")
-                if "invalidcategory" in we.args:
-                    print("Felaktig kategori, avbryter programmet")
-                    return False
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as tpe:
-            try:
-                _scrape_missing_primary_language(d, e, max_depth, sites, blacklist, api_fields, tpe=tpe)
-            except exceptions.APIError as we:
-                e['error_scrape_missing_primary_language wiki'] = {'info': we.args, }
-                print(f"wikitools API-fel {we.args}")
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as tpe:
-            try:
-                _scrape_lang(d, e, api_fields, languages, lang, tpe=tpe)
-            except exceptions.APIError as we:
-                e['error_scrape_lang wiki'] = {'info': we.args, }
-                print(f"wikitools API-fel {we.args}")
-
-        loading_status['status'] = False
-        loading.shutdown(wait=False)
+        loading.submit(loading_bar, loading_status, store)
+        try:
+            if engine == 'async':
+                from lupp.scrape_async import scrape_category_async
+                success = scrape_category_async(store, e, sites, api_fields, max_depth, blacklist,
+                                                category_title, languages, concurrency=concurrency)
+            else:
+                success = _scrape_category_phases(store, e, sites, api_fields, max_depth, blacklist,
+                                                  category_title, languages, workers=workers)
+        finally:
+            # also when the scrape stops with an error, the loading bar would otherwise keep the program running
+            loading_status['status'] = False
+            loading.shutdown(wait=False)
+        if not success:
+            return False
+    if hasattr(sites, 'connection_stats'):
+        e['connections'] = sites.connection_stats()
+        e['rate_limits'] = sites.limiter_stats()
+        sites.print_connection_stats()
+    if sites.failed:
+        # batches that failed after all retries, the pages in them are missing data
+        e['failed_requests'] = sites.failed
+        print(f"{len(sites.failed)} anrop misslyckades efter upprepade försök, se felfilen")
+    if previous is not None:
+        print(f"{d['stats']['pages_reused']} av {len(d['pages'])} sidor oförändrade sedan förra skrapningen")
     try:
-        analyse_pagestats(d, e, api_fields)
-        analyse_langstats(d, e)
-        analyse_time_interval(d, e)
+        analyse(d, e, api_fields)
     except KeyError as ke:
         e['error_analyze'] = {'info': ke.args, }
         print(f'Could not analyze, the pages are missing data')
@@ -176,23 +216,54 @@ def scrape_launch(d, e, sites, api_fields, max_depth, blacklist, category_title,
     return True
 
 
-def scrapeb_launch(d, e, max_depth, sites, blacklist, api_fields):
+def _scrape_category_phases(store, e, sites, api_fields, max_depth, blacklist, category_title, languages,
+                            workers=MAX_WORKERS):
+    """Scrape category in three ThreadPoolExecutor phases
+
+    First the category tree in primary language, then the same categories in secondary language to find pages
+    missing from primary language, and lastly all pages in the other languages."""
+    lang = languages.split("|")[0]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as tpe:
+        try:
+            _scrape_category(store, e, max_depth, sites, blacklist,
+                             api_fields, category_title, lang, tpe=tpe)
+        except exceptions.APIError as we:
+            e['error_scrape_category wiki'] = {'info': we.args, }
+            print(f"wikitools API-fel {we.args}")
+            if "invalidcategory" in we.args:
+                print("Felaktig kategori, avbryter programmet")
+                return False
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as tpe:
+        try:
+            _scrape_missing_primary_language(store, e, max_depth, sites, blacklist, api_fields, tpe=tpe)
+        except exceptions.APIError as we:
+            e['error_scrape_missing_primary_language wiki'] = {'info': we.args, }
+            print(f"wikitools API-fel {we.args}")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as tpe:
+        try:
+            _scrape_lang(store, e, sites, api_fields, languages, lang, tpe=tpe)
+        except exceptions.APIError as we:
+            e['error_scrape_lang wiki'] = {'info': we.args, }
+            print(f"wikitools API-fel {we.args}")
+    return True
+
+
+def scrapeb_launch(d, e, max_depth, sites, blacklist, api_fields, workers=MAX_WORKERS):
     """Same as scrape_launch except only checks secondary language from main category"""
 
     # only started by developer (never end user), to save on response time while debugging/coding
     start = datetime.now()
+    store = PageStore(d)
 
     # scrape_lang()
     try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as tpe:
-            _scrape_missing_primary_language(d, e, max_depth, sites, blacklist, api_fields)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as tpe:
+            _scrape_missing_primary_language(store, e, max_depth, sites, blacklist, api_fields, tpe=tpe)
     except exceptions.APIError as we:
         e['error_scrape_category wiki'] = {'info': we.args, }
         print(f"wikitools API-fel {we.args}")
     try:
-        analyse_pagestats(d, e, api_fields)
-        analyse_langstats(d, e)
-        analyse_time_interval(d, e)
+        analyse(d, e, api_fields)
     except KeyError as ke:
         e['error_analyze'] = {'info': ke.args, }
         print(f'Kunde inte analysera, det fattas data från sidorna')
@@ -203,13 +274,14 @@ def scrapeb_launch(d, e, max_depth, sites, blacklist, api_fields):
     d['stats']['scraped'] = scraped
 
 
-def _scrape_category(d, e, max_depth, sites, blacklist, api_fields,
+def _scrape_category(store, e, max_depth, sites, blacklist, api_fields,
                      category_title, lang, depth=0, add_prefix=True, add_to_category=None, force=False, tpe=None):
     """Recursively retrieve stats about {category_title} from {lang}.wikipedia.org and save data in d.
 
     Recursively go through all pages and subcategories in category {category_title} on wikipedia
     in language based on lang. All categories and pages in the categories will be saved in the d dict.
 
+    :param store: PageStore for the 'global' dict d
     :param add_prefix: If wikipedia Category: needs to be added before title
     :param add_to_category: If this page belongs to a category, true for all subcategories
     :param force: Force program to retrieve info about category again, even though it might already exist
@@ -221,35 +293,53 @@ def _scrape_category(d, e, max_depth, sites, blacklist, api_fields,
         category_title = f"Kategori:{category_title}"
     full_title_lang = f"{category_title} ({lang})"
     e['timestamp'][full_title_lang] = now_ymd_hms()
-    category_exists = full_title_lang in d['categories']
+    category_exists = store.has_category(full_title_lang)
     if category_exists and not force:
         # print(f"\r- Category titled {full_title_lang} already exists, skipping") TODO: proper logging
         return
     # only scrape page and not category if max_depth reached
     elif depth >= int(max_depth):
-        tpe.submit(_scrape_pages, d, e, api_fields, category_title, lang, is_category=True)
+        tpe.submit(_scrape_pages, store, e, sites, api_fields, category_title, lang, is_category=True)
         return
 
     # print(f"\rCategory title: {category_title}") TODO: proper logging
 
-    d['stats']['categories_cnt'] += 1
-    category_itself = f"{category_title} ({lang})"
-    title_lang = f'title_{lang}'
-    d['categories'][full_title_lang] = {title_lang: category_title,
-                                        'pages': {category_itself: {title_lang: category_title}},
-                                        'order': d['stats']['categories_cnt']}
-    tpe.submit(_scrape_pages, d, e, api_fields, category_title, lang, is_category=True)
+    store.add_category(category_title, lang, force=True)
+    tpe.submit(_scrape_pages, store, e, sites, api_fields, category_title, lang, is_category=True)
+
+    subcategories, p_to_scrape = _category_members(store, e, sites, blacklist, category_title, lang,
+                                                   add_to_category)
+    for title in subcategories:
+        try:
+            _scrape_category(store, e, max_depth, sites, blacklist,
+                             api_fields, title, lang, depth=depth + 1, add_prefix=False, tpe=tpe)
+        except exceptions.APIError as we:
+            e['error_scrape_category wiki'] = {'info': we.args, }
+            print(f"wikitools API-fel {we.args}")
+            pass
+    # cut batch size to 50
+    for i in range(0, len(p_to_scrape), 50):
+        batch_string = '|'.join(p_to_scrape[i:i + 50])
+        tpe.submit(_scrape_pages, store, e, sites, api_fields, batch_string, lang, is_category=False, quickscan=False)
+
+
+def _category_members(store, e, sites, blacklist, category_title, lang, add_to_category=None):
+    """List all members of category {category_title} in {lang} and add them to the category in d.
 
-    site = sites[lang] = wiki.Wiki(f"https://{lang}.wikipedia.org/w/api.php")
+    Members are added to the pages of the category itself, or to the pages of :param add_to_category if given.
+    Blacklisted titles are skipped.
+
+    :return: tuple with list of titles of subcategories and list of titles of other pages in the category
+    """
+    full_title_lang = f"{category_title} ({lang})"
+    title_lang = f'title_{lang}'
     params = {'action': 'query', 'cmtitle': category_title,
               'list': 'categorymembers', 'cmlimit': 500}
 
-    request = api.APIRequest(site, params)
-    p_to_scrape = {}
-    for language in d['stats']['languages'].split('|'):
-        p_to_scrape.update({language: []})
+    subcategories = []
+    p_to_scrape = []
     # Create batches of results on top-level category
-    for result in request.queryGen():  # async_gen(request.queryGen):
+    for result in sites.query(lang, params):
         pages = result['query']['categorymembers']
 
         # -print(f"pages {pages}")
@@ -269,32 +359,18 @@ def _scrape_category(d, e, max_depth, sites, blacklist, api_fields,
             p_ftl = f"{full_title} ({lang})"
             # -print(f"full_title_lang {full_title_lang} p_ftl {p_ftl} title_lang {lang}")
             if add_to_category is None:
-                d['categories'][full_title_lang]['pages'][p_ftl] = {title_lang: title}
+                store.add_category_page(full_title_lang, p_ftl, {title_lang: title})
             else:
-                lang_1_category_pages = d['categories'][add_to_category]['pages']
-                lang_2_page_exists = p_ftl in lang_1_category_pages
-                if not lang_2_page_exists:
-                    lang_1_category_pages[p_ftl] = {title_lang: title}
+                store.add_category_page(add_to_category, p_ftl, {title_lang: title}, only_new=True)
 
             if page_is_category:
-                try:
-                    _scrape_category(d, e, max_depth, sites, blacklist,
-                                     api_fields, title, lang, depth=depth + 1, add_prefix=False, tpe=tpe)
-                except exceptions.APIError as we:
-                    e['error_scrape_category wiki'] = {'info': we.args, }
-                    print(f"wikitools API-fel {we.args}")
-                    pass
+                subcategories.append(title)
             else:
-                p_to_scrape[lang] += [title]
-    for b_l in p_to_scrape:
-        batch = p_to_scrape[b_l]
-        # cut batch size to 50
-        for i in range(0, len(batch), 50):
-            batch_string = '|'.join(batch[i:i + 50])
-            tpe.submit(_scrape_pages, d, e, api_fields, batch_string, b_l, is_category=False, quickscan=False)
+                p_to_scrape.append(title)
+    return subcategories, p_to_scrape
 
 
-def _scrape_article_list(d, e, sites, api_fields, filename, lang="en"):
+def _scrape_article_list(store, e, sites, api_fields, filename, lang="en"):
     """Scrape pages from list of different pages
 
     Reads a list of pages from text file and scrapes the pages. Works in priciple the same as _scrape_category(..),
@@ -308,12 +384,9 @@ def _scrape_article_list(d, e, sites, api_fields, filename, lang="en"):
 
     print(f"File list: {filename}")
 
-    d['stats']['categories_cnt'] += 1
-    category_itself = f"{filename} ({lang})"
+    d = store.d
     title_lang = f'title_{lang}'
-    d['categories'][header_title_lang] = {title_lang: filename,
-                                          'pages': {category_itself: {title_lang: filename}},
-                                          'order': d['stats']['categories_cnt']}
+    store.add_category(filename, lang, force=True)
     if os.path.exists(filename):
         with codecs.open(filename) as f:
             articles = f.readlines()
@@ -322,8 +395,6 @@ def _scrape_article_list(d, e, sites, api_fields, filename, lang="en"):
     else:
         print(f"Filen {filename} saknas")
         sys.exit()
-    site = sites[lang] = wiki.Wiki(f"https://{lang}.wikipedia.org/w/api.php")
-
     titles = '|'.join(articles)
     # print(f'Checking {len(articles)} pages') TODO: proper logging
     is_category = False
@@ -331,23 +402,19 @@ def _scrape_article_list(d, e, sites, api_fields, filename, lang="en"):
         # print(f"Article {full_title}") TODO: proper logging
         full_title_lang = f"{full_title} ({lang})"
         # print(f"full_title_lang {full_title_lang}") TODO: proper logging
-        d['stats']['pages_cnt'] += 1
-        d['pages'][full_title_lang] = {'title': full_title,
-                                       'is_category': is_category}
+        claimed = store.claim_pages([full_title], lang, lambda title: _new_page(title, is_category, api_fields))
 
         # Append page title to "category" list (in fact: article list)
         p_ftl = f"{full_title} ({lang})"
-        d['categories'][header_title_lang]['pages'][p_ftl] = {title_lang: full_title}
-
-        # Create empty list for all list type fields
-        for fld in api_fields["has_title"] + api_fields["other"]:
-            d['pages'][full_title_lang][fld] = []
+        store.add_category_page(header_title_lang, p_ftl, {title_lang: full_title})
+        if not claimed:
+            # already scraped before the scrape was resumed
+            continue
 
         params = {'action': 'query', 'titles': full_title, 'prop': api_fields['prop'], **api_fields['max_limits']}
-        req_links = api.APIRequest(site, params)
         j = 0
         # Create batches of results on individual items within page
-        for sub_result in req_links.queryGen():  # async_gen(req_links):
+        for sub_result in sites.query(lang, params):
             j += 1
             pages = sub_result['query']['pages']
             for page_id in list(pages):
@@ -371,7 +438,7 @@ def _scrape_article_list(d, e, sites, api_fields, filename, lang="en"):
 
                 if 'contributors' in pageinfo:
                     for item in pageinfo['contributors']:
-                        d['pages'][full_title_lang]['contributors'].append(item['name'])
+                        d['pages'][full_title_lang]['contributors'].append(intern(item['name']))
 
                 if 'langlinks' in pageinfo:
                     ll = d['pages'][full_title_lang]['langlinks']
@@ -391,35 +458,36 @@ def _scrape_article_list(d, e, sites, api_fields, filename, lang="en"):
                 for fld in api_fields["has_title"]:
                     if fld in pageinfo:
                         for item in pageinfo[fld]:
-                            d['pages'][full_title_lang][fld].append(item['title'])
+                            d['pages'][full_title_lang][fld].append(intern(item['title']))
                 if 'extlinks' in pageinfo:
                     for item in pageinfo['extlinks']:
                         d['pages'][full_title_lang]['extlinks'].append(item['*'])
+        store.checkpoint([full_title], lang)
 
     # print(f"\r({[len(d['pages'][f'{ftl} ({lang})']['langlinks']) for ftl in articles]} langs)") TODO: proper logging
 
 
-def _scrape_sections(d, e, title, lang):
+def _scrape_sections(store, e, sites, title, lang):
     """Scrape all sections of a page
 
     Scrape all sections of a page and add them to the global dict.
     Page is specified via :param title and :param lang."""
     # scrape section headers on individual page
     full_title_lang = f"{title} ({lang})"
-    site = wiki.Wiki(f"https://{lang}.wikipedia.org/w/api.php")
-    params = {'action': 'parse', 'page': title}
-    req_links = api.APIRequest(site, params)
-    d['pages'][full_title_lang]['sections'] = []
-    for sub_result in req_links.queryGen():  # async_gen(req_links):
+    # only ask for the section outline, not the rendered page text
+    params = {'action': 'parse', 'page': title, 'prop': 'sections'}
+    page = store.page(full_title_lang)
+    page['sections'] = []
+    for sub_result in sites.query(lang, params):
         sections = sub_result['parse']['sections']
         for section in sections:
             toclevel = section['toclevel']
             header = section['line']
             dashes = (toclevel - 1) * "-"
-            d['pages'][full_title_lang]['sections'].append(dashes + header)
+            page['sections'].append(dashes + header)
 
 
-def _scrape_revisions(d, e, title, lang):
+def _scrape_revisions(store, e, sites, title, lang):
     """scrape edit history of individual page
 
     Scrape edit history of individual page. Saves user, timestamp and comment of every revision to the page
@@ -427,61 +495,188 @@ def _scrape_revisions(d, e, title, lang):
     Page is specified via :param title and :param lang.
     """
     full_title_lang = f"{title} ({lang})"
-    site = wiki.Wiki(f"https://{lang}.wikipedia.org/w/api.php")
     params = {'action': 'query', 'titles': title, 'prop': 'revisions',
               'rvprop': 'timestamp|user|comment', 'rvdir': 'newer',
               'rvstart': '2017-01-01T00:00:00Z', 'rvlimit': 500}
-    req_links = api.APIRequest(site, params)
-    d['pages'][full_title_lang]['revisions'] = []
-    for sub_result in req_links.queryGen():  # async_gen(req_links):
+    revisions_list = store.page(full_title_lang)['revisions'] = []
+    for sub_result in sites.query(lang, params):
         pages = sub_result['query']['pages']
         page = pages[list(pages)[0]]
         if 'revisions' in page:
             revisions = page['revisions']
             for revision in revisions:
-                d['pages'][full_title_lang]['revisions'].append(revision)
+                revisions_list.append(revision)
+
+
+def _scrape_revisions_batch(store, e, sites, titles, lang):
+    """Scrape latest revision of a batch of pages
+
+    Scrape user, timestamp and comment of the latest revision for all pages in :param titles with one request
+    per batch. The API only returns the full edit history for a single page per request, which is what
+    _scrape_revisions(..) does.
+    Pages are specified via :param titles, a list of titles, and :param lang.
+    """
+    params = {'action': 'query', 'titles': '|'.join(titles), 'prop': 'revisions',
+              'rvprop': 'ids|timestamp|user|comment'}
+    for title in titles:
+        store.page(f"{title} ({lang})")['revisions'] = []
+    seen = set()
+    # pages without data in one continuation batch are returned again in the next one, keep every revision once
+    for sub_result in sites.query(lang, params):
+        pages = sub_result['query']['pages']
+        for page_id in pages:
+            page = pages[page_id]
+            full_title_lang = f"{page['title']} ({lang})"
+            if page_id == '-1' or not store.has_page(full_title_lang):
+                continue
+            for revision in page.get('revisions', []):
+                if (page_id, revision.get('revid')) in seen:
+                    continue
+                seen.add((page_id, revision.get('revid')))
+                revision.pop('revid', None)
+                revision.pop('parentid', None)
+                store.page(full_title_lang)['revisions'].append(revision)
+
+
+def _scrape_page_details(store, e, sites, api_fields, titles, lang):
+    """Scrape sections and revisions for a batch of pages
+
+    Which requests are made depends on api_fields['modes']:
+     'sections': 'parse' requests the section outline of each page, 'off' skips sections.
+     'revisions': 'history' requests the edit history since 2017 of each page, 'batch' requests only the latest
+     revision of all pages at once, 'off' skips revisions.
+    Requests made per page are run concurrently in DETAIL_WORKERS threads.
+    :return: set of the titles whose sections or revisions could not be fetched
+    """
+    modes = api_fields.get('modes', {})
+    failed = set()
+    jobs = []
+    if modes.get('sections', 'parse') == 'parse':
+        jobs += [(_scrape_sections, title) for title in titles]
+    else:
+        for title in titles:
+            store.page(f"{title} ({lang})")['sections'] = []
+    if modes.get('revisions', 'history') == 'history':
+        jobs += [(_scrape_revisions, title) for title in titles]
+    elif modes.get('revisions') == 'batch':
+        for i in range(0, len(titles), 50):
+            try:
+                _scrape_revisions_batch(store, e, sites, titles[i:i + 50], lang)
+            except exceptions.APIError as we:
+                e['error_scrape_page_details wiki'] = {'info': we.args, }
+                print(f"wikitools API-fel {we.args}")
+                failed.update(titles[i:i + 50])
+    if not jobs:
+        return failed
+    with concurrent.futures.ThreadPoolExecutor(max_workers=DETAIL_WORKERS) as detail:
+        futures = {detail.submit(job, store, e, sites, title, lang): title for job, title in jobs}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                future.result()
+            except exceptions.APIError as we:
+                e['error_scrape_page_details wiki'] = {'info': we.args, }
+                print(f"wikitools API-fel {we.args}")
+                failed.add(futures[future])
+    return failed
 
 
-def _scrape_pages(d, e, api_fields, titles, lang, is_category, quickscan=False):
+def _new_page(title, is_category, api_fields):
+    """Return empty page record for title, before any data is scraped"""
+    page = PageRecord(title, is_category)
+    # Create empty list for all list type fields
+    for fld in api_fields["has_title"] + api_fields["other"]:
+        page[fld] = []
+    return page
+
+
+def _reuse_unchanged(store, sites, api_fields, titles, lang):
+    """Reuse data from the previous scrape for pages that have not changed since then
+
+    Asks only for page info and pageviews of the batch. A page whose 'touched' and 'lastrevid' are the same as in
+    the previous scrape gets its record from there, with fresh scalars and pageviews.
+    :return: list of titles that are new or have changed, and need to be scraped in full
+    """
+    params = {'action': 'query', 'titles': '|'.join(titles), 'prop': 'info|pageviews'}
+    if 'pvlimit' in api_fields['max_limits']:
+        params['pvlimit'] = api_fields['max_limits']['pvlimit']
+    infos = {}
+    for sub_result in sites.query(lang, params):
+        for page_id, pageinfo in sub_result['query']['pages'].items():
+            if page_id == '-1' or 'missing' in pageinfo:
+                continue
+            info = infos.setdefault(pageinfo['title'], {})
+            info.update(pageinfo)
+
+    changed = []
+    reused = 0
+    for title in titles:
+        info = infos.get(title)
+        if info is None:
+            # missing page or title normalized by the API, handled as in a full scrape
+            changed.append(title)
+            continue
+        full_title_lang = f"{title} ({lang})"
+        previous = store.previous.get(full_title_lang)
+        touched = info.get('touched', '').replace("T", " ").replace("Z", "")
+        unchanged = previous is not None and previous.get('touched') == touched and \
+            previous.get('lastrevid', str(info.get('lastrevid'))) == str(info.get('lastrevid'))
+        if not unchanged:
+            changed.append(title)
+            continue
+        page = store.page(full_title_lang)
+        is_category = page['is_category']
+        page.update(previous)
+        page['is_category'] = is_category
+        for fld in api_fields["scalars"]:
+            if fld in info:
+                page[fld] = str(info[fld]) if fld != 'touched' else touched
+        # pageviews change every day, also for pages that are not edited
+        page.pop('pageviews', None)
+        if 'pageviews' in info:
+            page['pageviews'] = info['pageviews']
+        reused += 1
+    if reused:
+        store.incr('pages_reused', reused)
+    return changed
+
+
+def _scrape_pages(store, e, sites, api_fields, titles, lang, is_category, quickscan=False):
     """Scrape a batch of pages
 
     Scrape a batch of pages and save the information in the global dict.
     Page batch size should optimally be 50 to optimize number of api requests needed.
 
-    :param d: 'global' dict where all data is saved
+    :param store: PageStore for the 'global' dict where all data is saved
     :param e: 'global' error dict where timestamps and errors are logged
+    :param sites: WikiSessions registry with the shared wikitools Wiki objects
     :param api_fields: what parameters are passed to the api requests
     :param titles: pipe ('|') separated string with all the page titles to be scraped
     :param lang: From which wiki the pages are requested from, eg. sv, en
     :param is_category: If this page is a category page, eg. Category: Finland
     :param quickscan: If false, skips to save data from api_fields['has_title']
-    :return: None
+    :return: list of titles of the pages added by this call, pages that already existed are skipped
+
+    In an incremental scrape (store.previous is set), pages unchanged since the previous scrape are not fetched.
     """
-    full_titles = titles.split('|')
-    for full_title in full_titles.copy():
-        full_title_lang = f"{full_title} ({lang})"
-        page_exists = full_title_lang in d['pages']
-        if page_exists:
-            full_titles.remove(full_title)
-            continue
-        d['stats']['pages_cnt'] += 1
-        d['pages'][full_title_lang] = {'title': full_title,
-                                       'is_category': is_category}
-        # Create empty list for all list type fields
-        for fld in api_fields["has_title"] + api_fields["other"]:
-            d['pages'][full_title_lang][fld] = []
+    full_titles = store.claim_pages(titles.split('|'), lang,
+                                    lambda title: _new_page(title, is_category, api_fields))
     # skipping already existing pages
     if not full_titles:
-        return
-    titles = '|'.join(full_titles)
+        return full_titles
+    fetch_titles = full_titles
+    if store.previous is not None:
+        fetch_titles = _reuse_unchanged(store, sites, api_fields, full_titles, lang)
+        if not fetch_titles:
+            store.checkpoint(full_titles, lang)
+            return full_titles
+    titles = '|'.join(fetch_titles)
     # print(f'scrape_pages {full_titles}') TODO: proper logging
 
-    site = wiki.Wiki(f"https://{lang}.wikipedia.org/w/api.php")
     params = {'action': 'query', 'titles': titles, 'prop': api_fields['prop'], **api_fields['max_limits']}
-    req_links = api.APIRequest(site, params)
     j = 0
+    found_titles = []
     # Create batches of results on individual items within page
-    for sub_result in req_links.queryGen():  # async_gen(req_links):
+    for sub_result in sites.query(lang, params):
         j += 1
         pages = sub_result['query']['pages']
         # page_id = list(pages)[0]
@@ -491,6 +686,7 @@ def _scrape_pages(d, e, api_fields, titles, lang, is_category, quickscan=False):
                 continue
             pageinfo = pages[page_id]
             full_title_lang = f"{pageinfo['title']} ({lang})"
+            page = store.page(full_title_lang)
             # print(f"page_id {page_id} title {full_title_lang} j {j}")
             # Loop individual scalar fields
             if j == 1:
@@ -499,19 +695,19 @@ def _scrape_pages(d, e, api_fields, titles, lang, is_category, quickscan=False):
                         val = pageinfo[fld]
                         if fld == 'touched':
                             val = val.replace("T", " ").replace("Z", "")
-                        d['pages'][full_title_lang][fld] = str(val)
+                        page[fld] = str(val)
 
             # Calculate page views (with peculiar MediaWiki structure)
             if 'pageviews' in pageinfo:
                 a_dict = pageinfo['pageviews']
-                d['pages'][full_title_lang]['pageviews'] = a_dict
+                page['pageviews'] = a_dict
 
             if 'contributors' in pageinfo:
                 for item in pageinfo['contributors']:
-                    d['pages'][full_title_lang]['contributors'].append(item['name'])
+                    page['contributors'].append(intern(item['name']))
 
             if 'langlinks' in pageinfo:
-                ll = d['pages'][full_title_lang]['langlinks']
+                ll = page['langlinks']
                 for item in pageinfo['langlinks']:
                     if item['lang'] == 'nb':
                         if 'no' not in pageinfo['langlinks'] and \
@@ -529,18 +725,20 @@ def _scrape_pages(d, e, api_fields, titles, lang, is_category, quickscan=False):
                 for fld in api_fields["has_title"]:
                     if fld in pageinfo:
                         for item in pageinfo[fld]:
-                            d['pages'][full_title_lang][fld].append(item['title'])
+                            page[fld].append(intern(item['title']))
                 if 'extlinks' in pageinfo:
                     for item in pageinfo['extlinks']:
-                        d['pages'][full_title_lang]['extlinks'].append(item['*'])
+                        page['extlinks'].append(item['*'])
             if j == 1:
-                _scrape_sections(d, e, pageinfo['title'], lang)
-                _scrape_revisions(d, e, pageinfo['title'], lang)
-
+                found_titles.append(pageinfo['title'])
+    failed = _scrape_page_details(store, e, sites, api_fields, found_titles, lang)
+    # pages missing sections or revisions are left out of the journal, so that resume fetches them again
+    store.checkpoint([title for title in full_titles if title not in failed], lang)
     # print(f"\r({[len(d['pages'][f'{ftl} ({lang})']['langlinks']) for ftl in full_titles]} langs)")TODO: proper logging
+    return full_titles
 
 
-def _scrape_lang(d, e, api_fields, langs, primary_lang, tpe=None):
+def _scrape_lang(store, e, sites, api_fields, langs, primary_lang, tpe=None):
     """Scrape all pages in main category, (or page list) in other languages
 
     Scrape all pages in main category in other languages. If :param langs is '*',
@@ -550,8 +748,8 @@ def _scrape_lang(d, e, api_fields, langs, primary_lang, tpe=None):
     if limited_langs:
         other_langs = langs.split('|')
         other_langs.remove(primary_lang)
-    l_categories = list(d['categories'])
-    l_categories.sort(key=lambda x: d['categories'][x]['order'])
+    d = store.d
+    l_categories = store.categories_by_order()
     for title in l_categories:
         p_to_scrape = {}
         if limited_langs:
@@ -589,18 +787,18 @@ def _scrape_lang(d, e, api_fields, langs, primary_lang, tpe=None):
             # cut batch size to 50 to retrieve 50 pages at a time from the API
             for i in range(0, len(batch), 50):
                 batch_string = '|'.join(batch[i:i + 50])
-                tpe.submit(_scrape_pages, d, e, api_fields, batch_string, b_l, is_category, quickscan=False)
+                tpe.submit(_scrape_pages, store, e, sites, api_fields, batch_string, b_l, is_category, quickscan=False)
 
 
-def _scrape_missing_primary_language(d, e, max_depth, sites, blacklist, api_fields, tpe=None):
+def _scrape_missing_primary_language(store, e, max_depth, sites, blacklist, api_fields, tpe=None):
     """Try to recursively scrape main category in second language
 
     Try to recursively scrape main category in second language. First try to find main category page in second language,
     then start new _scrape_category(..) for that category in second language.
 
     Done to find pages that exist in second language missing from primary lnaguage."""
-    l_categories = list(d['categories'])
-    l_categories.sort(key=lambda x: d['categories'][x]['order'])
+    d = store.d
+    l_categories = store.categories_by_order()
     # create a list of pages in the desired order
     for category_title in l_categories:
 
@@ -624,173 +822,49 @@ def _scrape_missing_primary_language(d, e, max_depth, sites, blacklist, api_fiel
         # TODO: proper logging
 
         # Read the entire 'fi' category "once again" (to catch missing pages)
-        _scrape_category(d, e, max_depth, sites, blacklist, api_fields, second_lang_title,
+        _scrape_category(store, e, max_depth, sites, blacklist, api_fields, second_lang_title,
                          d['stats']['lang_2'], add_prefix=False, add_to_category=category_title, force=True, tpe=tpe)
 
 
-def analyse_pagestats(d, e, api_fields):
-    """Analyze data scraped and create 'stats' dict for each page.
-
-    Analyze data scraped and create 'stats' dict for each page. The stat dict contains:
-     'stats': {'categories_cnt': '3',
-          'contributors_cnt': '7',
-          'contributors_tot': '7',
-          'extlinks_cnt': '5',
-          'images_cnt': '4',
-          'langlinks_cnt': '1',
-          'len_sv': '4444',
-          'links_cnt': '36',
-          'linkshere_cnt': '2',
-          'pageviews_sv': '1',
-          'pageviews_tot': '1',
-          'quality': 84,
-          'redirects_cnt': '0',
-          'revisions_cnt': '3',
-          'total_langs': 1},
-
-    Quality is a value calculated based on different aspects of the page, for example length, image count,
-    number of different language links, external links etc. The rest of the stats are directly taken from the
-    scraped data.
+def ranked(values, top=None):
+    """Return keys of dict values sorted by their values, largest first, equal values in the order of the dict
 
-    """
-    def points(statistic):
-        return int(stats[statistic])
-
-    l_pages = list(d['pages'])
-    for p in l_pages:
-        d['pages'][p]['stats'] = {}
-        d['pages'][p]['lang_stats'] = {}
-        stats = d['pages'][p]['stats']
-        lang_stats = d['pages'][p]['lang_stats']
-        anon = int(d['pages'][p].get('anoncontributors', 0))
-        known = len(d['pages'][p]['contributors'])
-        stats['contributors_tot'] = str(anon + known)
-
-        # Zero the counters for the page
-        count = {}
-        vals = {}
-        for fld in [field for types in api_fields.values() for field in types]:
-            count[fld] = 0
-            vals[fld] = ""
-
-        # Loop individual non-scalar fields
-        for fld in api_fields["has_title"] + api_fields["other"]:
-            if fld in d['pages'][p]:
-                cnt = len(d['pages'][p][fld])
-                count[fld] += cnt
-                stats[fld + "_cnt"] = str(count[fld])
-        # Calculate page views (with peculiar structure)
-        cnt = 0
-        if 'pageviews' in d['pages'][p]:
-            a_dict = d['pages'][p]['pageviews']
-            a_list = list(a_dict)
-            # Loop through individual dates
-            for item in a_list:
-                i = a_dict[item]
-                if i is not None:
-                    cnt += i
-        count['pageviews'] += cnt
-        stats['quality'] = 3 * points('categories_cnt') + \
-                           4 * points('images_cnt') + \
-                           4 * points('langlinks_cnt') + \
-                           1 * points('links_cnt') + \
-                           1 * points('linkshere_cnt') + \
-                           2 * points('extlinks_cnt') + \
-                           3 * points('redirects_cnt') + \
-                           1 * points('contributors_tot')
-
-        stats['pageviews_tot'] = str(count['pageviews'])
-        if "(sv)" in p:
-            stats['pageviews_sv'] = str(count['pageviews'])
-            stats['len_sv'] = d['pages'][p]['length']
-            lang_stats['sv'] = copy.deepcopy(stats)
-        elif "(fi)" in p:
-            stats['pageviews_fi'] = str(count['pageviews'])
-            stats['len_fi'] = d['pages'][p]['length']
-            lang_stats['fi'] = copy.deepcopy(stats)
-
-
-def analyse_langstats(d, e):
-    """"Analyze language data for all pages.
-
-    Analyze language data for all pages. Links stats from pages in other languages together
-     with same page in main language."""
-    languages = d['stats']['languages'].split("|")
-    for p in d['pages']:
-        d['pages'][p]['stats']['total_langs'] = len(d['pages'][p]['langlinks'])
-        for l_item in d['pages'][p]['langlinks']:
-            l = list(l_item)[0]
-            l_title = l_item[l]
-            # -print(f"p {p} l {l} title {l_title}") TODO: proper logging
-            if l in languages:
-                # l_title = d['pages'][p]['langlinks'][l]
-                p_in_lang = f"{l_title} ({l})"
-                # -print(f"l {l} title {l_title} p {p_in_lang} ")
-                if p_in_lang in d['pages']:
-                    pv_in_lang = d['pages'][p_in_lang]['stats']['pageviews_tot']
-                    l_in_lang = d['pages'][p_in_lang].get('length', -1)
-                    # -print(f"p {p} pv {pv_in_lang} l {l_in_lang}")
-                    d['pages'][p]['stats']["pageviews_" + l] = pv_in_lang
-                    d['pages'][p]['stats']["len_" + l] = l_in_lang
-                    d['pages'][p]["lang_stats"][l] = copy.deepcopy(d['pages'][p_in_lang]['stats'])
-
-
-def analyse_time_interval(d, e):
-    """Add information about pageview data to main 'stats' dict.
-
-    Analyze pageview data and add start date, end date, and duration in days to main 'stats' part of dict."""
-    first = "2099-12-13"
-    last = "1899-01-01"
-    for p in d['pages']:
-        page = d['pages'][p]
-        if 'pageviews' in page:
-            for a_date in page['pageviews']:
-                first = min(first, a_date)
-                last = max(last, a_date)
-    d['stats']['date_from'] = first
-    d['stats']['date_to'] = last
-    d['stats']['pv_days'] = days_between(first, last) + 1
-
-
-def analyse_and_save_contributors(d, e, category, fmt='html'):
+    With top, only the top largest are returned, picked with a heap without sorting the rest."""
+    if top is not None:
+        return heapq.nlargest(top, values, key=values.get)
+    return sorted(values, key=values.get, reverse=True)
+
+
+def analyse_and_save_contributors(d, e, category, fmt='html', top=None):
     """Analyze contributors and save list of top contributors in descending order.
 
     Analyze contributor data from all pages. Create list of all contributors
      ordered based onnumber of contributions.
 
-     Format of saved file can be specified with :param fmt as either html or wikitext."""
+     Format of saved file can be specified with :param fmt as either html or wikitext.
+     With :param top only the top contributors are listed."""
     html = HTML()
-    user_stat = {}
-    l = list(d['pages'])
+    index = page_index(d)
+    langs = d['stats']['languages'].split("|")
+    # edits of every user in all languages, and in each of the languages of the scrape
+    edits = Counter()
+    lang_edits = {lang: Counter() for lang in langs}
     c_title = c_item = 0
-    for title in l:
+    for title, page in d['pages'].items():
         c_title += 1
-        lang = title.split("(")[-1].strip(")")
-        l2 = d['pages'][title]['contributors']
-        for item in l2:
-            c_item += 1
-            if item in user_stat:
-                user_stat[item]['edits'] += 1
-            else:
-                user_stat[item] = {}
-                user_stat[item]['edits'] = 1
-            if lang in user_stat[item]:
-                user_stat[item][lang] += 1
-            else:
-                user_stat[item][lang] = 1
-    c_contrib = len(user_stat)
-    if len(user_stat) > 1000:
-        user_stat = {k: v for k, v in user_stat.items() if v['edits'] > 5}
-    langs = d['stats']['languages'].split("|")
-    def comparer(left, right):
-        for lang_column in langs:
-            l = user_stat[left].get(lang_column, 0)
-            r = user_stat[right].get(lang_column, 0)
-            t =  r - l
-            if t:
-                return t
-        return 0
-    user_sorted = sorted(user_stat, key=cmp_to_key(comparer))
+        contributors = page['contributors']
+        c_item += len(contributors)
+        edits.update(contributors)
+        lang = index.lang(title)
+        if lang in lang_edits:
+            lang_edits[lang].update(contributors)
+    c_contrib = len(edits)
+    users = edits
+    if len(edits) > 1000:
+        users = [user for user, n in edits.items() if n > 5]
+    # the users are ranked by their edits in the first language, then the second and so on
+    user_stat = {user: tuple(lang_edits[lang][user] for lang in langs) for user in users}
+    user_sorted = ranked(user_stat, top)
 
     stats = d['stats']
     page_title = stats['category_title']
@@ -818,62 +892,59 @@ def analyse_and_save_contributors(d, e, category, fmt='html'):
 
     else:
         print("Unknown file format, try html instead")
-        h = ""
-
-    i = 0
-    for user in user_sorted:
-        i += 1
-
-        user_page = f"https://sv.wikipedia.org/wiki/Användare:{user}"
-        disc_page = f"https://sv.wikipedia.org/wiki/Användardiskussion:{user}"
-
-        if fmt == 'html':
-            a_href = "<a href='{}'>{}</a>"
+        return
 
-            row = tdr(a_href.format(disc_page, i))
-            row += td(a_href.format(user_page, user))
-            for lang in langs:
-                contrib_page = f"https://{lang}.wikipedia.org/wiki/Special:Contributions/{user}"
-                row += tdr(a_href.format(contrib_page, user_stat[user].get(lang, 0)))
+    dir_date = d['stats']['scrape_start'][:10]
+    name = f"contrib_{category}.html" if fmt == 'html' else f"contrib_{category}.txt"
+    with CountingFile(get_utf_file(name, fmt, dir_date=dir_date)) as f:
+        f.write(h)
+        i = 0
+        for user in user_sorted:
+            i += 1
 
-            h += tr(row)
+            user_page = f"https://sv.wikipedia.org/wiki/Användare:{user}"
+            disc_page = f"https://sv.wikipedia.org/wiki/Användardiskussion:{user}"
 
-        elif fmt == 'wikitext':
-            a_href = "[{} {}]"
-            row = align(a_href.format(disc_page.replace(' ', '&nbsp;'), i))
-            row += cell(a_href.format(user_page.replace(' ', '&nbsp;'), user))
-            for lang in langs:
-                contrib_page = f"https://{lang}.wikipedia.org/wiki/Special:Contributions/{user}"
-                row += align(a_href.format(contrib_page.replace(' ', '&nbsp;'), user_stat[user].get(lang, 0)))
+            if fmt == 'html':
+                a_href = "<a href='{}'>{}</a>"
 
-            h += f"{row}|-\n"
+                row = tdr(a_href.format(disc_page, i))
+                row += td(a_href.format(user_page, user))
+                for lang, n_edits in zip(langs, user_stat[user]):
+                    contrib_page = f"https://{lang}.wikipedia.org/wiki/Special:Contributions/{user}"
+                    row += tdr(a_href.format(contrib_page, n_edits))
 
-    if fmt == 'html':
-        h += html.end_table()
-        h += html.doc_footer()
+                f.write(tr(row))
 
-        dir_date = d['stats']['scrape_start'][:10]
-        save_utf_file(f"contrib_{category}.html", "html", h, dir_date=dir_date)
+            elif fmt == 'wikitext':
+                a_href = "[{} {}]"
+                row = align(a_href.format(disc_page.replace(' ', '&nbsp;'), i))
+                row += cell(a_href.format(user_page.replace(' ', '&nbsp;'), user))
+                for lang, n_edits in zip(langs, user_stat[user]):
+                    contrib_page = f"https://{lang}.wikipedia.org/wiki/Special:Contributions/{user}"
+                    row += align(a_href.format(contrib_page.replace(' ', '&nbsp;'), n_edits))
 
-    elif fmt == 'wikitext':
-        h += "|}\n"
+                f.write(f"{row}|-\n")
 
-        dir_date = d['stats']['scrape_start'][:10]
-        save_utf_file(f"contrib_{category}.txt", "wikitext", h, dir_date=dir_date)
+        if fmt == 'html':
+            f.write(html.end_table())
+            f.write(html.doc_footer())
+        else:
+            f.write(table_end())
+        print(f"Skapade {fmt}-filen {f.name} ({f.chars} tecken)")
 
 
 def save_as_html(d, e, api_fields, category):
     """Create html table of category and save as html file."""
     html = HTML()
     try:
-        analyse_pagestats(d, e, api_fields)
-        analyse_time_interval(d, e)
-        analyse_langstats(d, e)
+        analyse(d, e, api_fields)
     except KeyError as ke:
         e['error_analyze'] = {'info': ke.args, }
         print(f'Cound not analyze, the pages are missing data, canceling...')
         return
 
+    index = page_index(d)
     stats = d['stats']
     page_title = stats['category_title']
     datum = stats['scraped'][:-3]
@@ -884,160 +955,152 @@ def save_as_html(d, e, api_fields, category):
     desc = f"Sidvisningsstatistik {datum} för tidsperioden {date_from}--{date_to} ({date_days} dagar)"
 
     html.set_title_desc(page_title, desc)
-    h = html.doc_header()
-    h += html.start_table(column_count=13)
-
-    subh1 = th("") + th("") + th("Svenska", 5) + th("Finska", 2)
-    subh1 += th("Engelska", 2) + th("Tyska", 2)
-    subh1 = tr(subh1)
-    subh_grupp = th("Visat") + th(u"Längd")
-    subh2 = th("Nr") + thl("Artikel")
-    subh2 += th("Visat") + th("% av fi") + th(u"Längd") + th("% av fi") + th("Kvalitet")
-    subh2 += subh_grupp * 3
-    subh2 += th("Språk(Totalt)")
-    subh2 = tr(subh2)
+    dir_date = d['stats']['scrape_start'][:10]
+    with CountingFile(get_utf_file(f"c_{category}.html", "html", dir_date=dir_date)) as f:
+        f.write(html.doc_header())
+        f.write(html.start_table(column_count=13))
+
+        subh1 = th("") + th("") + th("Svenska", 5) + th("Finska", 2)
+        subh1 += th("Engelska", 2) + th("Tyska", 2)
+        subh1 = tr(subh1)
+        subh_grupp = th("Visat") + th(u"Längd")
+        subh2 = th("Nr") + thl("Artikel")
+        subh2 += th("Visat") + th("% av fi") + th(u"Längd") + th("% av fi") + th("Kvalitet")
+        subh2 += subh_grupp * 3
+        subh2 += th("Språk(Totalt)")
+        subh2 = tr(subh2)
 
-    l_categories = list(d['categories'])
-    l_categories.sort(key=lambda x: d['categories'][x]['order'])
-    i_cat = 0
-    for title in l_categories:
-        i_cat += 1
-        pages = d['categories'][title]['pages']
-        pl = []
-        for p in pages:
-            if "sv" in p:
-                weight = (int(d['pages'][p]['stats'].get('pageviews_sv', 0)) + 1) * 100000
-            elif "fi" in p:
-                # removes duplicates with finnish names from list
-                other_langs = {}
-                for item in d['pages'][p]['langlinks']:
-                    other_langs.update(item)
-                if 'sv' in other_langs and f"{other_langs['sv']} (sv)" in d['pages']:
-                    continue
+        l_categories = list(d['categories'])
+        l_categories.sort(key=lambda x: d['categories'][x]['order'])
+        i_cat = 0
+        for title in l_categories:
+            i_cat += 1
+            pages = d['categories'][title]['pages']
+            pl = []
+            for p in pages:
+                lang = index.lang(p)
+                if lang == 'sv':
+                    weight = (int(d['pages'][p]['stats'].get('pageviews_sv', 0)) + 1) * 100000
+                elif lang == 'fi':
+                    # removes duplicates with finnish names from list
+                    if index.version(p, 'sv') is not None:
+                        continue
+                    else:
+                        weight = int(d['pages'][p]['stats'].get('pageviews_fi', 0))
                 else:
-                    weight = int(d['pages'][p]['stats'].get('pageviews_fi', 0))
-            else:
-                print(f"Page {p} does not exist in sv or fi! Oh no!")
-                weight = 0
-            # print("weight %s" % weight)
-
-            d['categories'][title]['pages'][p]['order'] = weight
-            pl.append({'title': p, 'weight': weight})
-        # -print("pl ----")
-        # -pprint(pl)
-
-        # skip empty categories
-        if not pl:
-            i_cat -= 1
-            continue
+                    print(f"Page {p} does not exist in sv or fi! Oh no!")
+                    weight = 0
+                # print("weight %s" % weight)
 
-        pl.sort(key=lambda x: x['weight'], reverse=True)
-        cls = ""
-        if '(sv)' not in title:
-            cls = 'red'
-        h += html.h2(f"{i_cat}. {title}", cls=cls)
-        h += subh1
-        h += subh2
-        i_p = 0
-        for p_item in pl:
-            i_p += 1
-            p = p_item['title']
-            if p not in d['pages']:
+                d['categories'][title]['pages'][p]['order'] = weight
+                pl.append({'title': p, 'weight': weight})
+            # -print("pl ----")
+            # -pprint(pl)
+
+            # skip empty categories
+            if not pl:
+                i_cat -= 1
                 continue
-            the_page = d['pages'][p]
-            stats = d['pages'][p]['stats']
-            short_title = the_page['title']
-            quality = stats['quality']
-            total_langs = int(stats['total_langs']) + 1
-
-            pv_sv = int(stats.get('pageviews_sv', 0))
-            pv_fi = int(stats.get('pageviews_fi', 0))
-            pv_en = int(stats.get('pageviews_en', 0))
-            pv_de = int(stats.get('pageviews_de', 0))
-
-            l_sv = int(stats.get('len_sv', 0))
-            l_fi = int(stats.get('len_fi', 0))
-            l_en = int(stats.get('len_en', 0))
-            l_de = int(stats.get('len_de', 0))
-
-            # % of sv length in relation to fi
-            pct_l = 0 if l_fi == 0 else 100 * l_sv / l_fi
-            sp_l = "*" if l_fi == 0 else f'{pct_l:.0f}' + "%"
-            sp_l = red(sp_l) if pct_l < 70 else sp_l
-            sp_l = bold(sp_l) if pct_l < 30 else sp_l
-            sp_l = "" if l_sv == 0 else sp_l
-
-            # % of sv pageviews in relation to fi
-            pct_pv = 0 if pv_fi == 0 else 100 * pv_sv / pv_fi
-            sp_pv = "*" if pv_fi == 0 else f'{pct_pv:.0f}' + "%"
-            sp_pv = red(sp_pv) if pct_pv < 40 else sp_pv
-            sp_pv = bold(sp_pv) if pct_pv < 10 else sp_pv
-            sp_pv = "" if l_sv == 0 else sp_pv
-
-            s_pv = "" if pv_sv == 0 else str(pv_sv)
-            s_length = "-" if l_sv == 0 else str(l_sv)
-            si_p = red(str(i_p)) if l_sv == 0 else str(i_p)
-
-            p_fi = p_en = p_de = ""
-            if 'langlinks' in d['pages'][p]:
-                ll = d['pages'][p]['langlinks']
-                for item in ll:
-                    lang = list(item)[0]
-                    if lang == 'fi':
-                        p_fi = item['fi']
-                    if lang == 'en':
-                        p_en = item['en']
-                    if lang == 'de':
-                        p_de = item['de']
-            url_s = "<a href='https://{}.wikipedia.org/wiki/{}'>{}</a>"
-            if l_sv == 0:
-                url_lang = "fi"
-                # if there is no Swedish page, then this is a Finnish page and
-                # the title is the title of the page (it is not in 'langlinks')
-                p_fi = p
-            else:
-                url_lang = "sv"
-            url_title = url_s.format(url_lang, short_title, short_title)
-            url_title = italic(url_title) if l_sv == 0 else url_title
-
-            url_fi = "-" if p_fi == "" else url_s.format('fi', p_fi, pv_fi)
-            url_en = "-" if p_en == "" else url_s.format('en', p_en, pv_en)
-            url_de = "-" if p_de == "" else url_s.format('de', p_de, pv_de)
-
-            if p_fi == "":
-                l_fi = "-"
-            if p_en == "":
-                l_en = "-"
-            if p_de == "":
-                l_de = "-"
-
-            row = tdr(si_p) + td(url_title) + tdr(s_pv) + tdr(sp_pv)
-            row += tdr(s_length) + tdr(sp_l) + tdr(quality)
-            row += tdr(url_fi) + tdr(l_fi)
-            row += tdr(url_en) + tdr(l_en)
-            row += tdr(url_de) + tdr(l_de)
-            row += tdr(total_langs)
-            h += tr(row)
-    h += html.end_table()
-    h += html.doc_footer()
 
-    dir_date = d['stats']['scrape_start'][:10]
-    save_utf_file(f"c_{category}.html", "html", h, dir_date=dir_date)
+            pl.sort(key=lambda x: x['weight'], reverse=True)
+            cls = ""
+            if index.lang(title) != 'sv':
+                cls = 'red'
+            f.write(html.h2(f"{i_cat}. {title}", cls=cls))
+            f.write(subh1)
+            f.write(subh2)
+            i_p = 0
+            for p_item in pl:
+                i_p += 1
+                p = p_item['title']
+                if p not in d['pages']:
+                    continue
+                the_page = d['pages'][p]
+                stats = d['pages'][p]['stats']
+                short_title = the_page['title']
+                quality = stats['quality']
+                total_langs = int(stats['total_langs']) + 1
+
+                pv_sv = int(stats.get('pageviews_sv', 0))
+                pv_fi = int(stats.get('pageviews_fi', 0))
+                pv_en = int(stats.get('pageviews_en', 0))
+                pv_de = int(stats.get('pageviews_de', 0))
+
+                l_sv = int(stats.get('len_sv', 0))
+                l_fi = int(stats.get('len_fi', 0))
+                l_en = int(stats.get('len_en', 0))
+                l_de = int(stats.get('len_de', 0))
+
+                # % of sv length in relation to fi
+                pct_l = 0 if l_fi == 0 else 100 * l_sv / l_fi
+                sp_l = "*" if l_fi == 0 else f'{pct_l:.0f}' + "%"
+                sp_l = red(sp_l) if pct_l < 70 else sp_l
+                sp_l = bold(sp_l) if pct_l < 30 else sp_l
+                sp_l = "" if l_sv == 0 else sp_l
+
+                # % of sv pageviews in relation to fi
+                pct_pv = 0 if pv_fi == 0 else 100 * pv_sv / pv_fi
+                sp_pv = "*" if pv_fi == 0 else f'{pct_pv:.0f}' + "%"
+                sp_pv = red(sp_pv) if pct_pv < 40 else sp_pv
+                sp_pv = bold(sp_pv) if pct_pv < 10 else sp_pv
+                sp_pv = "" if l_sv == 0 else sp_pv
+
+                s_pv = "" if pv_sv == 0 else str(pv_sv)
+                s_length = "-" if l_sv == 0 else str(l_sv)
+                si_p = red(str(i_p)) if l_sv == 0 else str(i_p)
+
+                links = index.langlinks(p)
+                p_fi = links.get('fi', "")
+                p_en = links.get('en', "")
+                p_de = links.get('de', "")
+                url_s = "<a href='https://{}.wikipedia.org/wiki/{}'>{}</a>"
+                if l_sv == 0:
+                    url_lang = "fi"
+                    # if there is no Swedish page, then this is a Finnish page and
+                    # the title is the title of the page (it is not in 'langlinks')
+                    p_fi = p
+                else:
+                    url_lang = "sv"
+                url_title = url_s.format(url_lang, short_title, short_title)
+                url_title = italic(url_title) if l_sv == 0 else url_title
+
+                url_fi = "-" if p_fi == "" else url_s.format('fi', p_fi, pv_fi)
+                url_en = "-" if p_en == "" else url_s.format('en', p_en, pv_en)
+                url_de = "-" if p_de == "" else url_s.format('de', p_de, pv_de)
+
+                if p_fi == "":
+                    l_fi = "-"
+                if p_en == "":
+                    l_en = "-"
+                if p_de == "":
+                    l_de = "-"
+
+                row = tdr(si_p) + td(url_title) + tdr(s_pv) + tdr(sp_pv)
+                row += tdr(s_length) + tdr(sp_l) + tdr(quality)
+                row += tdr(url_fi) + tdr(l_fi)
+                row += tdr(url_en) + tdr(l_en)
+                row += tdr(url_de) + tdr(l_de)
+                row += tdr(total_langs)
+                f.write(tr(row))
+        f.write(html.end_table())
+        f.write(html.doc_footer())
+        print(f"Skapade html-filen {f.name} ({f.chars} tecken)")
 
 def save_as_csv(d, e, api_fields, category, need_analyse=False):
     """Create csv table of category and save as csv file."""
     if need_analyse:
         html = HTML()
         try:
-            analyse_pagestats(d, e, api_fields)
-            analyse_time_interval(d, e)
-            analyse_langstats(d, e)
+            analyse(d, e, api_fields)
         except KeyError as ke:
             e['error_analyze'] = {'info': ke.args, }
             print('Cound not analyze, the pages are missing data, canceling...')
             return
 
+    index = page_index(d)
     stats = d['stats']
+    # scrapes with --revisions batch or off do not have the number of revisions of the pages
+    revisions_counted = stats.get('revisions_mode', 'history') == 'history'
     page_title = stats['category_title']
     datum = stats['scraped'][:-3]
     date_from = stats['date_from']
@@ -1067,16 +1130,13 @@ def save_as_csv(d, e, api_fields, category, need_analyse=False):
             pages = d['categories'][title]['pages']
             pl = []
             for p in pages:
-                if "sv" in p:
+                lang = index.lang(p)
+                if lang == 'sv':
                     pstats = d['pages'][p]['stats']
                     weight = (int(pstats.get('pageviews_sv', 0)) + 1) * 100000
-                elif "fi" in p:
+                elif lang == 'fi':
                     # removes duplicates with finnish names from list
-                    other_langs = {}
-                    for item in d['pages'][p]['langlinks']:
-                        other_langs.update(item)
-                    if 'sv' in other_langs and \
-                       f"{other_langs['sv']} (sv)" in d['pages']:
+                    if index.version(p, 'sv') is not None:
                         continue
                     else:
                         pstats = d['pages'][p]['stats']
@@ -1108,7 +1168,7 @@ def save_as_csv(d, e, api_fields, category, need_analyse=False):
                     continue
                 the_page = d['pages'][p]
                 stats = d['pages'][p]['stats']
-                lang_stats = d['pages'][p]['lang_stats']
+                lang_stats = LangStats(d, the_page)
                 short_title = the_page['title']
                 quality = stats['quality']
                 total_langs = int(stats['total_langs']) + 1
@@ -1131,7 +1191,7 @@ def save_as_csv(d, e, api_fields, category, need_analyse=False):
                 extlinks_sv = int(sv_stats.get('extlinks_cnt', 0))
                 redirects_sv = int(sv_stats.get('redirects_cnt', 0))
                 contributors_sv = int(sv_stats.get('contributors_cnt', 0))
-                revisions_cnt_sv = int(sv_stats.get('revisions_cnt', 0))
+                revisions_cnt_sv = int(sv_stats.get('revisions_cnt', 0)) if revisions_counted else "-"
 
                 fi_stats = lang_stats.get('fi', {})
                 categories_fi = int(fi_stats.get('categories_cnt', 0))
@@ -1141,7 +1201,7 @@ def save_as_csv(d, e, api_fields, category, need_analyse=False):
                 extlinks_fi = int(fi_stats.get('extlinks_cnt', 0))
                 redirects_fi = int(fi_stats.get('redirects_cnt', 0))
                 contributors_fi = int(fi_stats.get('contributors_cnt', 0))
-                revisions_cnt_fi = int(fi_stats.get('revisions_cnt', 0))
+                revisions_cnt_fi = int(fi_stats.get('revisions_cnt', 0)) if revisions_counted else "-"
 
                 en_stats = lang_stats.get('en', {})
                 categories_en = int(en_stats.get('categories_cnt', 0))
@@ -1151,7 +1211,7 @@ def save_as_csv(d, e, api_fields, category, need_analyse=False):
                 extlinks_en = int(en_stats.get('extlinks_cnt', 0))
                 redirects_en = int(en_stats.get('redirects_cnt', 0))
                 contributors_en = int(en_stats.get('contributors_cnt', 0))
-                revisions_cnt_en = int(en_stats.get('revisions_cnt', 0))
+                revisions_cnt_en = int(en_stats.get('revisions_cnt', 0)) if revisions_counted else "-"
 
                 de_stats = lang_stats.get('de', {})
                 categories_de = int(de_stats.get('categories_cnt', 0))
@@ -1161,7 +1221,7 @@ def save_as_csv(d, e, api_fields, category, need_analyse=False):
                 extlinks_de = int(de_stats.get('extlinks_cnt', 0))
                 redirects_de = int(de_stats.get('redirects_cnt', 0))
                 contributors_de = int(de_stats.get('contributors_cnt', 0))
-                revisions_cnt_de = int(de_stats.get('revisions_cnt', 0))
+                revisions_cnt_de = int(de_stats.get('revisions_cnt', 0)) if revisions_counted else "-"
 
                 # % of sv length in relation to fi
                 pct_l = 0 if l_fi == 0 else 100 * l_sv / l_fi
@@ -1176,17 +1236,10 @@ def save_as_csv(d, e, api_fields, category, need_analyse=False):
                 s_pv = "" if pv_sv == 0 else str(pv_sv)
                 s_length = "-" if l_sv == 0 else str(l_sv)
 
-                p_fi = p_en = p_de = ""
-                if 'langlinks' in d['pages'][p]:
-                    ll = d['pages'][p]['langlinks']
-                    for item in ll:
-                        lang = list(item)[0]
-                        if lang == 'fi':
-                            p_fi = item['fi']
-                        if lang == 'en':
-                            p_en = item['en']
-                        if lang == 'de':
-                            p_de = item['de']
+                links = index.langlinks(p)
+                p_fi = links.get('fi', "")
+                p_en = links.get('en', "")
+                p_de = links.get('de', "")
                 # if there is no Swedish page, then this is a Finnish page and
                 # the title is the title of the page (it is not in 'langlinks')
                 if l_sv == 0:
@@ -1222,13 +1275,12 @@ def save_as_html_lang(d, e, api_fields, category):
     """Create html table with listing lengths of pages in all available languages and save as html file."""
     html = HTML()
     # try:
-    analyse_pagestats(d, e, api_fields)
-    analyse_time_interval(d, e)
-    analyse_langstats(d, e)
+    analyse(d, e, api_fields)
     # except KeyError as ke:
     #     e['error_analyze'] = {'info': ke.args, }
     #     print(f'Kunde inte analysera, det fattas data från sidorna! Avbryter...')
     #     return
+    index = page_index(d)
 
     stats = d['stats']
     page_title = stats['category_title'].strip(".txt")
@@ -1240,96 +1292,80 @@ def save_as_html_lang(d, e, api_fields, category):
     desc = f"Wikipedia Page View Stats {datum} for the period {date_from}--{date_to} ({date_days} days)"
 
     html.set_title_desc(page_title, desc)
-    h = html.doc_header()
-
-    # identify total count of all languages
-    langs = {}
-    pages = d['pages']
-    for p in pages:
-        lang = p.split("(")[-1].strip(")")
-        # language is at end, eg. (de), but the page title itself may contain parentheses
-        #  that do not refer to language - skip those!
-        is_a_lang = len(lang) < 4 or lang == "simple"
-        if not is_a_lang:
-            continue
-        if lang not in langs:
+    dir_date = d['stats']['scrape_start'][:10]
+    with CountingFile(get_utf_file(f"l_{category}.html", "html", dir_date=dir_date)) as f:
+        f.write(html.doc_header())
+
+        # identify total count of all languages
+        langs = {}
+        pages = d['pages']
+        for lang, lang_pages in index.by_lang.items():
+            # skip keys that do not end with a language code, eg. (de)
+            is_a_lang = len(lang) < 4 or lang == "simple"
+            if not is_a_lang:
+                continue
             langs[lang] = 0
-        pageviews = pages[p].get('pageviews', [])
-        for pv_date in pageviews:
-            pv = pageviews[pv_date]
-            if pv is not None:
-                langs[lang] += pv
-    print(f"languages, unsorted {langs}")
-    h += html.start_table(column_count=13)
-
-    subh1 = th("No") + thl("Article")
-    for l in langs:
-        subh1 += th(l)
-    subh1 = tr(subh1)
+            for p in lang_pages:
+                pageviews = pages[p].get('pageviews', [])
+                for pv_date in pageviews:
+                    pv = pageviews[pv_date]
+                    if pv is not None:
+                        langs[lang] += pv
+        print(f"languages, unsorted {langs}")
+        f.write(html.start_table(column_count=13))
+
+        subh1 = th("No") + thl("Article")
+        for l in langs:
+            subh1 += th(l)
+        subh1 = tr(subh1)
 
-    l_categories = list(d['categories'])
-    l_categories.sort(key=lambda x: d['categories'][x]['order'])
-    i_cat = 0
-    for title in l_categories:
-        print(f"Overall title {title}")
-        i_cat += 1
-        pages = d['categories'][title]['pages']
+        l_categories = list(d['categories'])
+        l_categories.sort(key=lambda x: d['categories'][x]['order'])
+        i_cat = 0
+        for title in l_categories:
+            print(f"Overall title {title}")
+            i_cat += 1
+            pages = d['categories'][title]['pages']
 
-        sorted_pages = {}
-        for page in pages:
-            if page not in d['pages']:
-                continue
-            sorted_pages[page] = d['pages'][page]
-        def comparer(left, right):
-            for lang_column in langs:
-                l_stats = sorted_pages[left]['lang_stats'].get(lang_column, {})
-                l = int(l_stats.get('pageviews_tot', 0))
-                r_stats = sorted_pages[right]['lang_stats'].get(lang_column, {})
-                r = int(r_stats.get('pageviews_tot', 0))
-                t =  r - l
-                if t:
-                    return t
-            return 0
-        sorted_pages = sorted(sorted_pages, key=cmp_to_key(comparer))
-
-        cls = ""
-        h += html.h2(f"{i_cat}. {title}", cls=cls)
-        h += subh1
-        i_p = 0
-        url_s = "<a href='https://{}.wikipedia.org/wiki/{}'>{}</a>"
-        for page in sorted_pages:
-            lang = page.split("(")[-1].strip(")")
-            title = d['pages'][page]['title']
-            pv = d['pages'][page]['stats']['pageviews_tot']
-            url = url_s.format(lang, title, title)
-            url_pv = url_s.format(lang, title, pv)
-            lang_dict = {}
-            for k in d['pages'][page]['langlinks']:
-                lang_dict[list(k)[0]] = k[list(k)[0]]
-            # print(f"== page = {page} title {title} dict {lang_dict}")
-            i_p += 1
-            row = tdr(i_p) + td(url)
-            for lang_column in langs:
-                if lang_column == lang:
-                    row += tdr(url_pv)
+            # the pages are ranked by the pageviews of their version in the first language, then the second and so on
+            pageviews = {}
+            for page in pages:
+                if page not in d['pages']:
                     continue
-                cell = ""
-                if 'langlinks' in d['pages'][page]:
-                    has_lang = lang_column in lang_dict
-                    if has_lang:
-                        page_in_lang = lang_dict[lang_column] + " (" + lang_column + ")"
-                        # print(page_in_lang + " -- " + lang_dict[lang_column])
-                        if page_in_lang in d['pages']:
-                            value = d['pages'][page_in_lang]['stats']['pageviews_tot']
-                            lang_title = d['pages'][page_in_lang]['title']
-                            cell = url_s.format(lang_column, lang_title, value)
-                row += tdr(cell)
-            h += tr(row)
-    h += html.end_table()
-    h += html.doc_footer()
-
-    dir_date = d['stats']['scrape_start'][:10]
-    save_utf_file(f"l_{category}.html", "html", h, dir_date=dir_date)
+                lang_stats = LangStats(d, d['pages'][page])
+                pageviews[page] = tuple(int(lang_stats.get(lang_column, {}).get('pageviews_tot', 0))
+                                        for lang_column in langs)
+            sorted_pages = ranked(pageviews)
+
+            cls = ""
+            f.write(html.h2(f"{i_cat}. {title}", cls=cls))
+            f.write(subh1)
+            i_p = 0
+            url_s = "<a href='https://{}.wikipedia.org/wiki/{}'>{}</a>"
+            for page in sorted_pages:
+                lang = index.lang(page)
+                title = d['pages'][page]['title']
+                pv = d['pages'][page]['stats']['pageviews_tot']
+                url = url_s.format(lang, title, title)
+                url_pv = url_s.format(lang, title, pv)
+                versions = index.versions(page)
+                i_p += 1
+                row = tdr(i_p) + td(url)
+                for lang_column in langs:
+                    if lang_column == lang:
+                        row += tdr(url_pv)
+                        continue
+                    cell = ""
+                    page_in_lang = versions.get(lang_column)
+                    if page_in_lang is not None:
+                        value = d['pages'][page_in_lang]['stats']['pageviews_tot']
+                        lang_title = d['pages'][page_in_lang]['title']
+                        cell = url_s.format(lang_column, lang_title, value)
+                    row += tdr(cell)
+                f.write(tr(row))
+        f.write(html.end_table())
+        f.write(html.doc_footer())
+        print(f"Skapade html-filen {f.name} ({f.chars} tecken)")
 
 
 def save_as_html_graphic(d, e, api_fields, category):
@@ -1337,13 +1373,12 @@ def save_as_html_graphic(d, e, api_fields, category):
     languages"""
     html = HTML()
     # try:
-    analyse_pagestats(d, e, api_fields)
-    analyse_time_interval(d, e)
-    analyse_langstats(d, e)
+    analyse(d, e, api_fields)
     # except KeyError as ke:
     #     e['error_analyze'] = {'info': ke.args, }
     #     print(f'Kunde inte analysera, det fattas data från sidorna! Avbryter...')
     #     return
+    index = page_index(d)
 
     stats = d['stats']
     page_title = stats['category_title'].strip(".txt")
@@ -1355,168 +1390,177 @@ def save_as_html_graphic(d, e, api_fields, category):
     desc = f"Wikipedia Page View Stats {datum} for the period {date_from}--{date_to} ({date_days} days)"
 
     html.set_title_desc(page_title, desc)
-    h = html.doc_header()
-    h += graph(graph_bar(html.h2("Svenska"), "sv", 1) +
-               graph_bar(html.h2("Finska"), "fi", 1) +
-               graph_bar(html.h2("Engelska"), "en", 1) +
-               graph_bar(html.h2("Tyska"), "de", 1),
-              cls="legend")
-    h += html.start_table(column_count=6)
-
-    subh = (th("Artikel") + th("SV Längd") +
-           th("Längd") + th("SV Läsningar") +
-           th("Läsningar") + th("Förslag"))
-    subh = tr(subh)
+    dir_date = d['stats']['scrape_start'][:10]
+    with CountingFile(get_utf_file(f"visual_{category}.html".replace(" ", "_"), "html", dir_date=dir_date)) as f:
+        f.write(html.doc_header())
+        f.write(graph(graph_bar(html.h2("Svenska"), "sv", 1) +
+                      graph_bar(html.h2("Finska"), "fi", 1) +
+                      graph_bar(html.h2("Engelska"), "en", 1) +
+                      graph_bar(html.h2("Tyska"), "de", 1),
+                      cls="legend"))
+        f.write(html.start_table(column_count=6))
+
+        subh = (th("Artikel") + th("SV Längd") +
+               th("Längd") + th("SV Läsningar") +
+               th("Läsningar") + th("Förslag"))
+        subh = tr(subh)
 
-    l_categories = list(d['categories'])
-    l_categories.sort(key=lambda x: d['categories'][x]['order'])
-    i_cat = 0
-    for title in l_categories:
-        i_cat += 1
-        pages = d['categories'][title]['pages']
-        pl = []
-        max_len = 0
-        max_pageviews = 0
-        for p in pages:
-            if "sv" in p:
-                weight = (int(d['pages'][p]['stats'].get('pageviews_sv', 0)) + 1) * 100000
-            elif "fi" in p:
-                # removes duplicates with finnish names from list
-                other_langs = {}
-                for item in d['pages'][p]['langlinks']:
-                    other_langs.update(item)
-                if 'sv' in other_langs and f"{other_langs['sv']} (sv)" in d['pages']:
-                    continue
+        l_categories = list(d['categories'])
+        l_categories.sort(key=lambda x: d['categories'][x]['order'])
+        i_cat = 0
+        for title in l_categories:
+            i_cat += 1
+            pages = d['categories'][title]['pages']
+            pl = []
+            max_len = 0
+            max_pageviews = 0
+            for p in pages:
+                lang = index.lang(p)
+                if lang == 'sv':
+                    weight = (int(d['pages'][p]['stats'].get('pageviews_sv', 0)) + 1) * 100000
+                elif lang == 'fi':
+                    # removes duplicates with finnish names from list
+                    if index.version(p, 'sv') is not None:
+                        continue
+                    else:
+                        weight = int(d['pages'][p]['stats'].get('pageviews_fi', 0))
                 else:
-                    weight = int(d['pages'][p]['stats'].get('pageviews_fi', 0))
-            else:
-                print(f"Page {p} does not exist in sv or fi! Oh no!")
-                weight = 0
-
-            d['categories'][title]['pages'][p]['order'] = weight
-            pl.append({'title': p, 'weight': weight})
+                    print(f"Page {p} does not exist in sv or fi! Oh no!")
+                    weight = 0
 
-        # skip empty categories
-        if not pl:
-            i_cat -= 1
-            continue
+                d['categories'][title]['pages'][p]['order'] = weight
+                pl.append({'title': p, 'weight': weight})
 
-        pl.sort(key=lambda x: x['weight'], reverse=True)
-        cls = ""
-        if '(sv)' not in title:
-            cls = 'red'
-        h += html.h2(f"{i_cat}. {title}", cls=cls)
-        h += subh
-        i_p = 0
-        for p_item in pl:
-            i_p += 1
-            p = p_item['title']
-            if p not in d['pages']:
+            # skip empty categories
+            if not pl:
+                i_cat -= 1
                 continue
-            the_page = d['pages'][p]
-            stats = d['pages'][p]['stats']
-            short_title = the_page['title']
-            quality = stats['quality']
 
-            pv_sv = int(stats.get('pageviews_sv', 0))
-            pv_fi = int(stats.get('pageviews_fi', 0))
-            pv_en = int(stats.get('pageviews_en', 0))
-            pv_de = int(stats.get('pageviews_de', 0))
+            pl.sort(key=lambda x: x['weight'], reverse=True)
+            cls = ""
+            if index.lang(title) != 'sv':
+                cls = 'red'
+            f.write(html.h2(f"{i_cat}. {title}", cls=cls))
+            f.write(subh)
+            i_p = 0
+            for p_item in pl:
+                i_p += 1
+                p = p_item['title']
+                if p not in d['pages']:
+                    continue
+                the_page = d['pages'][p]
+                stats = d['pages'][p]['stats']
+                short_title = the_page['title']
+                quality = stats['quality']
 
-            l_sv = int(stats.get('len_sv', 0))
-            l_fi = int(stats.get('len_fi', 0))
-            l_en = int(stats.get('len_en', 0))
-            l_de = int(stats.get('len_de', 0))
+                pv_sv = int(stats.get('pageviews_sv', 0))
+                pv_fi = int(stats.get('pageviews_fi', 0))
+                pv_en = int(stats.get('pageviews_en', 0))
+                pv_de = int(stats.get('pageviews_de', 0))
 
-            url_s = "<a href='https://{}.wikipedia.org/wiki/{}'>{}</a>"
-            url_lang = "fi" if l_sv == 0 else "sv"
-            url_title = url_s.format(url_lang, short_title, short_title)
-            url_title = italic(url_title) if l_sv == 0 else url_title
-
-            if max_len < l_sv:
-                max_len = l_sv
-            if max_pageviews < pv_sv:
-                max_pageviews = pv_sv
-            row = td(url_title, cls="row-title")
-            relative_len_graph = graph(graph_bar(lang="sv", size=l_sv) +
-                                       graph_bar(lang="fill", size=max_len - l_sv),
-                                       cls="relative")
-            row += td(relative_len_graph)
-            len_graph = graph(graph_bar(lang="sv", size=l_sv) +
-                              graph_bar(lang="fi", size=l_fi) +
-                              graph_bar(lang="en", size=l_en) +
-                              graph_bar(lang="de", size=l_de))
-            row += td(len_graph)
-            relative_pv_graph = graph(graph_bar(lang="sv", size=pv_sv) +
-                                      graph_bar(lang="fill", size=max_pageviews - pv_sv),
-                                      cls="relative")
-            row += td(relative_pv_graph)
-            pv_graph = graph(graph_bar(lang="sv", size=pv_sv) +
-                             graph_bar(lang="fi", size=pv_fi) +
-                             graph_bar(lang="en", size=pv_en) +
-                             graph_bar(lang="de", size=pv_de))
-            row += td(pv_graph)
-
-            # Rules for attention boxes
-            boxes = {}
-            for lang_name, lang_len, lang_pv in [('sv', l_sv, pv_sv),
-                                                 ('fi', l_fi, pv_fi),
-                                                 ('en', l_en, pv_en),
-                                                 ('de', l_de, pv_de)]:
-                # 1. language under 10% of swedish
-                if lang_len < l_sv * 0.1 and pv_sv > 5:
-                    boxes[lang_name] = 1
-
-                # 2. Read a lot but comparatively  short
-                if lang_pv * 5 > lang_len and pv_sv > 5:
-                    boxes[lang_name] = 2
-
-                # 3. language missing totally
-                if lang_len == 0 and (pv_sv > 5 or lang_name == "sv"):
-                    boxes[lang_name] = 3
-                    # box_levels.append(3)
-                    # box_langs.append(lang_name)
-
-            boxes = sorted(boxes.items(), key=lambda x: x[1])
-            box_langs, box_levels = list(zip(*boxes)) if boxes else ([], [])
-            row += td(action_box(box_levels, box_langs))
-            h += tr(row)
-
-    h += html.end_table()
-    h += html.doc_footer()
+                l_sv = int(stats.get('len_sv', 0))
+                l_fi = int(stats.get('len_fi', 0))
+                l_en = int(stats.get('len_en', 0))
+                l_de = int(stats.get('len_de', 0))
 
-    dir_date = d['stats']['scrape_start'][:10]
-    save_utf_file(f"visual_{category}.html".replace(" ", "_"), "html", h, dir_date=dir_date)
+                url_s = "<a href='https://{}.wikipedia.org/wiki/{}'>{}</a>"
+                url_lang = "fi" if l_sv == 0 else "sv"
+                url_title = url_s.format(url_lang, short_title, short_title)
+                url_title = italic(url_title) if l_sv == 0 else url_title
+
+                if max_len < l_sv:
+                    max_len = l_sv
+                if max_pageviews < pv_sv:
+                    max_pageviews = pv_sv
+                row = td(url_title, cls="row-title")
+                relative_len_graph = graph(graph_bar(lang="sv", size=l_sv) +
+                                           graph_bar(lang="fill", size=max_len - l_sv),
+                                           cls="relative")
+                row += td(relative_len_graph)
+                len_graph = graph(graph_bar(lang="sv", size=l_sv) +
+                                  graph_bar(lang="fi", size=l_fi) +
+                                  graph_bar(lang="en", size=l_en) +
+                                  graph_bar(lang="de", size=l_de))
+                row += td(len_graph)
+                relative_pv_graph = graph(graph_bar(lang="sv", size=pv_sv) +
+                                          graph_bar(lang="fill", size=max_pageviews - pv_sv),
+                                          cls="relative")
+                row += td(relative_pv_graph)
+                pv_graph = graph(graph_bar(lang="sv", size=pv_sv) +
+                                 graph_bar(lang="fi", size=pv_fi) +
+                                 graph_bar(lang="en", size=pv_en) +
+                                 graph_bar(lang="de", size=pv_de))
+                row += td(pv_graph)
+
+                # Rules for attention boxes
+                boxes = {}
+                for lang_name, lang_len, lang_pv in [('sv', l_sv, pv_sv),
+                                                     ('fi', l_fi, pv_fi),
+                                                     ('en', l_en, pv_en),
+                                                     ('de', l_de, pv_de)]:
+                    # 1. language under 10% of swedish
+                    if lang_len < l_sv * 0.1 and pv_sv > 5:
+                        boxes[lang_name] = 1
+
+                    # 2. Read a lot but comparatively  short
+                    if lang_pv * 5 > lang_len and pv_sv > 5:
+                        boxes[lang_name] = 2
+
+                    # 3. language missing totally
+                    if lang_len == 0 and (pv_sv > 5 or lang_name == "sv"):
+                        boxes[lang_name] = 3
+                        # box_levels.append(3)
+                        # box_langs.append(lang_name)
+
+                boxes = sorted(boxes.items(), key=lambda x: x[1])
+                box_langs, box_levels = list(zip(*boxes)) if boxes else ([], [])
+                row += td(action_box(box_levels, box_langs))
+                f.write(tr(row))
+
+        f.write(html.end_table())
+        f.write(html.doc_footer())
+        print(f"Skapade html-filen {f.name} ({f.chars} tecken)")
+
+
+# language names in Swedish, used when they cannot be read from the wiki
+LANG_NAMES = {'sv': 'Svenska', 'fi': 'Finska', 'en': 'Engelska',
+              'de': 'Tyska', 'no': 'Norska', 'fr': 'Franska'}
+
+
+def language_names(e):
+    """Read the Swedish names of all languages from sv.wikipedia, on failure LANG_NAMES"""
+    lang_names = dict(LANG_NAMES)
+    try:
+        site = wiki.Wiki(f"https://sv.wikipedia.org/w/api.php")
+        params = {'action': 'query', 'meta': 'languageinfo',
+                  'liprop': 'name', 'uselang': 'sv'}
+        req_links = api.APIRequest(site, params)
+        for sub_result in req_links.queryGen():  # async_gen(req_links):
+            for k, v in sub_result['query']['languageinfo'].items():
+                lang_names[k] = v['name'].capitalize()
+    except exceptions.APIError as we:
+        e['error_analyze'] = {'info': we.args, }
+        print('Failed to get language information from Wiki')
+    return lang_names
 
 
-def save_as_wikitext(d, e, api_fields, category, page_type='normal'):
+def save_as_wikitext(d, e, api_fields, category, page_type='normal', lang_names=None):
     """Create table of all pages in category and save as wikitext markup file.
 
-    Create table of all pages in category and save as textfile in wikitext markup. To be used in mediawiki."""
+    Create table of all pages in category and save as textfile in wikitext markup. To be used in mediawiki.
+    :param lang_names: language code -> name for the headers, by default read from the wiki with language_names(..)"""
     try:
-        analyse_pagestats(d, e, api_fields)
-        analyse_time_interval(d, e)
-        analyse_langstats(d, e)
+        analyse(d, e, api_fields)
     except KeyError as ke:
         e['error_analyze'] = {'info': ke.args, }
         print(f'Could not analyze, the pages are missing data')
 
+    index = page_index(d)
     stats = d['stats']
     page_title = stats['category_title']
     other_langs = stats['languages'][3:].split('|')
-    lang_names = {'sv': 'Svenska', 'fi': 'Finska', 'en': 'Engelska',
-                  'de': 'Tyska', 'no': 'Norska', 'fr': 'Franska'}
-    try:
-        site = wiki.Wiki(f"https://sv.wikipedia.org/w/api.php")
-        params = {'action': 'query', 'meta': 'languageinfo',
-                  'liprop': 'name', 'uselang': 'sv'}
-        req_links = api.APIRequest(site, params)
-        for sub_result in req_links.queryGen():  # async_gen(req_links):
-            for k, v in sub_result['query']['languageinfo'].items():
-                lang_names[k] = v['name'].capitalize()
-    except exceptions.APIError as we:
-        e['error_analyze'] = {'info': we.args, }
-        print('Failed to get language information from Wiki')
+    if lang_names is None:
+        lang_names = language_names(e)
     datum = stats['scraped'][:-3]
     date_from = stats['date_from']
     date_to = stats['date_to']
@@ -1542,127 +1586,123 @@ def save_as_wikitext(d, e, api_fields, category, page_type='normal'):
 
     l_categories = list(d['categories'])
     l_categories.sort(key=lambda x: d['categories'][x]['order'])
-    i_cat = 0
-
-    for cat in l_categories:
-        i_cat += 1
-        pages = []
-        if page_type == 'normal':
-            pages = d['categories'][cat]['pages']
-        elif page_type == 'top100':
-            pages = d['pages']
-        pl = []
-        for p in pages:
-            if "sv" in p:
-                weight = (int(d['pages'][p]['stats'].get('pageviews_sv', 0)) + 1) * 100000
-            elif "fi" in p:
-                # removes duplicates with finnish names from list
-                other_lang_links = {}
-                for item in d['pages'][p]['langlinks']:
-                    other_lang_links.update(item)
-                if 'sv' in other_lang_links and f"{other_lang_links['sv']} (sv)" in d['pages']:
-                    continue
-                else:
-                    weight = int(d['pages'][p]['stats'].get('pageviews_fi', 0))
-            else:
-                print(f"Sidan {p} har varken sv eller fi! Oj nej!")
-                weight = 0
+    dir_date = d['stats']['scrape_start'][:10]
+    if page_type == 'top100':
+        wikitext_file = f"c_{category}_top100.txt"
+    else:
+        wikitext_file = f"c_{category}.txt"
+    with CountingFile(get_utf_file(wikitext_file, "wikitext", dir_date=dir_date)) as f:
+        f.write(text)
+        i_cat = 0
+
+        for cat in l_categories:
+            i_cat += 1
+            pages = []
             if page_type == 'normal':
-                d['categories'][cat]['pages'][p]['order'] = weight
-            pl.append({'title': p, 'weight': weight})
-        # -print("pl ----")
-        # -pprint(pl)
-
-        # skip empty categories
-        if not pl:
-            i_cat -= 1
-            continue
+                pages = d['categories'][cat]['pages']
+            elif page_type == 'top100':
+                pages = d['pages']
+            pl = []
+            for p in pages:
+                lang = index.lang(p)
+                if lang == 'sv':
+                    weight = (int(d['pages'][p]['stats'].get('pageviews_sv', 0)) + 1) * 100000
+                elif lang == 'fi':
+                    # removes duplicates with finnish names from list
+                    if index.version(p, 'sv') is not None:
+                        continue
+                    else:
+                        weight = int(d['pages'][p]['stats'].get('pageviews_fi', 0))
+                else:
+                    print(f"Sidan {p} har varken sv eller fi! Oj nej!")
+                    weight = 0
+                if page_type == 'normal':
+                    d['categories'][cat]['pages'][p]['order'] = weight
+                pl.append({'title': p, 'weight': weight})
+            # -print("pl ----")
+            # -pprint(pl)
 
-        pl.sort(key=lambda x: x['weight'], reverse=True)
-
-        if page_type == 'top100':
-            pl = [x for x in pl if x['weight'] != 0][:100]
-
-        if '(sv)' not in cat:
-            cat = f"<span style='color:red'>{cat}</span>"
-        text += f'\n=    {i_cat} {cat} =\n\n'
-        text += subh
-        i_p = 0
-        for p_item in pl:
-            i_p += 1
-            p = p_item['title']
-            the_page = d['pages'][p]
-            stats = d['pages'][p]['stats']
-            short_title = the_page['title']
-            quality = stats['quality']
-            total_langs = int(stats['total_langs']) + 1
-            final = {'pv': {}, 'len': {}, 'url': {}}
-
-            for l in d['stats']['languages'].split('|'):
-                final['pv'][l] = int(stats.get(f'pageviews_{l}', 0))
-                final['len'][l] = int(stats.get(f"len_{l}", 0))
-            l_sv = final['len']['sv']
-
-            # % of sv length in relation to fi
-            pct_l = 0 if final['len']['fi'] == 0 else 100 * l_sv / final['len']['fi']
-            sp_l = "*" if final['len']['fi'] == 0 else f'{pct_l:.0f}' + "%"
-            sp_l = w_red(sp_l) if pct_l < 70 else sp_l
-            sp_l = w_bold(sp_l) if pct_l < 30 else sp_l
-            sp_l = "" if l_sv == 0 else sp_l
-
-            # % of sv pageviews in relation to fi
-            pct_pv = 0 if final['pv']['fi'] == 0 else 100 * final['pv']['sv'] / final['pv']['fi']
-            sp_pv = "*" if final['pv']['fi'] == 0 else f'{pct_pv:.0f}' + "%"
-            sp_pv = w_red(sp_pv) if pct_pv < 40 else sp_pv
-            sp_pv = w_bold(sp_pv) if pct_pv < 10 else sp_pv
-            sp_pv = "" if l_sv == 0 else sp_pv
-
-            s_pv = "" if final['pv']['sv'] == 0 else str(final['pv']['sv'])
-            s_length = "-" if l_sv == 0 else str(l_sv)
-            si_p = w_red(i_p) if l_sv == 0 else f"[[p/{short_title}|{i_p}]]"
-
-            final['p'] = {l: "" for l in other_langs}
-            if 'langlinks' in d['pages'][p]:
-                ll = d['pages'][p]['langlinks']
-                for item in ll:
-                    lang = list(item)[0]
-                    if lang in other_langs:
-                        final['p'][lang] = item[lang].replace(' ', '&nbsp;')
-            url_s = "[https://{}.wikipedia.org/wiki/{} {}]"
-            if l_sv == 0:
-                url_lang = "fi"
-                # if there is no Swedish page, then this is a Finnish page and
-                # the title is the title of the page (it is not in 'langlinks')
-                final['p']["fi"] = p.replace(' ', '&nbsp;')
+            # skip empty categories
+            if not pl:
+                i_cat -= 1
+                continue
+
+            if page_type == 'top100':
+                # only the most viewed pages are shown, the rest are not sorted
+                pl = heapq.nlargest(TOP_N, (x for x in pl if x['weight'] != 0), key=lambda x: x['weight'])
             else:
-                url_lang = "sv"
-            short_title = str(short_title).replace(' ', '&nbsp;')
-            url_title = url_s.format(url_lang, short_title, short_title)
-            url_title = w_italic(url_title) if l_sv == 0 else url_title
-
-            for l in other_langs:
-                if final['p'][l] == "":
-                    final['url'][l] = "-"
-                    final['len'][l] = "-"
-                else:
-                    final['url'][l] = url_s.format(l, str(final['p'][l]).replace(' ', '&nbsp;'), final['pv'][l])
-
-            row = cell(si_p) + colspan(url_title, 3) + align(s_pv) + align(sp_pv)
-            row += align(s_length) + align(sp_l) + align(quality)
-            for l in other_langs:
-                row += align(final['url'][l]) + align(final['len'][l])
-            row += align(total_langs)
-            row += "|-\n"
-            text += row
-        if page_type == 'top100':
-            break
-        text += "|}\n\n"
+                pl.sort(key=lambda x: x['weight'], reverse=True)
 
-    dir_date = d['stats']['scrape_start'][:10]
-    if page_type == 'normal':
-        save_utf_file(f"c_{category}.txt", "wikitext", text, dir_date=dir_date)
-    elif page_type == 'top100':
-        save_utf_file(f"c_{category}_top100.txt", "wikitext", text, dir_date=dir_date)
+            if index.lang(cat) != 'sv':
+                cat = f"<span style='color:red'>{cat}</span>"
+            f.write(f'\n=    {i_cat} {cat} =\n\n')
+            f.write(subh)
+            i_p = 0
+            for p_item in pl:
+                i_p += 1
+                p = p_item['title']
+                the_page = d['pages'][p]
+                stats = d['pages'][p]['stats']
+                short_title = the_page['title']
+                quality = stats['quality']
+                total_langs = int(stats['total_langs']) + 1
+                final = {'pv': {}, 'len': {}, 'url': {}}
+
+                for l in d['stats']['languages'].split('|'):
+                    final['pv'][l] = int(stats.get(f'pageviews_{l}', 0))
+                    final['len'][l] = int(stats.get(f"len_{l}", 0))
+                l_sv = final['len']['sv']
+
+                # % of sv length in relation to fi
+                pct_l = 0 if final['len']['fi'] == 0 else 100 * l_sv / final['len']['fi']
+                sp_l = "*" if final['len']['fi'] == 0 else f'{pct_l:.0f}' + "%"
+                sp_l = w_red(sp_l) if pct_l < 70 else sp_l
+                sp_l = w_bold(sp_l) if pct_l < 30 else sp_l
+                sp_l = "" if l_sv == 0 else sp_l
+
+                # % of sv pageviews in relation to fi
+                pct_pv = 0 if final['pv']['fi'] == 0 else 100 * final['pv']['sv'] / final['pv']['fi']
+                sp_pv = "*" if final['pv']['fi'] == 0 else f'{pct_pv:.0f}' + "%"
+                sp_pv = w_red(sp_pv) if pct_pv < 40 else sp_pv
+                sp_pv = w_bold(sp_pv) if pct_pv < 10 else sp_pv
+                sp_pv = "" if l_sv == 0 else sp_pv
+
+                s_pv = "" if final['pv']['sv'] == 0 else str(final['pv']['sv'])
+                s_length = "-" if l_sv == 0 else str(l_sv)
+                si_p = w_red(i_p) if l_sv == 0 else f"[[p/{short_title}|{i_p}]]"
+
+                links = index.langlinks(p)
+                final['p'] = {l: links.get(l, "").replace(' ', '&nbsp;') for l in other_langs}
+                url_s = "[https://{}.wikipedia.org/wiki/{} {}]"
+                if l_sv == 0:
+                    url_lang = "fi"
+                    # if there is no Swedish page, then this is a Finnish page and
+                    # the title is the title of the page (it is not in 'langlinks')
+                    final['p']["fi"] = p.replace(' ', '&nbsp;')
+                else:
+                    url_lang = "sv"
+                short_title = str(short_title).replace(' ', '&nbsp;')
+                url_title = url_s.format(url_lang, short_title, short_title)
+                url_title = w_italic(url_title) if l_sv == 0 else url_title
+
+                for l in other_langs:
+                    if final['p'][l] == "":
+                        final['url'][l] = "-"
+                        final['len'][l] = "-"
+                    else:
+                        final['url'][l] = url_s.format(l, str(final['p'][l]).replace(' ', '&nbsp;'), final['pv'][l])
+
+                row = cell(si_p) + colspan(url_title, 3) + align(s_pv) + align(sp_pv)
+                row += align(s_length) + align(sp_l) + align(quality)
+                for l in other_langs:
+                    row += align(final['url'][l]) + align(final['len'][l])
+                row += align(total_langs)
+                row += "|-\n"
+                f.write(row)
+            if page_type == 'top100':
+                break
+            f.write(table_end() + "\n")
+        print(f"Skapade wikitext-filen {f.name} ({f.chars} tecken)")
 
 
 def split_category(d, e, top_category):
@@ -1672,6 +1712,8 @@ def split_category(d, e, top_category):
     new files for all the subcategories.
 
     To be used for splitting up massive categories into smaller ones."""
+    index = page_index(d)
+    languages = d['stats']['languages'].split('|')
 
     def copy_category(category, order):
         """Extract subcategory from main category.
@@ -1693,23 +1735,19 @@ def split_category(d, e, top_category):
             cat['stats']['pages_cnt'] += 1
             cat['pages'][title] = d['pages'][title].copy()
             # checks for seconday language of pages
-            if 'sv' in title:
-                for l_page in cat['pages'][title]['langlinks']:
-                    if list(l_page)[0] in d['stats']['languages'].split('|'):
-                        l_lang, l_title = list(l_page.items())[0]
-                        if '#' in l_title:
-                            hashtag_index = l_title.index('#')
-                            l_title = l_title[:hashtag_index]
-                        full_title = f"{l_title} ({l_lang})"
+            if index.lang(title) == 'sv':
+                for l_lang, full_title in index.versions(title).items():
+                    if l_lang in languages:
                         cat['stats']['pages_cnt'] += 1
                         cat['pages'][full_title] = d['pages'][full_title].copy()
 
     # go through all subcaetegories, copy them, and save them in individual files
     cat = {'stats': {}, 'blacklist': {}, 'categories': {}, 'pages': {}}
-    subcategories = [c for c in d['categories'][f"Kategori:{top_category} (sv)"]['pages'] if "Kategori:" in c]
-    subcategories.remove(f"Kategori:{top_category} (sv)")
+    # the fi subcategories are copied with their sv versions
+    subcategories = [c for c in index.subcategories(page_key(f"Kategori:{top_category}", 'sv'))
+                     if index.lang(c) == 'sv']
     for sub_cat in subcategories:
-        short_title = sub_cat.split(':')[1][:-5]
+        short_title = index.title(sub_cat).split(':', 1)[1]
         dashes = 50 - len(short_title)
         print(f"\n---------------New category: {short_title}{'-' * dashes}")
         # copy over base stats
@@ -1730,16 +1768,10 @@ def split_category(d, e, top_category):
         copy_category(sub_cat, 1)
 
         # check secondary language categories
-        second_lang_title = ""
-        if 'langlinks' in d['pages'][sub_cat]:
-            for l in d['pages'][sub_cat]['langlinks']:
-                lang = list(l)[0]
-                if lang == d['stats']['lang_2']:
-                    second_lang_title = f"{l[lang]} ({lang})"
-                    break
-            if second_lang_title != "":
-                order = cat['stats']['categories_cnt']
-                copy_category(second_lang_title, order + 1)
+        second_lang_title = index.version(sub_cat, d['stats']['lang_2'])
+        if second_lang_title is not None:
+            order = cat['stats']['categories_cnt']
+            copy_category(second_lang_title, order + 1)
 
         # save files and reset dict
         dir_date = cat['stats']['scrape_start'][:10]
@@ -1748,7 +1780,7 @@ def split_category(d, e, top_category):
         cat = {'stats': {}, 'blacklist': {}, 'categories': {}, 'pages': {}}
 
 
-def publish(d, e, api_fields, category, subpages=True):
+def publish(d, e, api_fields, category, subpages=True, report_workers=None):
     """Connect to mediawiki site and publish data about category.
 
     Connect to mediawiki site, log in and publish category file to a page. Will publish main category page under
@@ -1756,7 +1788,9 @@ def publish(d, e, api_fields, category, subpages=True):
     URL/P/PageName, contributor list for category under URL/CategoryName:Contributors, and a list of the top 100
     pages in the category under URL/top/CategoryName.
 
-    Enviroment variables can be used for site name and login credentails to support running the scrpt automatically."""
+    Enviroment variables can be used for site name and login credentails to support running the scrpt automatically.
+    The files to publish are rendered at the same time in report_workers processes, see lupp.reports."""
+    from lupp.reports import render
 
     # setup site and login, try to use env variables, otherwise ask user
     site = wiki.Wiki()
@@ -1773,9 +1807,7 @@ def publish(d, e, api_fields, category, subpages=True):
         site.login(os.environ['WIKIUSER'], os.environ['WIKIPASSWORD'])
 
     # Ananlyze and crate files to upload
-    save_as_wikitext(d, e, api_fields, category)
-    analyse_and_save_contributors(d, e, category, fmt="wikitext")
-    save_as_wikitext(d, e, api_fields, category, page_type='top100')
+    render(d, e, api_fields, category, ('wikitext', 'contributors_wikitext', 'wikitext_top100'), workers=report_workers)
 
     # Locate newly created files
     wikitext_file = Path(f"wikitext")
@@ -1859,10 +1891,8 @@ def publish(d, e, api_fields, category, subpages=True):
         return
 
     # Publish all stat pages
-    for p in d['pages']:
+    for p in page_index(d).pages_in('sv'):
         title = d['pages'][p]['title']
-        if '(sv)' not in p:
-            continue
         page_site = page.Page(site, f"p/{title}")
         text = wikitext_page(d, e, p)
         editprop = {'text': text, 'bot': True, 'skipmd5': True, 'minor': category_page.exists, 'summary': summary}
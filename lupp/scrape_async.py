@@ -0,0 +1,175 @@
+"""
+Asyncio based scrape engine, an alternative to the ThreadPoolExecutor phases in lupp.scrape.scrape_launch
+
+The threaded engine runs three phases one after another (category walk, missing pages in secondary language,
+pages in other languages) and every phase waits for its slowest batch. This engine runs the same discovery as one
+pipeline: as soon as a batch of pages lands, the batches for its language links are started, and as soon as a
+category page in the primary language lands, the same category is walked in the secondary language.
+
+The wikitools requests are blocking, so they are run in a thread pool, at most concurrency batches per wiki host at
+a time. The requests themselves, also those for sections and revisions made from the threads of a batch, are bounded
+by the HostLimiter of the wiki in the WikiSessions, which lets at most its pool_size requests be in flight.
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+
+from wikitools import exceptions
+
+from lupp.scrape import _category_members, _scrape_pages
+from lupp.utils import now_ymd_hms
+
+
+class ScrapePipeline:
+    """Scrape a category tree and its language links with at most :param concurrency requests per wiki host"""
+    def __init__(self, store, e, sites, api_fields, max_depth, blacklist, languages, concurrency=5):
+        self.store = store
+        self.d = store.d
+        self.e = e
+        self.sites = sites
+        self.api_fields = api_fields
+        self.max_depth = int(max_depth)
+        self.blacklist = blacklist
+        self.lang_1, self.lang_2 = languages.split('|')[:2]
+        self.other_langs = [l for l in languages.split('|') if l != self.lang_1]
+        self.concurrency = concurrency
+        self._loop = None
+        self._executor = None
+        self._limits = {}
+        self._tasks = set()
+        # pages listed as members of a category, whose language links are followed
+        self._members = set()
+        self._done = set()
+        self._followed = set()
+        self._second_lang_walked = set()
+
+    def run(self, category_title):
+        """Scrape category_title and everything found from it, return False if the category is invalid"""
+        self._loop = asyncio.new_event_loop()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.concurrency * len(self.other_langs + [self.lang_1]))
+        try:
+            return self._loop.run_until_complete(self._main(category_title))
+        finally:
+            self._executor.shutdown(wait=True)
+            self._loop.close()
+
+    async def _main(self, category_title):
+        try:
+            await self._walk(category_title, self.lang_1)
+        except exceptions.APIError as we:
+            self.e['error_scrape_category wiki'] = {'info': we.args, }
+            print(f"wikitools API-fel {we.args}")
+            if "invalidcategory" in we.args:
+                print("Felaktig kategori, avbryter programmet")
+                return False
+        while self._tasks:
+            done, _ = await asyncio.wait(self._tasks)
+            self._tasks -= done
+            errors = [task.exception() for task in done if task.exception() is not None]
+            for error in errors:
+                if isinstance(error, exceptions.APIError):
+                    # every failed batch is kept, the pages in it are missing data
+                    self.e.setdefault('error_scrape_async wiki', []).append({'info': error.args, })
+                    print(f"wikitools API-fel {error.args}")
+            bugs = [error for error in errors if not isinstance(error, exceptions.APIError)]
+            if bugs:
+                # not a failed request but a bug, stop instead of saving a scrape with batches missing
+                for pending in self._tasks:
+                    pending.cancel()
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+                raise bugs[0]
+        return True
+
+    def _spawn(self, coro):
+        self._tasks.add(self._loop.create_task(coro))
+
+    async def _call(self, lang, func, *args, **kwargs):
+        """Run blocking func in the thread pool when a request slot for the wiki of lang is free"""
+        if lang not in self._limits:
+            self._limits[lang] = asyncio.Semaphore(self.concurrency)
+        async with self._limits[lang]:
+            return await self._loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _walk(self, category_title, lang, depth=0, add_prefix=True, add_to_category=None, force=False):
+        """Same as scrape._scrape_category(..), but starts page batches and subcategories as own tasks"""
+        store, e = self.store, self.e
+        if add_prefix:
+            category_title = f"Kategori:{category_title}"
+        full_title_lang = f"{category_title} ({lang})"
+        e['timestamp'][full_title_lang] = now_ymd_hms()
+        if store.has_category(full_title_lang) and not force:
+            return
+        elif depth >= self.max_depth:
+            self._spawn(self._pages([category_title], lang, is_category=True))
+            return
+
+        store.add_category(category_title, lang, force=True)
+        self._spawn(self._pages([category_title], lang, is_category=True))
+
+        subcategories, p_to_scrape = await self._call(lang, _category_members, store, e, self.sites, self.blacklist,
+                                                      category_title, lang, add_to_category)
+        for title in subcategories:
+            self._spawn(self._walk(title, lang, depth=depth + 1, add_prefix=False))
+        for i in range(0, len(p_to_scrape), 50):
+            self._spawn(self._pages(p_to_scrape[i:i + 50], lang, is_category=False))
+
+    async def _pages(self, titles, lang, is_category, follow=True):
+        """Scrape a batch of pages, then follow language links of the pages that are category members"""
+        keys = [f"{title} ({lang})" for title in titles]
+        if follow:
+            self._members.update(keys)
+            # pages already scraped by another batch will not land again, follow their links now
+            self._follow([k for k in keys if k in self._done])
+        added = await self._call(lang, _scrape_pages, self.store, self.e, self.sites, self.api_fields,
+                                 '|'.join(titles), lang, is_category, quickscan=False)
+        added = [f"{title} ({lang})" for title in added]
+        self._done.update(added)
+        self._follow([k for k in added if k in self._members])
+
+        category_key = keys[0]
+        if is_category and lang == self.lang_1 and self.store.has_category(category_key):
+            self._walk_second_lang(category_key)
+
+    def _follow(self, keys):
+        """Start batches for all pages in other languages linked from pages in keys"""
+        p_to_scrape = {}
+        for key in keys:
+            if key in self._followed or not self.store.has_page(key):
+                continue
+            self._followed.add(key)
+            page = self.store.page(key)
+            for l in page['langlinks']:
+                lang = list(l)[0]
+                # disregard small complex languages with codes > 3 chars
+                lang_ok = len(lang) < 4 or lang == "simple"
+                if not lang_ok or lang not in self.other_langs:
+                    continue
+                l_title = l[lang]
+                # check if link is header on page and scan whole page
+                if '#' in l_title:
+                    l_title = l_title[:l_title.index('#')]
+                p_to_scrape.setdefault((lang, page['is_category']), []).append(l_title)
+        for (lang, is_category), batch in p_to_scrape.items():
+            for i in range(0, len(batch), 50):
+                self._spawn(self._pages(batch[i:i + 50], lang, is_category, follow=False))
+
+    def _walk_second_lang(self, category_key):
+        """Walk the category in secondary language to find pages missing from primary language"""
+        if category_key in self._second_lang_walked:
+            return
+        self._second_lang_walked.add(category_key)
+        for l in self.store.page(category_key)['langlinks']:
+            lang = list(l)[0]
+            if lang == self.lang_2:
+                self._spawn(self._walk(l[lang], self.lang_2, add_prefix=False,
+                                       add_to_category=category_key, force=True))
+                break
+
+
+def scrape_category_async(store, e, sites, api_fields, max_depth, blacklist, category_title, languages,
+                          concurrency=5):
+    """Scrape category_title with the asyncio engine, return False if the category is invalid"""
+    pipeline = ScrapePipeline(store, e, sites, api_fields, max_depth, blacklist, languages, concurrency=concurrency)
+    return pipeline.run(category_title)
@@ -0,0 +1,166 @@
+"""
+Shared MediaWiki sessions for the lupp.scrape module
+
+Keeps one wikitools Wiki object per language that all worker threads share, so every API request to a wiki
+reuses the same keep-alive connection pool instead of opening a new TCP/TLS connection and probing siteinfo again.
+All requests go through a HostLimiter per wiki (see lupp.ratelimit) and are retried when the host is throttling.
+Responses are taken from a cache (see lupp.cache) when one is given, and a transport (see lupp.replay) can send the
+requests somewhere else than to the live wikis.
+"""
+
+import threading
+import time
+
+from wikitools import wiki, api
+
+from lupp.ratelimit import HostLimiter, classify_error, parse_retry_after
+
+try:
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    HTTPAdapter = None
+
+API_URL = "https://{lang}.wikipedia.org/w/api.php"
+
+
+class WikiSessions(dict):
+    """Registry of shared wikitools Wiki objects, one per language
+
+    Works as the plain dict of Wiki objects used before (sites[lang]), but creates a missing site on first use
+    in a thread safe way and mounts a connection pool sized to the number of scrape workers on its session.
+    Counts connections opened and reused per language, to show how many handshakes were saved.
+    At most pool_size requests are in flight per wiki, from all threads together, see the HostLimiter of the wiki.
+    Requests that still fail after max_retries are listed in self.failed, so no batch is lost without a trace.
+    With a cache, eg. lupp.cache.ResponseCache, responses for the same request are only fetched once.
+    With a transport, a function transport(lang, params) returning the result, requests are not sent with wikitools,
+    eg. when replaying recorded responses. Then no Wiki objects are created, and the scrape can run offline."""
+    def __init__(self, languages=(), pool_size=5, rate=50.0, max_retries=5, cache=None, transport=None,
+                 api_url=API_URL):
+        super().__init__()
+        self.pool_size = pool_size
+        self.cache = cache
+        self.transport = transport
+        self.api_url = api_url
+        self.rate = rate
+        self.max_retries = max_retries
+        self.failed = []
+        self._lock = threading.Lock()
+        self._adapters = {}
+        self._limiters = {}
+        if transport is None:
+            for lang in languages:
+                self[lang]
+
+    def __missing__(self, lang):
+        with self._lock:
+            if dict.__contains__(self, lang):
+                return dict.__getitem__(self, lang)
+            site = wiki.Wiki(self.api_url.format(lang=lang))
+            self._mount_pool(lang, site)
+            dict.__setitem__(self, lang, site)
+            return site
+
+    def _mount_pool(self, lang, site):
+        """Replace the default adapter of the site's requests session with a pool of pool_size connections"""
+        session = getattr(site, 'session', None)
+        if session is None or HTTPAdapter is None:
+            return
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount(self.api_url.split("://")[0] + "://", adapter)
+        self._adapters[lang] = adapter
+        # wikitools retries maxlag errors by itself, so back off on every response asking for it
+        limiter = self._limiter(lang)
+
+        def on_response(response, *args, **kwargs):
+            if response.status_code == 429 or 'Retry-After' in response.headers:
+                limiter.throttle(parse_retry_after(response.headers.get('Retry-After')))
+        session.hooks['response'].append(on_response)
+
+    def limiter(self, lang):
+        """Return the HostLimiter for the wiki of lang"""
+        if self.transport is None:
+            self[lang]
+        with self._lock:
+            return self._limiter(lang)
+
+    def _limiter(self, lang):
+        # called with self._lock held
+        if lang not in self._limiters:
+            self._limiters[lang] = HostLimiter(rate=self.rate, limit=max(1, self.pool_size // 2),
+                                               max_limit=self.pool_size)
+        return self._limiters[lang]
+
+    def send(self, lang, params):
+        """Send one request to the wiki of lang with wikitools and return the result"""
+        return api.APIRequest(self[lang], params).query(querycontinue=False)
+
+    def query(self, lang, params):
+        """Run an API query against the shared site for lang and yield every result batch
+
+        Continuations are requested one at a time with _request(..), so a throttled batch is retried on its own."""
+        params = dict(params)
+        if params.get('action') == 'query':
+            params.setdefault('continue', '')
+        while True:
+            result = self._request(lang, params)
+            yield result
+            if 'continue' not in result:
+                break
+            params.update(result['continue'])
+
+    def _request(self, lang, params):
+        """Send one request through the limiter of lang, retry it while the error is temporary"""
+        if self.cache is not None:
+            result = self.cache.get(lang, params)
+            if result is not None:
+                return result
+        limiter = self.limiter(lang)
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire()
+            start = time.monotonic()
+            try:
+                result = (self.transport or self.send)(lang, params)
+            except Exception as exc:
+                retry, throttled, retry_after = classify_error(exc)
+                limiter.release(throttled=throttled, retry_after=retry_after)
+                if not retry:
+                    raise
+                if attempt == self.max_retries:
+                    limiter.stats['failed'] += 1
+                    self.failed.append({'lang': lang, 'params': params.copy(), 'error': repr(exc),
+                                        'attempts': attempt + 1})
+                    raise
+                limiter.stats['retries'] += 1
+                time.sleep(limiter.backoff(attempt, retry_after))
+                continue
+            limiter.release(latency=time.monotonic() - start)
+            if self.cache is not None:
+                self.cache.put(lang, params, result)
+            return result
+
+    def connection_stats(self):
+        """Return dict with number of connections opened and reused and requests sent for each language"""
+        stats = {}
+        for lang, adapter in self._adapters.items():
+            opened = requests = 0
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                opened += pool.num_connections
+                requests += pool.num_requests
+            stats[lang] = {'opened': opened, 'reused': max(requests - opened, 0), 'requests': requests}
+        return stats
+
+    def limiter_stats(self):
+        """Return dict with current limits and counters of the limiter for each language"""
+        return {lang: limiter.status() for lang, limiter in self._limiters.items()}
+
+    def print_connection_stats(self):
+        """Print connections opened vs reused and the rate limiting for each language"""
+        for lang, s in self.connection_stats().items():
+            print(f"Anslutningar {lang}: {s['opened']} öppnade, {s['reused']} återanvända ({s['requests']} anrop)")
+        for lang, s in self.limiter_stats().items():
+            print(f"Takt {lang}: {s['limit']} parallella, {s['rate']} anrop/s, {s['throttled']} strypningar, "
+                  f"{s['retries']} omförsök, {s['failed']} misslyckade")
@@ -0,0 +1,235 @@
+"""
+Snapshots of the scrapes of all categories in one sqlite file, for trends over time
+
+Every scrape is a snapshot of its category, saved in json/DATE/Category.json. To follow a category over dozens of
+scrapes, the json files would all have to be loaded just to sum a few stats per language. A SnapshotStore keeps every
+snapshot in tables of their own for pages, stats, langlinks, contributors and pageviews, with a row per page (or per
+link or contributor), so a trend query reads only the rows and columns it needs. The pageviews of a page are packed
+into one array, a value for every date of the snapshot. Scrapes are added when they are saved, and older json files
+with import_json_files(..).
+
+The contributor index in the contributor_edits table holds the edits of every user per category and language, counted
+from the latest snapshot of each category. It is updated for a category when a newer snapshot of it is saved, so
+rankings of the contributors across all categories are a query on it, without loading the json files.
+"""
+
+import json
+import sqlite3
+from array import array
+from pathlib import Path
+
+from lupp import utils
+from lupp.pageindex import PageIndex
+from lupp.record import load_json_file
+
+# integer stats of a page, the columns of the stats table
+STAT_COLUMNS = ('quality', 'pageviews_tot', 'contributors_tot', 'total_langs', 'categories_cnt', 'images_cnt',
+                'langlinks_cnt', 'links_cnt', 'linkshere_cnt', 'extlinks_cnt', 'redirects_cnt', 'contributors_cnt',
+                'revisions_cnt')
+
+# value in the pageviews arrays for a date without data
+NO_VIEWS = -1
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS snapshots (id INTEGER PRIMARY KEY, category TEXT, scrape_start TEXT, scraped TEXT,
+    languages TEXT, json_file TEXT, stats TEXT, dates TEXT, UNIQUE (category, scrape_start));
+CREATE TABLE IF NOT EXISTS pages (snapshot INTEGER, page INTEGER, key TEXT, title TEXT, lang TEXT,
+    is_category INTEGER, length INTEGER, PRIMARY KEY (snapshot, page));
+CREATE INDEX IF NOT EXISTS pages_lang ON pages (snapshot, lang);
+CREATE TABLE IF NOT EXISTS stats (snapshot INTEGER, page INTEGER, {', '.join(f'{c} INTEGER' for c in STAT_COLUMNS)},
+    PRIMARY KEY (snapshot, page));
+CREATE TABLE IF NOT EXISTS langlinks (snapshot INTEGER, page INTEGER, lang TEXT, title TEXT, target INTEGER);
+CREATE INDEX IF NOT EXISTS langlinks_page ON langlinks (snapshot, page);
+CREATE TABLE IF NOT EXISTS contributors (snapshot INTEGER, page INTEGER, user TEXT);
+CREATE INDEX IF NOT EXISTS contributors_page ON contributors (snapshot, page);
+CREATE TABLE IF NOT EXISTS pageviews (snapshot INTEGER, page INTEGER, views BLOB, PRIMARY KEY (snapshot, page));
+CREATE TABLE IF NOT EXISTS contributor_edits (category TEXT, snapshot INTEGER, user TEXT, lang TEXT, edits INTEGER,
+    PRIMARY KEY (category, user, lang));
+CREATE INDEX IF NOT EXISTS contributor_edits_user ON contributor_edits (user);
+"""
+# tables with rows for every page of a snapshot
+PAGE_TABLES = ('pages', 'stats', 'langlinks', 'contributors', 'pageviews')
+
+
+def _int(value):
+    """Return value as int, json files saved before the stats were integers have them as strings"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _pack(pageviews, dates):
+    """Return bytes of array('q') of the views on dates"""
+    views = map(pageviews.get, dates)
+    return array('q', [NO_VIEWS if value is None else value for value in views]).tobytes()
+
+
+class SnapshotStore:
+    """Snapshots of scrapes in an sqlite file
+
+    The pages of a snapshot are numbered in the order of d['pages'], and referred to by their number in the other
+    tables. A category scraped again with the same scrape_start, eg. saved again by 'use', replaces its snapshot.
+    The views of a page are an array('q') of the views on every date in the 'dates' of its snapshot, NO_VIEWS for a
+    date without data.
+    """
+    def __init__(self, path=Path("snapshots") / "snapshots.sqlite"):
+        self.path = Path(path)
+        utils.make_dir(self.path.parent)
+        self._db = sqlite3.connect(str(self.path))
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def save(self, d, json_file=None):
+        """Save d as a snapshot of its category and return the id of the snapshot"""
+        stats = d['stats']
+        index = PageIndex(d)
+        # without the edit history of the pages, 'revisions_cnt' is not their number of revisions
+        columns = [name for name in STAT_COLUMNS
+                   if name != 'revisions_cnt' or stats.get('revisions_mode', 'history') == 'history']
+        numbers = {key: number for number, key in enumerate(d['pages'])}
+        # nearly all pages have pageviews for the same dates
+        dates = sorted({date for dates in {tuple(page['pageviews']) for page in d['pages'].values()
+                                           if page.get('pageviews')} for date in dates})
+        with self._db:
+            old = self._db.execute("SELECT id FROM snapshots WHERE category = ? AND scrape_start = ?",
+                                   (stats['category_title'], stats['scrape_start'])).fetchone()
+            if old is not None:
+                self._delete(old[0])
+            snapshot = self._db.execute(
+                "INSERT INTO snapshots (category, scrape_start, scraped, languages, json_file, stats, dates) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (stats['category_title'], stats['scrape_start'], stats.get('scraped', stats['scrape_start']),
+                 stats.get('languages'), str(json_file) if json_file else None, json.dumps(stats),
+                 json.dumps(dates))).lastrowid
+            pages = d['pages']
+            self._db.executemany(
+                "INSERT INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((snapshot, numbers[key], key, index.title(key), index.lang(key), int(bool(page.get('is_category'))),
+                  _int(page.get('length'))) for key, page in pages.items()))
+            self._db.executemany(
+                f"INSERT INTO stats VALUES ({', '.join('?' * (len(STAT_COLUMNS) + 2))})",
+                ((snapshot, numbers[key]) + tuple(_int(page['stats'].get(name)) if name in columns else None
+                                                  for name in STAT_COLUMNS)
+                 for key, page in pages.items() if 'stats' in page))
+            self._db.executemany(
+                "INSERT INTO langlinks VALUES (?, ?, ?, ?, ?)",
+                ((snapshot, numbers[key], lang, title, numbers.get(index.version(key, lang)))
+                 for key in pages for lang, title in index.langlinks(key).items()))
+            self._db.executemany(
+                "INSERT INTO contributors VALUES (?, ?, ?)",
+                ((snapshot, numbers[key], user) for key, page in pages.items() for user in page.get('contributors', ())))
+            self._db.executemany(
+                "INSERT INTO pageviews VALUES (?, ?, ?)",
+                ((snapshot, numbers[key], _pack(page['pageviews'], dates)) for key, page in pages.items()
+                 if page.get('pageviews')))
+            if self._latest(stats['category_title']) == snapshot:
+                self._index_contributors(stats['category_title'], snapshot)
+        return snapshot
+
+    def pageviews(self, snapshot, page):
+        """Return {date: views} of page number page in snapshot, views None for a date without data"""
+        dates = json.loads(self._db.execute("SELECT dates FROM snapshots WHERE id = ?", (snapshot,)).fetchone()[0])
+        row = self._db.execute("SELECT views FROM pageviews WHERE snapshot = ? AND page = ?",
+                               (snapshot, page)).fetchone()
+        if row is None:
+            return {}
+        views = array('q')
+        views.frombytes(row[0])
+        return {date: None if value == NO_VIEWS else value for date, value in zip(dates, views)}
+
+    def _delete(self, snapshot):
+        for table in PAGE_TABLES:
+            self._db.execute(f"DELETE FROM {table} WHERE snapshot = ?", (snapshot,))
+        self._db.execute("DELETE FROM snapshots WHERE id = ?", (snapshot,))
+
+    def _latest(self, category):
+        """Return id of the latest snapshot of category, None if there is none"""
+        row = self._db.execute("SELECT id FROM snapshots WHERE category = ? ORDER BY scraped DESC LIMIT 1",
+                               (category,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _index_contributors(self, category, snapshot):
+        """Replace the edits of category in the contributor index with those in snapshot"""
+        self._db.execute("DELETE FROM contributor_edits WHERE category = ?", (category,))
+        self._db.execute(
+            "INSERT INTO contributor_edits SELECT ?, c.snapshot, c.user, p.lang, COUNT(*) FROM contributors c "
+            "JOIN pages p ON p.snapshot = c.snapshot AND p.page = c.page WHERE c.snapshot = ? GROUP BY c.user, p.lang",
+            (category, snapshot))
+
+    def update_contributor_index(self):
+        """Index the contributors of the categories whose latest snapshot is not in the index, return how many"""
+        indexed = dict(self._db.execute("SELECT DISTINCT category, snapshot FROM contributor_edits"))
+        categories = [row[0] for row in self._db.execute("SELECT DISTINCT category FROM snapshots")]
+        updated = 0
+        with self._db:
+            for category in categories:
+                latest = self._latest(category)
+                if indexed.get(category) != latest:
+                    self._index_contributors(category, latest)
+                    updated += 1
+        return updated
+
+    def contributor_ranking(self, langs, categories=None, top=None):
+        """Return [(user, edits in each of langs, edits in all languages, number of categories)] of the contributors
+
+        The edits are summed over categories, all categories in the index by default. The users are ranked by their
+        edits in the first of langs, then the second and so on. With top only the top users are returned, which
+        sqlite finds without sorting the rest.
+        """
+        params = list(langs)
+        where = ""
+        if categories is not None:
+            where = f"WHERE category IN ({', '.join('?' * len(categories))}) "
+            params += list(categories)
+        limit = ""
+        if top is not None:
+            limit = " LIMIT ?"
+            params.append(top)
+        columns = "".join("SUM(CASE WHEN lang = ? THEN edits ELSE 0 END), " for _ in langs)
+        order = "".join(f"{column} DESC, " for column in range(2, len(langs) + 2))
+        return self._db.execute(
+            f"SELECT user, {columns}SUM(edits), COUNT(DISTINCT category) FROM contributor_edits {where}"
+            f"GROUP BY user ORDER BY {order}user{limit}", params).fetchall()
+
+    def user_edits(self, user):
+        """Return [(category, lang, edits)] of user in the contributor index"""
+        return self._db.execute("SELECT category, lang, edits FROM contributor_edits WHERE user = ? "
+                                "ORDER BY category, lang", (user,)).fetchall()
+
+    def snapshots(self, category):
+        """Return [(id, scraped)] of the snapshots of category, oldest first"""
+        return self._db.execute("SELECT id, scraped FROM snapshots WHERE category = ? ORDER BY scraped",
+                                (category,)).fetchall()
+
+    def import_json_files(self, category):
+        """Add the json files of category in json/ that are not in the store yet, return how many were added"""
+        known = {row[0] for row in self._db.execute("SELECT json_file FROM snapshots WHERE category = ?",
+                                                    (category,))}
+        added = 0
+        for json_file in sorted(Path('json').glob(f"*/{category.replace(' ', '_')}.json")):
+            if str(json_file) in known:
+                continue
+            d = load_json_file(json_file)
+            if d.get('stats', {}).get('category_title') != category:
+                continue
+            self.save(d, json_file)
+            print(f"Lade till {json_file} i {self.path}")
+            added += 1
+        return added
+
+    def trend(self, category, lang):
+        """Return [(scraped, pages, length, quality, views)] of the pages in lang in every snapshot of category
+
+        Only snapshots with pages in lang are included, oldest first.
+        """
+        return self._db.execute(
+            "SELECT s.scraped, COUNT(*), SUM(p.length), SUM(t.quality), SUM(t.pageviews_tot) "
+            "FROM snapshots s JOIN pages p ON p.snapshot = s.id "
+            "LEFT JOIN stats t ON t.snapshot = p.snapshot AND t.page = p.page "
+            "WHERE s.category = ? AND p.lang = ? GROUP BY s.id ORDER BY s.scraped",
+            (category, lang)).fetchall()
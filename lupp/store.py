@@ -0,0 +1,121 @@
+"""
+Thread safe store for the 'global' dict d while it is being filled by a scrape
+
+Worker threads in lupp.scrape and lupp.scrape_async add pages and categories to d at the same time. All
+check-then-insert steps and counters go through a PageStore, so no page is scraped twice, no count is lost and
+nothing iterates a dict while another thread changes its size.
+"""
+
+import threading
+
+from lupp import analysis, pageindex
+
+
+class PageStore:
+    """Thread safe access to d['pages'], d['categories'] and the counters in d['stats']
+
+    Pages are locked in shards by key, so threads adding different pages rarely wait for each other.
+    A page that has been claimed with claim_pages(..) is owned by the thread that claimed it, which can then
+    fill in the fields of the page without locking. The underlying dict is still available as store.d for reading.
+    When a ScrapeJournal is given, pages are written to it with checkpoint(..) when they are done.
+    previous holds d['pages'] of an earlier scrape of the same category, in an incremental scrape.
+    """
+    def __init__(self, d, shards=16, journal=None, previous=None):
+        self.d = d
+        # the pages are about to change, an earlier analysis of them is out of date
+        analysis.invalidate(d)
+        pageindex.invalidate(d)
+        self.journal = journal
+        self.previous = previous
+        self._page_locks = [threading.Lock() for _ in range(shards)]
+        self._category_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def _page_lock(self, key):
+        return self._page_locks[hash(key) % len(self._page_locks)]
+
+    def incr(self, stat, n=1):
+        """Add n to counter d['stats'][stat]"""
+        with self._stats_lock:
+            self.d['stats'][stat] = self.d['stats'].get(stat, 0) + n
+
+    def claim_pages(self, titles, lang, new_page):
+        """Add empty records for all titles in lang that are not in d['pages'] yet
+
+        :param titles: list of page titles
+        :param lang: language of the pages
+        :param new_page: function returning a new empty page record for a title
+        :return: list of titles that were added, and are now owned by the caller
+        """
+        claimed = []
+        for title in titles:
+            key = f"{title} ({lang})"
+            with self._page_lock(key):
+                if key in self.d['pages']:
+                    continue
+                self.d['pages'][key] = new_page(title)
+            claimed.append(title)
+        if claimed:
+            self.incr('pages_cnt', len(claimed))
+        return claimed
+
+    def checkpoint(self, titles, lang):
+        """Write the finished pages of titles in lang, claimed by the caller, to the journal"""
+        if self.journal is None:
+            return
+        pages = {}
+        for title in titles:
+            key = f"{title} ({lang})"
+            if key in self.d['pages']:
+                pages[key] = self.d['pages'][key]
+        self.journal.add_pages(pages)
+
+    def page(self, key):
+        """Return page record for key"""
+        return self.d['pages'][key]
+
+    def has_page(self, key):
+        return key in self.d['pages']
+
+    def add_category(self, category_title, lang, force=False):
+        """Add category {category_title} in {lang} to d['categories'], with the category page itself as first page
+
+        :param force: Add category again even if it already exists
+        :return: False if the category already existed and force is not set, else True
+        """
+        full_title_lang = f"{category_title} ({lang})"
+        title_lang = f'title_{lang}'
+        with self._category_lock:
+            if full_title_lang in self.d['categories'] and not force:
+                return False
+            with self._stats_lock:
+                self.d['stats']['categories_cnt'] += 1
+                order = self.d['stats']['categories_cnt']
+            self.d['categories'][full_title_lang] = {title_lang: category_title,
+                                                     'pages': {full_title_lang: {title_lang: category_title}},
+                                                     'order': order}
+        return True
+
+    def has_category(self, key):
+        return key in self.d['categories']
+
+    def add_category_page(self, category_key, page_key, entry, only_new=False):
+        """Add page to the pages of category, if only_new the page is not replaced if it is already there"""
+        with self._category_lock:
+            pages = self.d['categories'][category_key]['pages']
+            if only_new and page_key in pages:
+                return
+            pages[page_key] = entry
+
+    def categories_by_order(self):
+        """Return snapshot of category keys sorted by the order they were found in"""
+        with self._category_lock:
+            categories = list(self.d['categories'].items())
+        categories.sort(key=lambda x: x[1]['order'])
+        return [key for key, _ in categories]
+
+    def progress(self):
+        """Return number of pages and snapshot of category keys, for showing progress while scraping"""
+        with self._category_lock:
+            categories = list(self.d['categories'])
+        return len(self.d['pages']), categories
@@ -10,6 +10,9 @@ from datetime import datetime, date
 from pathlib import Path
 from pprint import pprint
 
+from lupp import jsonstream
+from lupp.record import PageRecord, json_default
+
 
 def now_ymd_hms():
     """Format date to Year Month Day Hour Minute Second"""
@@ -33,38 +36,35 @@ def days_between(d1, d2):
     return abs((d2 - d1).days)
 
 
-def loading_bar(loading, data=None):
+def loading_bar(loading, store=None):
     try:
         from ipywidgets import IntProgress, HTML, VBox
         from IPython.display import display
         try:
-            return loading_bar_ipython(loading, data)
+            return loading_bar_ipython(loading, store)
         except Error as e:
             print(e)
     except ImportError:
         print("Using terminal loading bar")
-        return loading_bar_term(loading, data)
+        return loading_bar_term(loading, store)
 
 
-def loading_bar_term(loading, data=None):
+def loading_bar_term(loading, store=None):
     """Prints loading bar that keeps repeating until loading['status'] is set to True
 
     Function that displays a loading bar that keeps repeating until
     :parameter loading['status'] is set to True
-    :parameter data, dict containing 'pages', from where number of pages read are displayed
+    :parameter store, PageStore of the dict being scraped, from where number of pages read are displayed
 
     Intended to run in own thread while other threads work until all work is done
     Will never terminate if run in main thread!"""
-    if data is None:
-        data = {}
     i = 0
     page_cnt = 0
     shown_categories = set()
     while True:
-        if data and 'pages'in data:
-            page_cnt = len(data['pages'])
-        if data and 'categories' in data:
-            new_cats = set(data['categories'].keys())
+        if store is not None:
+            page_cnt, categories = store.progress()
+            new_cats = set(categories)
             for new in new_cats.difference(shown_categories):
                 print(f"\rCategory title: {new}")
             shown_categories = new_cats
@@ -76,7 +76,7 @@ def loading_bar_term(loading, data=None):
         time.sleep(0.001)
 
 
-def loading_bar_ipython(loading, data=None):
+def loading_bar_ipython(loading, store=None):
     from ipywidgets import IntProgress, HTML, VBox
     from IPython.display import display
     progress = IntProgress(min=0, max=100, value=0)
@@ -89,10 +89,9 @@ def loading_bar_ipython(loading, data=None):
     page_cnt = 0
     shown_categories = set()
     while True:
-        if data and 'pages'in data:
-            page_cnt = len(data['pages'])
-        if data and 'categories' in data:
-            new_cats = set(data['categories'].keys())
+        if store is not None:
+            page_cnt, categories = store.progress()
+            new_cats = set(categories)
             for new in new_cats.difference(shown_categories):
                 print(f"\rCategory title: {new}")
             shown_categories = new_cats
@@ -107,10 +106,10 @@ def loading_bar_ipython(loading, data=None):
 
 
 def make_dir(outdir_path):
-    """Create new direcotory, unless it already exists"""
-    for path in list(reversed(outdir_path.parents)) + [outdir_path]:
-        if not path.exists():
-            path.mkdir()
+    """Create new direcotory, unless it already exists
+
+    Reports rendered at the same time may create the same directory, so one that appears meanwhile is fine."""
+    Path(outdir_path).mkdir(parents=True, exist_ok=True)
 
 
 def save_utf_file(utf_file, fmt, s, dir_date=""):
@@ -145,12 +144,39 @@ def get_utf_file(utf_file, fmt, dir_date=""):
     return open(utf_file, "w", encoding='utf-8')
 
 
+class CountingFile:
+    """Text file that counts the characters written to it, for reports written a part at a time
+
+    :ivar chars: number of characters written so far
+    """
+    def __init__(self, f):
+        self.f = f
+        self.name = f.name
+        self.chars = 0
+
+    def write(self, text):
+        self.f.write(text)
+        self.chars += len(text)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.f.close()
+
+
+# formats of the more easily readable copy of the json files in pprint/, and their file endings:
+# pprint of the python dict, indented json, json lines with a line per page, or no copy at all
+PPRINT_FORMATS = {'pprint': '.txt', 'json': '.json', 'jsonl': '.jsonl', 'off': None}
+# format used by save_json_file(..), set with --pprint
+pprint_format = 'off'
+
+
 def save_json_file(json_file, j, dir_date=""):
     """Save python dict as json file
 
-    Save datta from python dict as a json file. Two files are created, one normal json file and
-    pretty printed text file with more easily readable json.
-    The files are created in json/ and pprint/ folders inside subfolders based the privided date
+    Save datta from python dict as a json file. The file is created in json/ folder inside subfolder based the
+    privided date. A more easily readable copy is saved in pprint/ with save_pprint_file(..), in pprint_format.
 
     :param json_file: Name for the files
     :param j: Python dict with the data
@@ -158,19 +184,40 @@ def save_json_file(json_file, j, dir_date=""):
     """
     json_dir = Path("json") / dir_date
     make_dir(json_dir)
+    json_file = Path("json") / dir_date / Path(json_file).name
+    with open(json_file, 'w', encoding='utf-8') as f:
+        writer = jsonstream.dump(j, f, default=json_default)
+    if 'pages' in j:
+        # byte offsets of the pages, for reading a single page with jsonstream.load_indexed(..)
+        jsonstream.write_index(json_file, writer.offsets)
+    print(f"\nSkrev json -filen {json_file} ({writer.chars} tecken)")
+    save_pprint_file(json_file.name, j, dir_date=dir_date)
+
+
+def save_pprint_file(json_file, j, dir_date="", fmt=None):
+    """Save more easily readable copy of python dict in pprint/ folder inside subfolder based the privided date
+
+    :param json_file: Name of the json file, the ending is changed by the format
+    :param fmt: One of PPRINT_FORMATS, pprint_format if not given
+    """
+    fmt = fmt or pprint_format
+    if PPRINT_FORMATS[fmt] is None:
+        return
     pprint_dir = Path("pprint") / dir_date
     make_dir(pprint_dir)
-    if "json" not in json_file.parts:
-        json_file = Path("json") / dir_date / json_file
-        ppfile = Path("pprint").joinpath(*json_file.parts[1:])
-    else:
-        json_file = Path("json") / dir_date / json_file.name
-        ppfile = Path("pprint").joinpath(*json_file.parts[1:])
-    json.dump(j, open(json_file, 'w'))
-    print(f"\nSkrev json -filen {json_file} ({len(str(j))} tecken)")
-    ppfile = ppfile.with_suffix('.txt')
+    ppfile = (pprint_dir / Path(json_file).name).with_suffix(PPRINT_FORMATS[fmt])
     with open(ppfile, "w", encoding='utf-8') as fout:
-        pprint(j, fout)
+        if fmt == 'pprint':
+            if isinstance(j.get('pages'), dict):
+                # pprint shows page records like the dicts in the json file
+                j = dict(j, pages={key: page.to_dict() if isinstance(page, PageRecord) else page
+                                   for key, page in j['pages'].items()})
+            pprint(j, fout)
+        elif fmt == 'json':
+            for chunk in json.JSONEncoder(indent=1, ensure_ascii=False, default=json_default).iterencode(j):
+                fout.write(chunk)
+        else:
+            jsonstream.dump_lines(j, fout, default=json_default)
     print(f"\nSkrev pprint-filen {ppfile}")
 
 
@@ -205,8 +252,14 @@ def find_path(category):
     return json_path
 
 
+# functions printing stats when the program exits, eg. ResponseCache.print_stats
+exit_reports = []
+
+
 def exit_program(start):
     """Exit program and print stats for running time"""
+    for report in exit_reports:
+        report()
     end = datetime.now()
     print(f"\nfredrikas_lupp.py slutade {end.strftime('%H:%M')} total svarstid {(end - start).seconds} s")
     sys.exit()
@@ -94,3 +94,8 @@ def table_start(h1, h2, cellpadding=0, cls='sortable'):
     s = ''
     nr = '|-\n'
     return f"{start}{s.join(headers1)}{nr}{s.join(headers2)}{nr}"
+
+
+def table_end():
+    """End a wikitext markup table"""
+    return "|}\n"